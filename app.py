@@ -1,15 +1,31 @@
-from flask import Flask, request, render_template, jsonify, redirect
+from flask import Flask, request, g, render_template as flask_render_template, jsonify, redirect, send_file, send_from_directory, stream_with_context
+import click
+from jinja2 import ChoiceLoader, FileSystemLoader
 import os
 import sys
 import secrets
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid  # For generating unique IDs
 import ssl  # Import SSL module for options
-
-# For debugging
-print(f"Current working directory: {os.getcwd()}")
-print(f"Files in current directory: {os.listdir()}")
+from array import array  # Compact float buffers when NumPy is unavailable
+import threading
+import queue
+import atexit
+import time
+import hashlib
+from concurrent import futures
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from functools import lru_cache
+from collections import OrderedDict
+import mmap
+import struct
+import zlib
+import gzip
+import mimetypes
+import csv
+import io
+import math
 
 # Create Flask app
 app = Flask(__name__)
@@ -25,13 +41,263 @@ except ImportError:
     has_certifi = False
     print("⚠️ certifi module not available, will use alternative MongoDB connection methods")
 
-# Function to try multiple MongoDB connection configurations
-def try_connect_mongodb(mongo_uri):
-    if not mongo_uri:
-        print("No MongoDB URI provided")
-        return None, False
+# brotli is optional - pages fall back to gzip without it
+try:
+    import brotli
+    has_brotli = True
+except ImportError:
+    has_brotli = False
+
+# pymongo is optional and only imported once MongoDB is configured, so startup
+# without MONGO_URI never pays for it; without it the file fallbacks are used
+pymongo = None
+
+def import_pymongo():
+    global pymongo
+    if pymongo is None:
+        import pymongo as pymongo_module  # ImportError is handled by the callers
+        pymongo = pymongo_module
+    return pymongo
+
+# fcntl (POSIX only) lets several gunicorn workers share the local data files safely
+try:
+    import fcntl
+    has_fcntl = True
+except ImportError:
+    has_fcntl = False
+    print("⚠️ fcntl module not available, local data files are only locked within this process")
+
+# NumPy is optional and imported by the first batch request - batch predictions
+# fall back to array('d') without it
+np = None
+has_numpy = None  # not checked yet
+
+def numpy_available():
+    global np, has_numpy
+    if has_numpy is None:
+        try:
+            import numpy
+            np = numpy
+            has_numpy = True
+        except ImportError:
+            has_numpy = False
+            print("⚠️ numpy module not available, batch predictions will use the pure Python path")
+    return has_numpy
+
+# CGPA resolution matches the form's step="0.01" over 0-10 (1001 possible inputs)
+CGPA_STEPS_PER_POINT = 100
+CGPA_MAX = 10
+# Rendered page shells kept per worker, one per distinct page state (e.g. each CGPA's message)
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", os.environ.get("PREDICTION_CACHE_SIZE", 1024)))
+PAGE_GZIP_LEVEL = int(os.environ.get("PAGE_GZIP_LEVEL", 9))  # shells are compressed once, so use the best level
+PAGE_BROTLI_QUALITY = int(os.environ.get("PAGE_BROTLI_QUALITY", 5))  # per response state, so keep it cheap
+PAGE_BROTLI_CACHE_SIZE = int(os.environ.get("PAGE_BROTLI_CACHE_SIZE", 256))
+
+# Cache lifetime (seconds) advertised by the JSON prediction endpoint
+API_CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", 3600))
+
+# Largest number of CGPAs accepted by a single batch prediction request
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 10000))
+
+# MongoDB connection settings - every client in this process uses these
+MONGO_DB_NAME = "placement_predictor"
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 30000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 30000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+
+# MongoDB connection (we'll use environment variable in production)
+MONGO_URI = os.environ.get("MONGO_URI")
+
+class PoolStats:
+    """Running connection pool totals for /mongo-pool, fed by pymongo pool events."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pool_clears = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "avg_wait_ms": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.wait_max * 1000, 3)
+            }
+    
+    def connection_check_out_started(self, event):
+        # Check-out started and completed events fire on the requesting thread
+        self._local.started = time.monotonic()
+    
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        wait = time.monotonic() - started if started is not None else 0.0
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
     
-    # Different connection configurations to try
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+    
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+    
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+
+class MongoConnectionManager:
+    """Owns the one pooled MongoClient shared by every route in this process.
+
+    The client is created lazily with the TLS options that worked at startup.
+    MongoClient is not fork-safe, so a gunicorn worker that inherits a client
+    from its parent builds its own on first use.
+    """
+    
+    def __init__(self, uri, db_name):
+        self.uri = uri
+        self.db_name = db_name
+        self.tls_options = {}
+        self.pool_stats = None
+        self._lock = threading.Lock()
+        self._client = None
+        self._pid = None
+        self._collections = {}
+    
+    def client_options(self, tls_options=None):
+        options = dict(self.tls_options if tls_options is None else tls_options)
+        options.update({
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+            "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS
+        })
+        return options
+    
+    def create_client(self, tls_options=None, monitored=True, **overrides):
+        """Build a new MongoClient; unmonitored clients are for probing only."""
+        import_pymongo()
+        options = self.client_options(tls_options)
+        options.update(overrides)
+        if monitored:
+            options["event_listeners"] = [self._pool_listener()]
+        return pymongo.MongoClient(self.uri, **options)
+    
+    def _pool_listener(self):
+        if self.pool_stats is None:
+            # pymongo only accepts subclasses of its listener base class
+            class PoolStatsListener(PoolStats, pymongo.monitoring.ConnectionPoolListener):
+                pass
+            self.pool_stats = PoolStatsListener()
+        return self.pool_stats
+    
+    def configure(self, tls_options):
+        """Use the TLS options that passed the startup probe for the shared client."""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self.tls_options = dict(tls_options)
+            self._client = None
+            self._collections = {}
+    
+    def adopt(self, client):
+        """Share an already-built client (e.g. an in-process fake for benchmarks)."""
+        with self._lock:
+            self._client = client
+            self._pid = os.getpid()
+            self._collections = {}
+    
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # Never reuse sockets inherited from the parent process
+                    if self.pool_stats is not None:
+                        self.pool_stats.reset()
+                    self._client = self.create_client()
+                    self._pid = os.getpid()
+                    self._collections = {}
+        return self._client
+    
+    def database(self, name=None):
+        return self.client()[name or self.db_name]
+    
+    def collection(self, name):
+        client = self.client()
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = client[self.db_name][name]
+        return collection
+    
+    def stats(self):
+        stats = (self.pool_stats or PoolStats()).snapshot()
+        stats.update({
+            "pid": os.getpid(),
+            "client_created": self._client is not None and self._pid == os.getpid(),
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "wait_queue_timeout_ms": MONGO_WAIT_QUEUE_TIMEOUT_MS
+        })
+        return stats
+    
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._collections = {}
+
+mongo = MongoConnectionManager(MONGO_URI, MONGO_DB_NAME)
+
+# TLS configurations to try, in order (timeouts and pool sizing come from config)
+def mongodb_tls_configs():
     configs = []
     
     # Only add certifi config if certifi is available
@@ -39,10 +305,7 @@ def try_connect_mongodb(mongo_uri):
         configs.append({
             "name": "Standard with certifi",
             "options": {
-                "tlsCAFile": certifi.where(),
-                "connectTimeoutMS": 30000,
-                "socketTimeoutMS": 30000,
-                "serverSelectionTimeoutMS": 30000
+                "tlsCAFile": certifi.where()
             }
         })
     
@@ -51,70 +314,176 @@ def try_connect_mongodb(mongo_uri):
         {
             "name": "No certificate verification",
             "options": {
-                "ssl_cert_reqs": ssl.CERT_NONE,
-                "connectTimeoutMS": 30000,
-                "socketTimeoutMS": 30000,
-                "serverSelectionTimeoutMS": 30000
+                "ssl_cert_reqs": ssl.CERT_NONE
             }
         },
         {
             "name": "Allow invalid certificates",
             "options": {
-                "tlsAllowInvalidCertificates": True,
-                "connectTimeoutMS": 30000,
-                "socketTimeoutMS": 30000,
-                "serverSelectionTimeoutMS": 30000
+                "tlsAllowInvalidCertificates": True
             }
         },
         {
             "name": "Minimal options",
-            "options": {
-                "serverSelectionTimeoutMS": 30000
-            }
+            "options": {}
         }
     ])
-    
-    # Try each configuration
+    return configs
+
+# Startup probing: "parallel" tries every TLS configuration at once, "sequential" one at a time
+MONGO_PROBE_MODE = os.environ.get("MONGO_PROBE_MODE", "parallel")
+MONGO_PROBE_DEADLINE = float(os.environ.get("MONGO_PROBE_DEADLINE", 10.0))  # seconds for all attempts together
+MONGO_PROBE_CACHE_FILE = os.environ.get("MONGO_PROBE_CACHE_FILE", os.path.join(os.getcwd(), '.mongo_probe_cache.json'))
+
+# The cache is keyed by a hash of the URI so credentials never touch the disk
+def mongo_uri_fingerprint(mongo_uri):
+    return hashlib.sha256(mongo_uri.encode('utf-8')).hexdigest()[:16]
+
+# Function to read the configuration that worked on a previous boot
+def load_cached_mongo_config(mongo_uri):
+    try:
+        with open(MONGO_PROBE_CACHE_FILE, 'r') as f:
+            cached = json.load(f)
+        if cached.get("uri") == mongo_uri_fingerprint(mongo_uri):
+            return cached.get("config")
+    except (OSError, ValueError):
+        pass
+    return None
+
+# Function to remember the winning configuration for the next boot
+def save_cached_mongo_config(mongo_uri, config_name):
+    try:
+        tmp_file = f"{MONGO_PROBE_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                "uri": mongo_uri_fingerprint(mongo_uri),
+                "config": config_name,
+                "saved_at": datetime.now().isoformat()
+            }, f)
+        os.replace(tmp_file, MONGO_PROBE_CACHE_FILE)
+    except OSError as e:
+        print(f"⚠️ Could not cache MongoDB configuration: {str(e)}")
+
+def forget_cached_mongo_config():
+    try:
+        os.remove(MONGO_PROBE_CACHE_FILE)
+    except OSError:
+        pass
+
+# Function to test one configuration with a throwaway client, within the deadline
+def probe_mongodb_config(config, deadline):
+    remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+    client = None
+    try:
+        client = mongo.create_client(
+            config["options"],
+            monitored=False,
+            connectTimeoutMS=min(MONGO_CONNECT_TIMEOUT_MS, remaining_ms),
+            serverSelectionTimeoutMS=min(MONGO_SERVER_SELECTION_TIMEOUT_MS, remaining_ms)
+        )
+        client.admin.command('ping')
+    finally:
+        if client is not None:
+            client.close()
+
+# Function to probe all configurations concurrently and return the first that works
+def probe_mongodb_configs_parallel(configs, deadline):
+    executor = futures.ThreadPoolExecutor(max_workers=len(configs), thread_name_prefix="mongo-probe")
+    pending = {executor.submit(probe_mongodb_config, config, deadline): config for config in configs}
+    try:
+        for future in futures.as_completed(pending, timeout=max(0, deadline - time.monotonic())):
+            config = pending[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ MongoDB connection failed with config {config['name']}: {str(e)}")
+                continue
+            return config
+    except futures.TimeoutError:
+        print(f"❌ MongoDB probing hit the {MONGO_PROBE_DEADLINE}s deadline")
+    finally:
+        # Losing probes finish on their own, bounded by the same deadline
+        executor.shutdown(wait=False)
+    return None
+
+# Function to probe configurations one after another within the deadline
+def probe_mongodb_configs_sequential(configs, deadline):
     for config in configs:
+        if time.monotonic() >= deadline:
+            print(f"❌ MongoDB probing hit the {MONGO_PROBE_DEADLINE}s deadline")
+            break
         try:
             print(f"Trying MongoDB connection with config: {config['name']}")
-            client = pymongo.MongoClient(mongo_uri, **config["options"])
-            
-            # Test the connection
-            client.admin.command('ping')
-            print(f"✅ MongoDB connection successful with config: {config['name']}")
-            return client, True
-            
+            probe_mongodb_config(config, deadline)
+            return config
         except Exception as e:
             print(f"❌ MongoDB connection failed with config {config['name']}: {str(e)}")
-    
-    print("❌ All MongoDB connection attempts failed")
-    return None, False
+    return None
 
-# Initialize database connection
-try:
-    # Check if pymongo is installed
-    import pymongo
-    # We've already handled certifi import at the top of the file
+# Function to try multiple MongoDB connection configurations
+def try_connect_mongodb(mongo_uri):
+    """Returns the TLS options of a working configuration, or None."""
+    if not mongo_uri:
+        print("No MongoDB URI provided")
+        return None
     
-    # MongoDB connection (we'll use environment variable in production)
-    MONGO_URI = os.environ.get("MONGO_URI")
+    configs = mongodb_tls_configs()
+    deadline = time.monotonic() + MONGO_PROBE_DEADLINE
     
-    if MONGO_URI:
+    # Try last boot's winner on its own first - usually the only probe needed
+    cached_name = load_cached_mongo_config(mongo_uri)
+    cached = [config for config in configs if config["name"] == cached_name]
+    if cached:
+        try:
+            print(f"Trying cached MongoDB connection config: {cached_name}")
+            probe_mongodb_config(cached[0], deadline)
+            print(f"✅ MongoDB connection successful with config: {cached_name}")
+            return cached[0]["options"]
+        except Exception as e:
+            print(f"❌ Cached MongoDB config {cached_name} failed: {str(e)}")
+            forget_cached_mongo_config()
+            configs = [config for config in configs if config["name"] != cached_name]
+    
+    if MONGO_PROBE_MODE == "sequential":
+        winner = probe_mongodb_configs_sequential(configs, deadline)
+    else:
+        print(f"Trying {len(configs)} MongoDB connection configs in parallel")
+        winner = probe_mongodb_configs_parallel(configs, deadline)
+    
+    if winner is None:
+        print("❌ All MongoDB connection attempts failed")
+        return None
+    
+    print(f"✅ MongoDB connection successful with config: {winner['name']}")
+    save_cached_mongo_config(mongo_uri, winner["name"])
+    return winner["options"]
+
+# False until init_database() has run in this process (or its parent, before forking)
+using_mongodb = False
+database_initialized = False
+database_init_lock = threading.Lock()
+
+# Initialize database connection
+def init_database():
+    global using_mongodb
+    try:
+        if not MONGO_URI:
+            print("⚠️ No MongoDB URI provided, using fallback storage")
+            using_mongodb = False
+            return
+        import_pymongo()
+        
         # Try multiple connection configurations
-        client, connection_success = try_connect_mongodb(MONGO_URI)
-        
-        if connection_success:
-            db = client["placement_predictor"]
-            stats_collection = db["stats"]
-            predictions_collection = db["predictions"]
-            visitors_collection = db["visitors"]  # Added collection for visitor data
-            feedback_collection = db["feedback"]  # Added collection for feedback
+        tls_options = try_connect_mongodb(MONGO_URI)
+        
+        if tls_options is not None:
+            # Every route shares one client built with these options
+            mongo.configure(tls_options)
             
             # Create or update the stats document
-            stats = stats_collection.find_one({"_id": "counter"})
+            stats = mongo.collection("stats").find_one({"_id": "counter"})
             if not stats:
-                stats_collection.insert_one({
+                mongo.collection("stats").insert_one({
                     "_id": "counter",
                     "total_users": 0,
                     "predictions": 0,
@@ -123,82 +492,1904 @@ try:
                 })
             print("✅ MongoDB connection successful")
             using_mongodb = True
+            
+            # Index builds can take a while on large collections, so keep them off the first request
+            threading.Thread(target=ensure_indexes, name="ensure-indexes", daemon=True).start()
         else:
             print("⚠️ MongoDB connection failed after trying multiple configurations, using fallback storage")
             using_mongodb = False
-    else:
-        print("⚠️ No MongoDB URI provided, using fallback storage")
+    except ImportError as e:
+        print(f"⚠️ Module import error: {str(e)}, using fallback storage")
+        using_mongodb = False
+    except Exception as e:
+        print(f"❌ MongoDB connection error: {str(e)}")
         using_mongodb = False
-except ImportError as e:
-    print(f"⚠️ Module import error: {str(e)}, using fallback storage")
-    using_mongodb = False
-except Exception as e:
-    print(f"❌ MongoDB connection error: {str(e)}")
-    using_mongodb = False
+
+# Function to initialize the database layer on first use (first request or CLI command)
+def ensure_database():
+    global database_initialized
+    if database_initialized:
+        return
+    with database_init_lock:
+        if not database_initialized:
+            init_database()
+            database_initialized = True
+    # Deliver feedback left in the spool by an earlier run
+    feedback_ingest.start()
+
+# Probe endpoints answered without initializing the database
+HEALTH_ENDPOINTS = ("healthz", "readyz")
+
+# before_request hook - every route but the probes initializes the database first
+def ensure_database_for_request():
+    if not database_initialized and request.endpoint not in HEALTH_ENDPOINTS:
+        ensure_database()
+
+# Readiness (/readyz) - a background thread pings MongoDB so probes never wait on it
+READINESS_INTERVAL = float(os.environ.get("READINESS_INTERVAL", 10.0))  # seconds between pings
+READINESS_MAX_AGE = float(os.environ.get("READINESS_MAX_AGE", 3 * READINESS_INTERVAL))  # older results count as failing
+
+class ReadinessMonitor:
+    """Latest MongoDB ping result, refreshed off the request path.
+
+    The thread starts on the first status() call in each worker, initializes
+    the database there and then pings every `interval` seconds; status() only
+    reads the stored result.
+    """
+    
+    def __init__(self, interval, max_age):
+        self.interval = interval
+        self.max_age = max_age
+        self.result = None  # (ok, degraded, detail, checked_at, ping_ms)
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # A forked worker re-checks for itself rather than trusting the parent's result
+            self.result = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="readiness-monitor", daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+    
+    def check(self):
+        start = time.perf_counter()
+        degraded = False
+        try:
+            ensure_database()
+            start = time.perf_counter()
+            if not MONGO_URI:
+                ok, detail = True, "no MONGO_URI, using local storage"
+            elif not using_mongodb:
+                # Every route serves from the local files without touching MongoDB, so this
+                # worker can take traffic; failing readiness here would keep it out for good
+                ok, degraded, detail = True, True, "MongoDB unavailable, using fallback storage"
+            else:
+                with metrics.mongo_timer("readiness", "admin.ping"):
+                    mongo.client().admin.command('ping')
+                ok, detail = True, "MongoDB ping ok"
+        except Exception as e:
+            # Connected but failing: routes would wait on MongoDB's timeouts
+            ok, detail = False, f"MongoDB ping failed: {str(e)}"
+        self.result = (ok, degraded, detail, time.monotonic(), round((time.perf_counter() - start) * 1000, 1))
+    
+    def status(self):
+        """(ready, details) from the latest check - never waits on I/O."""
+        self._ensure_started()
+        result = self.result
+        if result is None:
+            return False, {"status": "starting"}
+        ok, degraded, detail, checked_at, ping_ms = result
+        age = time.monotonic() - checked_at
+        if age > self.max_age:
+            ok, detail = False, f"no MongoDB check for {age:.0f}s (last: {detail})"
+        return ok, {
+            "status": ("degraded" if degraded else "ready") if ok else "not ready",
+            "mongodb": detail,
+            "ping_ms": ping_ms,
+            "checked_seconds_ago": round(age, 1)
+        }
+
+readiness = ReadinessMonitor(READINESS_INTERVAL, READINESS_MAX_AGE)
+
+# Retention (days) of raw events, enforced by TTL indexes on timestamp; 0 keeps them forever
+VISITOR_RETENTION_DAYS = float(os.environ.get("VISITOR_RETENTION_DAYS", 0))
+PREDICTION_RETENTION_DAYS = float(os.environ.get("PREDICTION_RETENTION_DAYS", 0))
+
+# Optional hourly bucket documents (<collection>_hourly) holding the same events, for long-term history
+EVENT_BUCKETS = os.environ.get("EVENT_BUCKETS", "0") == "1"
+EVENT_BUCKET_MAX_EVENTS = int(os.environ.get("EVENT_BUCKET_MAX_EVENTS", 1000))  # a full bucket takes no more events
+EVENT_BUCKET_RETENTION_DAYS = float(os.environ.get("EVENT_BUCKET_RETENTION_DAYS", 0))
+BUCKETED_COLLECTIONS = ("visitors", "predictions")
+
+# Result of the last ensure_indexes() run, shown on /mongo-status
+index_status = {}
+
+# Function to turn a retention in days into a TTL (None = no TTL)
+def retention_seconds(days):
+    return int(days * 24 * 60 * 60) if days > 0 else None
+
+def index_specs():
+    """(collection, keys, ttl_seconds) for every index the app relies on."""
+    specs = [
+        ("visitors", [("timestamp", 1)], retention_seconds(VISITOR_RETENTION_DAYS)),
+        ("visitors", [("user_id", 1)], None),
+        ("predictions", [("timestamp", 1)], retention_seconds(PREDICTION_RETENTION_DAYS)),
+        ("predictions", [("user_id", 1)], None),
+        ("feedback", [("timestamp", 1)], None)
+    ]
+    if EVENT_BUCKETS:
+        for name in BUCKETED_COLLECTIONS:
+            specs.append((f"{name}_hourly", [("start", 1)], retention_seconds(EVENT_BUCKET_RETENTION_DAYS)))
+    if ROLLUPS_ENABLED:
+        # Rollup documents carry their own expiry time (per granularity)
+        specs.append((ROLLUP_COLLECTION, [("expires_at", 1)], 0))
+        specs.append((ROLLUP_USERS_COLLECTION, [("expires_at", 1)], 0))
+    return specs
+
+# Function to create one index, or bring an existing one's TTL in line with the settings
+def ensure_index(collection_name, keys, ttl_seconds):
+    collection = mongo.collection(collection_name)
+    name = "_".join(f"{field}_{direction}" for field, direction in keys)  # pymongo's default name
+    options = {"name": name}
+    if ttl_seconds is not None:
+        options["expireAfterSeconds"] = ttl_seconds
+    
+    existing = collection.index_information().get(name)
+    if existing is None:
+        collection.create_index(keys, **options)
+        return "created"
+    current_ttl = existing.get("expireAfterSeconds")
+    if current_ttl == ttl_seconds:
+        return "ok"
+    if current_ttl is not None and ttl_seconds is not None:
+        # Changing an existing TTL does not need a rebuild
+        mongo.database().command("collMod", collection_name, index={"name": name, "expireAfterSeconds": ttl_seconds})
+        return "ttl updated"
+    # Adding or removing a TTL means rebuilding the index
+    collection.drop_index(name)
+    collection.create_index(keys, **options)
+    return "rebuilt"
+
+# Function to create and verify every index (idempotent, runs off the request path)
+def ensure_indexes():
+    for collection_name, keys, ttl_seconds in index_specs():
+        label = f"{collection_name}.{'_'.join(field for field, _ in keys)}"
+        try:
+            result = ensure_index(collection_name, keys, ttl_seconds)
+            index_status[label] = result + (f" (ttl {ttl_seconds}s)" if ttl_seconds is not None else "")
+            if result != "ok":
+                print(f"✅ Index {label}: {index_status[label]}")
+        except Exception as e:
+            index_status[label] = f"error: {str(e)}"
+            print(f"❌ Error ensuring index {label}: {str(e)}")
+    return index_status
+
+# Function to group events into per-hour bucket updates for <collection>_hourly
+def event_bucket_updates(documents):
+    """(filter, update) pairs appending documents to hourly buckets.
+
+    Each upsert targets a bucket for the hour that still has room; a bucket
+    stops taking events once it holds EVENT_BUCKET_MAX_EVENTS, so a busy hour
+    spills into several bounded documents.
+    """
+    hours = {}
+    for document in documents:
+        start = document["timestamp"].replace(minute=0, second=0, microsecond=0)
+        hours.setdefault(start, []).append({key: value for key, value in document.items() if key != "_id"})
+    return [
+        ({"start": start, "count": {"$lt": EVENT_BUCKET_MAX_EVENTS}},
+         {"$push": {"events": {"$each": events}}, "$inc": {"count": len(events)}})
+        for start, events in hours.items()
+    ]
+
+# Function to append events to their hourly buckets (EVENT_BUCKETS=1)
+def bucket_events(collection_name, documents):
+    if not EVENT_BUCKETS or collection_name not in BUCKETED_COLLECTIONS:
+        return
+    try:
+        buckets = mongo.collection(f"{collection_name}_hourly")
+        for bucket_filter, update in event_bucket_updates(documents):
+            buckets.update_one(bucket_filter, update, upsert=True)
+    except Exception as e:
+        print(f"❌ Error bucketing {len(documents)} {collection_name} events: {str(e)}")
+
+# Pre-aggregated analytics (minute/hour/day buckets) served by /stats
+ROLLUPS_ENABLED = os.environ.get("ROLLUPS", "1") == "1"
+ROLLUP_COLLECTION = "rollups"
+ROLLUP_USERS_COLLECTION = "rollup_users"  # (day, user_id) markers for unique users per day
+ROLLUP_RETENTION_HOURS = {
+    "minute": float(os.environ.get("ROLLUP_MINUTE_RETENTION_HOURS", 48)),
+    "hour": float(os.environ.get("ROLLUP_HOUR_RETENTION_HOURS", 90 * 24)),
+    "day": float(os.environ.get("ROLLUP_DAY_RETENTION_HOURS", 0))  # 0 = keep forever
+}
+ROLLUP_FORMATS = {  # bucket keys; strftime and MongoDB's $dateToString share these codes
+    "minute": "%Y-%m-%dT%H:%M",
+    "hour": "%Y-%m-%dT%H:00",
+    "day": "%Y-%m-%d"
+}
+ROLLUP_CGPA_BIN = 0.5  # width of the CGPA distribution bins
+STATS_MAX_BUCKETS = int(os.environ.get("STATS_MAX_BUCKETS", 1000))
+
+class RollupStore:
+    """Minute/hour/day counters kept up to date as events are written.
+
+    Each bucket is one document, _id "<granularity>:<start>", holding $inc
+    counters: predictions, package_sum, cgpa_hist.<bin>, visits,
+    unique_users (day buckets only), feedback and rating_hist.<rating>.
+    A batch of events becomes one upsert per bucket it touches, and /stats
+    reads a time range as an _id range scan - O(buckets), not O(events).
+    """
+    
+    def __init__(self, collection_name, users_collection_name):
+        self.collection_name = collection_name
+        self.users_collection_name = users_collection_name
+    
+    @staticmethod
+    def bucket_id(granularity, timestamp):
+        return f"{granularity}:{timestamp.strftime(ROLLUP_FORMATS[granularity])}"
+    
+    @staticmethod
+    def bucket_start(granularity, key):
+        return datetime.strptime(key, ROLLUP_FORMATS[granularity])
+    
+    @staticmethod
+    def event_counters(collection_name, document):
+        if collection_name == "predictions":
+            return {
+                "predictions": 1,
+                "package_sum": document.get("prediction") or 0,
+                f"cgpa_hist.{int(document.get('cgpa', 0) // ROLLUP_CGPA_BIN)}": 1
+            }
+        if collection_name == "visitors":
+            return {"visits": 1}
+        if collection_name == "feedback":
+            return {"feedback": 1, f"rating_hist.{document.get('rating')}": 1}
+        return None
+    
+    def _expiry(self, granularity, start):
+        hours = ROLLUP_RETENTION_HOURS[granularity]
+        return start + timedelta(hours=hours) if hours > 0 else None
+    
+    def _update(self, bucket, counters):
+        granularity, key = bucket.split(":", 1)
+        start = self.bucket_start(granularity, key)
+        on_insert = {"granularity": granularity, "start": start}
+        expires_at = self._expiry(granularity, start)
+        if expires_at:
+            on_insert["expires_at"] = expires_at
+        return {"$inc": counters, "$setOnInsert": on_insert}
+    
+    def operations(self, collection_name, documents):
+        """(bucket updates, unique-user markers) for a batch of events.
+
+        Returns two lists of pymongo UpdateOne operations; run the markers
+        first and pass their upserted_ids to unique_user_operations().
+        """
+        UpdateOne = import_pymongo().UpdateOne
+        buckets = {}
+        markers = []
+        for document in documents:
+            counters = self.event_counters(collection_name, document)
+            timestamp = document.get("timestamp")
+            if not counters or not isinstance(timestamp, datetime):
+                continue
+            for granularity in ROLLUP_FORMATS:
+                totals = buckets.setdefault(self.bucket_id(granularity, timestamp), {})
+                for field, value in counters.items():
+                    totals[field] = totals.get(field, 0) + value
+            if collection_name == "visitors" and document.get("user_id"):
+                day = self.bucket_id("day", timestamp)
+                markers.append(UpdateOne(
+                    {"_id": f"{day}:{document['user_id']}"},
+                    {"$setOnInsert": {"day": day, "expires_at": timestamp + timedelta(days=2)}},
+                    upsert=True
+                ))
+        updates = [UpdateOne({"_id": bucket}, self._update(bucket, counters), upsert=True)
+                   for bucket, counters in buckets.items()]
+        return updates, markers
+    
+    def unique_user_operations(self, markers, upserted_ids):
+        """$inc unique_users on each day for the markers that were newly inserted."""
+        UpdateOne = import_pymongo().UpdateOne
+        new_users = {}
+        for marker_id in upserted_ids.values():
+            day = ":".join(marker_id.split(":", 2)[:2])  # "day:<date>:<user_id>" -> "day:<date>"
+            new_users[day] = new_users.get(day, 0) + 1
+        return [UpdateOne({"_id": day}, self._update(day, {"unique_users": count}), upsert=True)
+                for day, count in new_users.items()]
+    
+    def record(self, collection_name, documents):
+        """Fold a batch of stored events into the rollups (sync MongoDB)."""
+        if not ROLLUPS_ENABLED or not documents:
+            return
+        try:
+            updates, markers = self.operations(collection_name, documents)
+            if markers:
+                result = mongo.collection(self.users_collection_name).bulk_write(markers, ordered=False)
+                updates += self.unique_user_operations(markers, result.upserted_ids)
+            if updates:
+                mongo.collection(self.collection_name).bulk_write(updates, ordered=False)
+        except Exception as e:
+            print(f"❌ Error updating {collection_name} rollups: {str(e)}")
+    
+    def query(self, granularity, since, until, limit=STATS_MAX_BUCKETS):
+        """Bucket documents overlapping [since, until), oldest first."""
+        last = self.bucket_id(granularity, until)
+        # The bucket containing until is included unless until is exactly its start
+        upper = "$lt" if self.bucket_start(granularity, last.split(":", 1)[1]) == until else "$lte"
+        return list(mongo.collection(self.collection_name).find(
+            {"_id": {"$gte": self.bucket_id(granularity, since), upper: last}}
+        ).sort("_id", 1).limit(limit))
+    
+    @staticmethod
+    def merge(documents):
+        """One bucket-shaped document summing the counters of several."""
+        merged = {"predictions": 0, "package_sum": 0, "visits": 0, "feedback": 0, "rating_hist": {}, "cgpa_hist": {}}
+        for document in documents:
+            for field in ("predictions", "package_sum", "visits", "feedback"):
+                merged[field] += document.get(field, 0)
+            for field in ("rating_hist", "cgpa_hist"):
+                for key, count in document.get(field, {}).items():
+                    merged[field][key] = merged[field].get(key, 0) + count
+        return merged
+    
+    @staticmethod
+    def format_bucket(document, unique_users=None):
+        predictions = document.get("predictions", 0)
+        return {
+            "predictions": predictions,
+            "mean_package": round(document.get("package_sum", 0) / predictions, 2) if predictions else None,
+            "visits": document.get("visits", 0),
+            "unique_users": unique_users,
+            "feedback": document.get("feedback", 0),
+            "ratings": dict(sorted(document.get("rating_hist", {}).items())),
+            "cgpa_distribution": {f"{int(index) * ROLLUP_CGPA_BIN:.1f}": count
+                                  for index, count in sorted(document.get("cgpa_hist", {}).items(),
+                                                             key=lambda item: int(item[0]))}
+        }
+    
+    def backfill(self, since=None, until=None):
+        """Rebuild the buckets in [since, until) from the raw collections.
+
+        Runs one aggregation pipeline per collection and granularity and
+        overwrites the counters of the buckets it finds (unique users are
+        recounted per day), so it is safe to re-run over the same range.
+        Live increments for a bucket being rebuilt may be overwritten.
+        """
+        match = {"timestamp": {"$type": "date"}}
+        if since:
+            match["timestamp"]["$gte"] = since
+        if until:
+            match["timestamp"]["$lt"] = until
+        db = mongo.database()
+        buckets = 0
+        for granularity, fmt in ROLLUP_FORMATS.items():
+            bucket_key = {"$dateToString": {"format": fmt, "date": "$timestamp"}}
+            values = {}
+            
+            for row in db.predictions.aggregate([
+                {"$match": match},
+                {"$group": {
+                    "_id": {"bucket": bucket_key, "bin": {"$floor": {"$divide": ["$cgpa", ROLLUP_CGPA_BIN]}}},
+                    "count": {"$sum": 1}, "package_sum": {"$sum": "$prediction"}
+                }}
+            ], allowDiskUse=True):
+                bucket = values.setdefault(row["_id"]["bucket"], {"predictions": 0, "package_sum": 0, "cgpa_hist": {}})
+                bucket["predictions"] += row["count"]
+                bucket["package_sum"] += row["package_sum"]
+                bucket["cgpa_hist"][str(int(row["_id"]["bin"]))] = row["count"]
+            
+            for row in db.visitors.aggregate([
+                {"$match": match},
+                {"$group": {"_id": bucket_key, "visits": {"$sum": 1}}}
+            ], allowDiskUse=True):
+                values.setdefault(row["_id"], {})["visits"] = row["visits"]
+            
+            if granularity == "day":
+                for row in db.visitors.aggregate([
+                    {"$match": dict(match, user_id={"$type": "string"})},
+                    {"$group": {"_id": {"bucket": bucket_key, "user_id": "$user_id"}}},
+                    {"$group": {"_id": "$_id.bucket", "unique_users": {"$sum": 1}}}
+                ], allowDiskUse=True):
+                    values.setdefault(row["_id"], {})["unique_users"] = row["unique_users"]
+            
+            for row in db.feedback.aggregate([
+                {"$match": match},
+                {"$group": {"_id": {"bucket": bucket_key, "rating": "$rating"}, "count": {"$sum": 1}}}
+            ], allowDiskUse=True):
+                bucket = values.setdefault(row["_id"]["bucket"], {"feedback": 0, "rating_hist": {}})
+                bucket["feedback"] = bucket.get("feedback", 0) + row["count"]
+                bucket.setdefault("rating_hist", {})[str(row["_id"]["rating"])] = row["count"]
+            
+            for key, fields in values.items():
+                bucket = f"{granularity}:{key}"
+                start = self.bucket_start(granularity, key)
+                fields.update({"granularity": granularity, "start": start})
+                expires_at = self._expiry(granularity, start)
+                if expires_at:
+                    fields["expires_at"] = expires_at
+                mongo.collection(self.collection_name).update_one({"_id": bucket}, {"$set": fields}, upsert=True)
+            buckets += len(values)
+        return buckets
+
+rollups = RollupStore(ROLLUP_COLLECTION, ROLLUP_USERS_COLLECTION)
 
 # Counter file path - use the same directory as the app.py file (fallback method)
 COUNTER_FILE = os.path.join(os.getcwd(), 'user_counter.json')
 
-# Check for templates and static directories and create if missing
-if not os.path.exists('templates'):
-    os.makedirs('templates', exist_ok=True)
-    print("Created templates directory")
+# Local storage used when MongoDB is unavailable
+DATA_DIR = os.environ.get("DATA_DIR", os.path.join(os.getcwd(), 'data'))
+FILE_STORAGE_BACKEND = os.environ.get("FILE_STORAGE_BACKEND", "ndjson")  # "ndjson" or "json" (legacy)
+FILE_STORE_SEGMENT_BYTES = int(os.environ.get("FILE_STORE_SEGMENT_BYTES", 8 * 1024 * 1024))
+FILE_STORE_FSYNC_EVERY = int(os.environ.get("FILE_STORE_FSYNC_EVERY", 32))  # records between fsyncs
+FILE_STORE_FSYNC_INTERVAL = float(os.environ.get("FILE_STORE_FSYNC_INTERVAL", 1.0))  # max seconds between fsyncs
+
+class NDJSONSegmentStore:
+    """Append-only record store made of numbered NDJSON segment files.
+
+    Appends are a single O_APPEND write under an exclusive lock (a threading
+    lock plus fcntl.flock on <directory>/.lock across processes), so their cost
+    does not grow with the amount already stored. fsync is batched: every
+    FILE_STORE_FSYNC_EVERY records or FILE_STORE_FSYNC_INTERVAL seconds, on
+    rotation and on close. A segment is sealed once it reaches segment_bytes;
+    compact() merges the sealed segments into one.
+    """
+    
+    def __init__(self, directory, name, legacy_file=None, segment_bytes=FILE_STORE_SEGMENT_BYTES,
+                 fsync_every=FILE_STORE_FSYNC_EVERY, fsync_interval=FILE_STORE_FSYNC_INTERVAL):
+        self.directory = directory
+        self.name = name
+        self.legacy_file = legacy_file
+        self.segment_bytes = segment_bytes
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._thread_lock = threading.RLock()
+        self._pid = None
+        self._lock_fd = None
+        self._fd = None
+        self._index = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def _segment_path(self, index):
+        return os.path.join(self.directory, f"{self.name}-{index:06d}.ndjson")
+    
+    def segment_indexes(self):
+        prefix, suffix = f"{self.name}-", ".ndjson"
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        indexes = []
+        for entry in names:
+            if entry.startswith(prefix) and entry.endswith(suffix):
+                try:
+                    indexes.append(int(entry[len(prefix):-len(suffix)]))
+                except ValueError:
+                    pass
+        return sorted(indexes)
+    
+    @contextmanager
+    def _lock(self):
+        with self._thread_lock:
+            self._reset_after_fork()
+            if has_fcntl:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if has_fcntl:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+    
+    def _reset_after_fork(self):
+        # File descriptors opened by a parent process are not ours to write through
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._pid = os.getpid()
+        self._lock_fd = os.open(os.path.join(self.directory, f".{self.name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = None
+        self._index = None
+        self._unsynced = 0
+    
+    def _open_active(self):
+        """Point self._fd at the newest segment (caller holds the lock)."""
+        if self._fd is not None and os.fstat(self._fd).st_nlink == 0:
+            # Our segment was merged away by a compaction in another process
+            os.close(self._fd)
+            self._fd = None
+        if self._fd is None:
+            indexes = self.segment_indexes()
+            self._index = indexes[-1] if indexes else 1
+            self._fd = os.open(self._segment_path(self._index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        
+        # Another process may have rotated since our last write - one stat per step
+        while os.path.exists(self._segment_path(self._index + 1)):
+            self._sync()
+            os.close(self._fd)
+            self._index += 1
+            self._fd = os.open(self._segment_path(self._index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    
+    def _sync(self):
+        if self._fd is not None and self._unsynced:
+            os.fsync(self._fd)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+    
+    def _rotate(self):
+        self._sync()
+        os.close(self._fd)
+        self._index += 1
+        self._fd = os.open(self._segment_path(self._index), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    
+    def append(self, record):
+        self.append_many([record])
+    
+    def append_many(self, records):
+        data = "".join(json.dumps(record, default=str) + "\n" for record in records).encode('utf-8')
+        if not data:
+            return
+        with self._lock():
+            self._open_active()
+            os.write(self._fd, data)
+            self._unsynced += len(records)
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+            if os.fstat(self._fd).st_size >= self.segment_bytes:
+                self._rotate()
+    
+    def _read_segment(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # a write still in progress
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # torn line left by a crash
+        except FileNotFoundError:
+            return  # removed by a concurrent compaction
+    
+    def seal(self):
+        """Seal the active segment if it has records; returns every sealed segment index."""
+        with self._lock():
+            self._open_active()
+            if os.fstat(self._fd).st_size:
+                self._rotate()
+            return [index for index in self.segment_indexes() if index < self._index]
+    
+    def read_segment(self, index):
+        return self._read_segment(self._segment_path(index))
+    
+    def remove_segment(self, index):
+        try:
+            os.remove(self._segment_path(index))
+        except FileNotFoundError:
+            pass
+    
+    def _legacy_marker(self):
+        return os.path.join(self.directory, f".{self.name}.legacy-migrated")
+    
+    def _legacy_digest(self):
+        """sha256 of the legacy JSON file, or None if there is none."""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return None
+        with open(self.legacy_file, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    
+    def _legacy_pending(self):
+        """True if the legacy file has records not yet folded into the segments.
+        
+        The file may be tracked in git, so compaction records its digest in a
+        marker file instead of renaming it; a changed file is migrated again.
+        """
+        digest = self._legacy_digest()
+        if digest is None:
+            return False
+        try:
+            with open(self._legacy_marker(), 'r') as f:
+                return f.read().strip() != digest
+        except FileNotFoundError:
+            return True
+    
+    def iter_records(self):
+        """Stream every stored record in write order without loading them all."""
+        if self._legacy_pending():
+            try:
+                with open(self.legacy_file, 'r') as f:
+                    legacy = json.load(f)
+                for record in legacy if isinstance(legacy, list) else []:
+                    yield record
+            except ValueError:
+                pass
+        for index in self.segment_indexes():
+            yield from self._read_segment(self._segment_path(index))
+    
+    def __iter__(self):
+        return self.iter_records()
+    
+    def compact(self):
+        """Merge sealed segments (and any legacy JSON file) into one segment.
+
+        Returns the number of records kept. The active segment is sealed first
+        if it has records, so writers are only blocked for the duration of the
+        merge and a run with nothing new to merge leaves no empty segment behind.
+        """
+        with self._lock():
+            self._open_active()
+            if os.fstat(self._fd).st_size:
+                self._rotate()
+            sealed = [index for index in self.segment_indexes() if index < self._index]
+            if not sealed:
+                return 0
+            
+            target = self._segment_path(sealed[0])
+            tmp_path = f"{target}.compact.tmp"
+            kept = 0
+            legacy_digest = self._legacy_digest() if self._legacy_pending() else None
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                if legacy_digest:
+                    try:
+                        with open(self.legacy_file, 'r') as f:
+                            legacy = json.load(f)
+                        for record in legacy if isinstance(legacy, list) else []:
+                            out.write(json.dumps(record, default=str) + "\n")
+                            kept += 1
+                    except ValueError:
+                        pass
+                for index in sealed:
+                    for record in self._read_segment(self._segment_path(index)):
+                        out.write(json.dumps(record, default=str) + "\n")
+                        kept += 1
+                out.flush()
+                os.fsync(out.fileno())
+            
+            os.replace(tmp_path, target)
+            for index in sealed[1:]:
+                os.remove(self._segment_path(index))
+            if legacy_digest:
+                with open(self._legacy_marker(), 'w') as f:
+                    f.write(legacy_digest)
+            return kept
+    
+    def close(self):
+        with self._thread_lock:
+            if self._pid != os.getpid():
+                return
+            if self._fd is not None:
+                self._sync()
+                os.close(self._fd)
+                self._fd = None
+
+class JSONArrayStore:
+    """Legacy backend: the whole JSON array is rewritten on every append (O(n))."""
+    
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+    
+    def _load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                return []
+        return []
+    
+    def append(self, record):
+        self.append_many([record])
+    
+    def append_many(self, records):
+        with self._thread_lock:
+            all_records = self._load()
+            all_records.extend(records)
+            with open(self.path, 'w') as f:
+                json.dump(all_records, f, indent=2, default=str)
+    
+    def iter_records(self):
+        return iter(self._load())
+    
+    def __iter__(self):
+        return self.iter_records()
+    
+    def compact(self):
+        return len(self._load())
+    
+    def close(self):
+        pass
+
+# Function to create the local store for one kind of record
+def create_file_store(name, legacy_file=None):
+    if FILE_STORAGE_BACKEND == "json":
+        return JSONArrayStore(legacy_file or os.path.join(DATA_DIR, f"{name}.json"))
+    store = NDJSONSegmentStore(os.path.join(DATA_DIR, name), name, legacy_file=legacy_file)
+    atexit.register(store.close)
+    return store
+
+class CounterFile:
+    """Fixed-layout file of 64-bit counters shared by every worker via mmap.
+
+    Increments happen in place under an exclusive fcntl lock, so concurrent
+    workers never lose updates and each one costs a lock plus two memory
+    writes. The file is created (seeded from user_counter.json) in a temp file
+    and linked into place atomically; a torn or foreign file is rebuilt the
+    same way.
+    """
+    
+    LAYOUT = struct.Struct('<4s4xqq')
+    MAGIC = b'TRC1'
+    
+    def __init__(self, path, seed_file=None, defaults=None, flush_interval=FILE_STORE_FSYNC_INTERVAL):
+        self.path = path
+        self.seed_file = seed_file
+        self.defaults = defaults or {}
+        self.flush_interval = flush_interval
+        self._thread_lock = threading.RLock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+        self._last_flush = time.monotonic()
+    
+    def _seed(self):
+        counts = dict(self.defaults)
+        if self.seed_file and os.path.exists(self.seed_file):
+            try:
+                with open(self.seed_file, 'r') as f:
+                    counts.update(json.load(f))
+            except ValueError:
+                pass
+        return counts.get('total_users', 0), counts.get('predictions', 0)
+    
+    def _write_new(self, replace=False):
+        # Build the complete file aside, then link/rename it into place atomically
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.LAYOUT.pack(self.MAGIC, *self._seed()))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            if replace:
+                os.replace(tmp_path, self.path)
+            else:
+                os.link(tmp_path, self.path)  # fails if another worker won the race
+        except FileExistsError:
+            pass
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _unmap(self):
+        if self._map is not None:
+            self._map.close()
+            os.close(self._fd)
+        self._map = None
+        self._fd = None
+    
+    def _ensure_open(self):
+        if self._pid != os.getpid():
+            # Mappings inherited from a parent process are dropped, not reused
+            self._map = None
+            self._fd = None
+            self._pid = os.getpid()
+        elif self._map is not None and os.fstat(self._fd).st_nlink == 0:
+            self._unmap()  # the file was rebuilt by another worker
+        if self._map is not None:
+            return
+        
+        if not os.path.exists(self.path):
+            self._write_new()
+        self._fd = os.open(self.path, os.O_RDWR)
+        if not self._valid():
+            os.close(self._fd)
+            print(f"⚠️ Counter file {self.path} is damaged, rebuilding it")
+            self._write_new(replace=True)
+            self._fd = os.open(self.path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, self.LAYOUT.size)
+    
+    def _valid(self):
+        if os.fstat(self._fd).st_size != self.LAYOUT.size:
+            return False
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        return os.read(self._fd, len(self.MAGIC)) == self.MAGIC
+    
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._thread_lock:
+            self._ensure_open()
+            if has_fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield self.LAYOUT.unpack_from(self._map)[1:]
+            finally:
+                if has_fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+    
+    def read(self):
+        with self._locked(exclusive=False) as counts:
+            return counts
+    
+    def increment(self, total_users=0, predictions=0):
+        """Atomically add to the counters and return the new values."""
+        with self._locked(exclusive=True) as (current_users, current_predictions):
+            counts = (current_users + total_users, current_predictions + predictions)
+            self.LAYOUT.pack_into(self._map, 0, self.MAGIC, *counts)
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._map.flush()
+                self._last_flush = time.monotonic()
+            return counts
+    
+    def reset(self, total_users=0, predictions=0):
+        with self._locked(exclusive=True):
+            self.LAYOUT.pack_into(self._map, 0, self.MAGIC, total_users, predictions)
+            self._map.flush()
+        return total_users, predictions
+    
+    def close(self):
+        with self._thread_lock:
+            if self._map is not None and self._pid == os.getpid():
+                self._map.flush()
+                self._unmap()
+
+# Counters used while MongoDB is unavailable, seeded once from user_counter.json
+counter_file = CounterFile(
+    os.path.join(DATA_DIR, 'counters.bin'),
+    seed_file=COUNTER_FILE,
+    defaults=in_memory_stats
+)
+atexit.register(counter_file.close)
+
+# Feedback saved while MongoDB is unavailable (feedback.json is read for older entries)
+feedback_store = create_file_store("feedback", legacy_file=os.path.join(os.getcwd(), 'feedback.json'))
+
+# Unique-visitor sketches (HyperLogLog per day, keyed on user_id)
+HLL_PRECISION = int(os.environ.get("HLL_PRECISION", 14))  # 2**14 registers: ~0.8% standard error, 16 KiB per day
+HLL_FLUSH_INTERVAL = float(os.environ.get("HLL_FLUSH_INTERVAL", 5.0))  # seconds between merges into storage
+HLL_COLLECTION = "unique_visitors"
+HLL_MAX_DAYS = 366  # longest window one query may merge
+
+class HyperLogLog:
+    """Fixed-size distinct-count sketch (Flajolet et al.) over 64-bit hashes.
+
+    One byte register per bucket; merging two sketches is an element-wise
+    max, so per-worker and per-day sketches combine without loss.
+    """
+    
+    def __init__(self, precision=HLL_PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is not None and len(registers) != self.size:
+            raise ValueError(f"Expected {self.size} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+    
+    def add(self, value):
+        x = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1  # position of the first 1 bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def update(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+    
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+    
+    def to_bytes(self):
+        return bytes(self.registers)
+
+class UniqueVisitorCounter:
+    """Per-day HyperLogLog sketches of user_id, shared by all workers.
+
+    add() only touches this worker's in-memory sketch for the day. Every
+    HLL_FLUSH_INTERVAL seconds the pending sketches are merged into storage:
+    a MongoDB document per day (compare-and-swap on a version field) or a
+    file per day under DATA_DIR/hll (under flock), always on the analytics
+    thread.
+    Queries merge the stored day sketches, so their memory and time depend
+    on the window length, never on the number of visitors.
+    """
+    
+    def __init__(self, directory, precision=HLL_PRECISION, flush_interval=HLL_FLUSH_INTERVAL):
+        self.directory = directory
+        self.precision = precision
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+    
+    @staticmethod
+    def day_key(timestamp):
+        return timestamp.strftime("%Y-%m-%d")
+    
+    def add(self, user_id, timestamp=None):
+        if not user_id:
+            return
+        day = self.day_key(timestamp or datetime.now())
+        with self._lock:
+            sketch = self._pending.get(day)
+            if sketch is None:
+                sketch = self._pending[day] = HyperLogLog(self.precision)
+            sketch.add(user_id)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = time.monotonic()
+        if due:
+            # Never on the request thread (or the ASGI event loop) - the merge does network or locked file I/O
+            analytics.defer(self.flush)
+    
+    def flush(self):
+        """Merge the pending sketches into storage."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for day, sketch in pending.items():
+            try:
+                if using_mongodb:
+                    self._merge_into_mongo(day, sketch)
+                else:
+                    self._merge_into_file(day, sketch)
+            except Exception as e:
+                print(f"❌ Error saving unique-visitor sketch for {day}: {str(e)}")
+                with self._lock:
+                    kept = self._pending.setdefault(day, HyperLogLog(self.precision))
+                    kept.update(sketch)
+    
+    def _merge_into_mongo(self, day, sketch, attempts=5):
+        collection = mongo.collection(HLL_COLLECTION)
+        for _ in range(attempts):
+            stored = collection.find_one({"_id": day})
+            merged = HyperLogLog(self.precision)
+            merged.update(sketch)
+            if stored is None:
+                try:
+                    collection.insert_one({"_id": day, "registers": merged.to_bytes(), "precision": self.precision,
+                                           "version": 1, "updated_at": datetime.now()})
+                    return
+                except import_pymongo().errors.DuplicateKeyError:
+                    continue  # another worker created it first
+            merged.update(HyperLogLog(self.precision, stored["registers"]))
+            result = collection.update_one(
+                {"_id": day, "version": stored["version"]},
+                {"$set": {"registers": merged.to_bytes(), "updated_at": datetime.now()}, "$inc": {"version": 1}}
+            )
+            if result.matched_count:
+                return
+        raise RuntimeError(f"sketch for {day} kept changing, will retry on the next flush")
+    
+    def _file_path(self, day):
+        return os.path.join(self.directory, f"{day}.hll")
+    
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), 'a') as lock_file:
+            if has_fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+    
+    def _merge_into_file(self, day, sketch):
+        with self._file_lock():
+            merged = self._read_file(day) or HyperLogLog(self.precision)
+            merged.update(sketch)
+            tmp_path = f"{self._file_path(day)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(merged.to_bytes())
+            os.replace(tmp_path, self._file_path(day))
+    
+    def _read_file(self, day):
+        try:
+            with open(self._file_path(day), 'rb') as f:
+                return HyperLogLog(self.precision, f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def load(self, day):
+        """The day's sketch: stored registers plus this worker's pending ones."""
+        sketch = HyperLogLog(self.precision)
+        if using_mongodb:
+            stored = mongo.collection(HLL_COLLECTION).find_one({"_id": day})
+            if stored is not None and stored.get("precision") == self.precision:
+                sketch.update(HyperLogLog(self.precision, stored["registers"]))
+        else:
+            stored = self._read_file(day)
+            if stored is not None:
+                sketch.update(stored)
+        with self._lock:
+            pending = self._pending.get(day)
+            if pending is not None:
+                sketch.update(pending)
+        return sketch
+    
+    def estimate(self, first_day, last_day):
+        """(distinct users over the inclusive day range, per-day estimates)."""
+        total = HyperLogLog(self.precision)
+        per_day = {}
+        day = first_day
+        while day <= last_day:
+            key = self.day_key(day)
+            sketch = self.load(key)
+            per_day[key] = sketch.count()
+            total.update(sketch)
+            day += timedelta(days=1)
+        return total.count(), per_day
+
+unique_visitors = UniqueVisitorCounter(os.path.join(DATA_DIR, "hll"))
+atexit.register(unique_visitors.flush)
+
+# Function to lay out templates/ and static/ - run once at build time
+# (`flask prepare-assets`), never on import
+def prepare_assets():
+    # Check for templates and static directories and create if missing
+    if not os.path.exists('templates'):
+        os.makedirs('templates', exist_ok=True)
+        print("Created templates directory")
+    
+    if not os.path.exists('static'):
+        os.makedirs('static', exist_ok=True)
+        print("Created static directory")
+    
+    # Check if index.html and style.css are in root and copy to respective directories
+    if os.path.exists('index.html') and not os.path.exists('templates/index.html'):
+        try:
+            with open('index.html', 'r') as src, open('templates/index.html', 'w') as dst:
+                dst.write(src.read())
+            print("✅ Successfully copied index.html to templates/")
+        except Exception as e:
+            print(f"❌ Error copying index.html: {str(e)}")
+    
+    if os.path.exists('style.css') and not os.path.exists('static/style.css'):
+        try:
+            with open('style.css', 'r') as src, open('static/style.css', 'w') as dst:
+                dst.write(src.read())
+            print("✅ Successfully copied style.css to static/")
+        except Exception as e:
+            print(f"❌ Error copying style.css: {str(e)}")
+    
+    if not os.path.exists('templates/index.html'):
+        print("WARNING: index.html not found in templates directory after setup")
+    if not os.path.exists('static/style.css'):
+        print("WARNING: style.css not found in static directory after setup")
 
-if not os.path.exists('static'):
-    os.makedirs('static', exist_ok=True)
-    print("Created static directory")
+# Fingerprinted static assets - written by `flask build-assets`, served with immutable caching
+ASSET_MANIFEST_FILE = "manifest.json"  # inside static/
+ASSET_MAX_AGE = 365*24*60*60  # fingerprinted names change with their content
+ASSET_HASH_LENGTH = 10
 
-# Check if index.html and style.css are in root and copy to respective directories
-if os.path.exists('index.html') and not os.path.exists('templates/index.html'):
+# CDN files bundled by `flask build-assets --vendor`, in page order. Font Awesome
+# (relative webfont URLs) and Google Fonts (per-browser CSS) stay on their CDNs.
+VENDOR_BUNDLES = {
+    "vendor.css": [
+        "https://cdn.jsdelivr.net/npm/bootstrap@4.6.0/dist/css/bootstrap.min.css"
+    ],
+    "vendor.js": [
+        "https://code.jquery.com/jquery-3.5.1.slim.min.js",
+        "https://cdn.jsdelivr.net/npm/bootstrap@4.6.0/dist/js/bootstrap.bundle.min.js",
+        "https://cdn.jsdelivr.net/npm/canvas-confetti@1.4.0/dist/confetti.browser.min.js"
+    ]
+}
+
+# Function to download the CDN files and write one bundle per entry in VENDOR_BUNDLES
+def vendor_assets(static_dir):
+    import urllib.request
+    bundles = []
+    for bundle_name, urls in VENDOR_BUNDLES.items():
+        parts = []
+        try:
+            for url in urls:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    text = response.read().decode('utf-8')
+                # Source maps are not vendored, so drop the references to them
+                lines = [line for line in text.splitlines() if not line.lstrip().startswith(('//# sourceMappingURL', '/*# sourceMappingURL'))]
+                parts.append("\n".join(lines))
+        except Exception as e:
+            print(f"⚠️ Could not download {url}: {str(e)} - {bundle_name} stays on the CDN")
+            continue
+        separator = "\n;\n" if bundle_name.endswith(".js") else "\n"
+        with open(os.path.join(static_dir, bundle_name), 'w', encoding='utf-8') as f:
+            f.write(separator.join(parts))
+        bundles.append(bundle_name)
+        print(f"✅ Bundled {len(urls)} file(s) into static/{bundle_name}")
+    return bundles
+
+# Function to fingerprint and pre-compress everything in static/
+def build_assets(vendor=False):
+    """Write name.<hash>.ext copies of each static file plus .gz/.br variants.
+
+    The manifest maps logical names to fingerprinted ones; url_for('static')
+    picks them up and serve_static() sends them with immutable caching.
+    """
+    prepare_assets()
+    static_dir = app.static_folder
+    bundles = vendor_assets(static_dir) if vendor else []
+    
     try:
-        with open('index.html', 'r') as src, open('templates/index.html', 'w') as dst:
-            dst.write(src.read())
-        print("✅ Successfully copied index.html to templates/")
-    except Exception as e:
-        print(f"❌ Error copying index.html: {str(e)}")
+        with open(os.path.join(static_dir, ASSET_MANIFEST_FILE)) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    previous_outputs = set(previous.get("assets", {}).values())
+    if not vendor:
+        # Keep bundles from an earlier --vendor build
+        bundles = [name for name in previous.get("bundles", []) if os.path.exists(os.path.join(static_dir, name))]
+    
+    assets = {}
+    for name in sorted(os.listdir(static_dir)):
+        path = os.path.join(static_dir, name)
+        if (not os.path.isfile(path) or name == ASSET_MANIFEST_FILE or name in previous_outputs
+                or name.endswith(('.gz', '.br'))):
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:ASSET_HASH_LENGTH]}{ext}"
+        with open(os.path.join(static_dir, hashed), 'wb') as f:
+            f.write(data)
+        with open(os.path.join(static_dir, hashed + '.gz'), 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if has_brotli:
+            with open(os.path.join(static_dir, hashed + '.br'), 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+        assets[name] = hashed
+        print(f"✅ static/{name} -> static/{hashed}")
+    
+    # Remove fingerprinted files from earlier builds
+    for stale in previous_outputs - set(assets.values()):
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(os.path.join(static_dir, stale + suffix))
+            except FileNotFoundError:
+                pass
+    
+    tmp_path = os.path.join(static_dir, f"{ASSET_MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump({"assets": assets, "bundles": bundles}, f, indent=2)
+    os.replace(tmp_path, os.path.join(static_dir, ASSET_MANIFEST_FILE))
+    asset_manifest.cache_clear()
+    if not has_brotli:
+        print("⚠️ brotli module not available, only .gz variants were written")
+    return assets
 
-if os.path.exists('style.css') and not os.path.exists('static/style.css'):
+# Function to read the asset manifest once per process (empty until build-assets has run)
+@lru_cache(maxsize=1)
+def asset_manifest():
     try:
-        with open('style.css', 'r') as src, open('static/style.css', 'w') as dst:
-            dst.write(src.read())
-        print("✅ Successfully copied style.css to static/")
-    except Exception as e:
-        print(f"❌ Error copying style.css: {str(e)}")
-
-# Set template and static folders
-if os.path.exists('templates'):
-    app.template_folder = 'templates'
-    print(f"Using templates folder: {os.path.abspath('templates')}")
-    print(f"Templates directory contains: {os.listdir('templates')}")
-else:
-    print("WARNING: Could not find templates directory!")
-
-if os.path.exists('static'):
-    app.static_folder = 'static'
-    print(f"Using static folder: {os.path.abspath('static')}")
-else:
-    print("WARNING: Could not find static directory!")
+        with open(os.path.join(app.static_folder, ASSET_MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    assets = manifest.get("assets", {})
+    return {
+        "assets": assets,
+        "fingerprinted": frozenset(assets.values()),
+        "bundles": frozenset(manifest.get("bundles", []))
+    }
+
+# url_for('static', filename='style.css') -> /static/style.<hash>.css once assets are built
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = asset_manifest()["assets"].get(values['filename'], values['filename'])
+
+# Template helper: True if build-assets --vendor produced this bundle
+def vendored(bundle_name):
+    return bundle_name in asset_manifest()["bundles"]
+
+# Source files prepare-assets copies into static/; served from the project root until it has run
+SOURCE_STATIC_FILES = ("style.css",)
+
+# Static file view - fingerprinted files get pre-compressed variants and immutable caching
+def serve_static(filename):
+    if filename not in asset_manifest()["fingerprinted"]:
+        if filename in SOURCE_STATIC_FILES and not os.path.exists(os.path.join(app.static_folder, filename)):
+            # Same fallback as the template ChoiceLoader, so an unbuilt checkout still gets its stylesheet
+            return send_from_directory(app.root_path, filename)
+        return app.send_static_file(filename)
+    
+    path = os.path.join(app.static_folder, filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding and os.path.exists(f"{path}.{ENCODING_SUFFIXES[encoding]}"):
+        path = f"{path}.{ENCODING_SUFFIXES[encoding]}"
+    else:
+        encoding = None
+    
+    # send_file hands the open file to the server's wsgi.file_wrapper (sendfile under gunicorn)
+    resp = send_file(path, mimetype=mimetype, conditional=True, cache_timeout=ASSET_MAX_AGE)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
+
+# Prometheus metrics served on /metrics. prometheus_client is optional and
+# imported on first use; its multiprocess mode gives each worker its own mmap'd
+# file under METRICS_DIR and sums them all on every scrape. gunicorn.conf.py
+# clears the directory when the server starts.
+METRICS_ENABLED = os.environ.get("METRICS", "1") == "1"
+METRICS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", os.path.join(DATA_DIR, "metrics"))
+METRICS_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Route latency, MongoDB call, storage fallback and template render metrics.
+
+    Every method is a no-op when METRICS=0 or prometheus_client is missing.
+    """
+    
+    def __init__(self, directory, buckets, enabled=True):
+        self.directory = directory
+        self.buckets = buckets
+        self.available = None if enabled else False  # None until the first use
+        self._lock = threading.Lock()
+    
+    def ready(self):
+        if self.available is None:
+            self._setup()
+        return self.available
+    
+    def _setup(self):
+        with self._lock:
+            if self.available is not None:
+                return
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                # Read by prometheus_client at import time to pick its mmap'd values
+                os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", self.directory)
+                import prometheus_client
+                from prometheus_client import multiprocess
+            except (ImportError, OSError) as e:
+                print(f"⚠️ Metrics disabled: {str(e)}")
+                self.available = False
+                return
+            self._prometheus = prometheus_client
+            self._multiprocess = multiprocess
+            self.request_seconds = prometheus_client.Histogram(
+                "http_request_duration_seconds", "Request latency by route",
+                ["method", "route", "status"], buckets=self.buckets)
+            self.mongo_seconds = prometheus_client.Histogram(
+                "mongo_operation_duration_seconds", "MongoDB call latency",
+                ["caller", "operation"], buckets=self.buckets)
+            self.mongo_errors = prometheus_client.Counter(
+                "mongo_operation_errors", "MongoDB calls that raised",
+                ["caller", "operation"])
+            self.fallbacks = prometheus_client.Counter(
+                "storage_fallback_hits", "Reads and writes served by local storage instead of MongoDB",
+                ["operation", "storage"])
+            self.render_seconds = prometheus_client.Histogram(
+                "template_render_duration_seconds", "Jinja template render time",
+                ["template"], buckets=self.buckets)
+            self.rate_limited = prometheus_client.Counter(
+                "rate_limited_requests", "Requests rejected with 429 by the rate limiter",
+                ["route"])
+            self.model_differences = prometheus_client.Histogram(
+                "model_prediction_difference", "Absolute difference (LPA) between served and shadow predictions",
+                ["served", "scored"], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+            self.available = True
+    
+    def observe_request(self, method, route, status, seconds):
+        if self.ready():
+            self.request_seconds.labels(method, route, str(status)).observe(seconds)
+    
+    @contextmanager
+    def mongo_timer(self, caller, operation):
+        """Time one MongoDB call, counting it as an error if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if self.ready():
+                self.mongo_errors.labels(caller, operation).inc()
+            raise
+        finally:
+            if self.ready():
+                self.mongo_seconds.labels(caller, operation).observe(time.perf_counter() - start)
+    
+    def fallback(self, operation, storage):
+        """Count one operation served by the local "file" store or "memory"."""
+        if self.ready():
+            self.fallbacks.labels(operation, storage).inc()
+    
+    def observe_render(self, template_name, seconds):
+        if self.ready():
+            self.render_seconds.labels(template_name).observe(seconds)
+    
+    def rate_limited_request(self, route):
+        if self.ready():
+            self.rate_limited.labels(route).inc()
+    
+    def observe_model_differences(self, served_version, scored_version, differences):
+        if self.ready():
+            histogram = self.model_differences.labels(served_version, scored_version)
+            for difference in differences:
+                histogram.observe(difference)
+    
+    def exposition(self):
+        """(body, content type) summed over every worker's file, or None if disabled."""
+        if not self.ready():
+            return None
+        registry = self._prometheus.CollectorRegistry()
+        self._multiprocess.MultiProcessCollector(registry, path=self.directory)
+        return self._prometheus.generate_latest(registry), self._prometheus.CONTENT_TYPE_LATEST
+
+metrics = Metrics(METRICS_DIR, METRICS_LATENCY_BUCKETS, enabled=METRICS_ENABLED)
+
+# Flask's render_template, timed - every page, shell and error render goes through here
+def render_template(template_name, **context):
+    start = time.perf_counter()
+    try:
+        return flask_render_template(template_name, **context)
+    finally:
+        metrics.observe_render(template_name, time.perf_counter() - start)
+
+# Function to note when a request started (registered before ensure_database)
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+# Function to record the request's latency under its route pattern (e.g. /export/<collection_name>)
+def observe_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+    return response
+
+# Token buckets for the unauthenticated write routes - each allowed request costs one token
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT", "1") == "1"
+RATE_LIMIT_RATE = float(os.environ.get("RATE_LIMIT_RATE", 1.0))  # tokens refilled per second, per user_id cookie
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", 30))  # bucket size: requests allowed back to back
+# Per client IP - generous, since a whole campus or hostel can share one NAT address
+RATE_LIMIT_IP_RATE = float(os.environ.get("RATE_LIMIT_IP_RATE", 20.0))
+RATE_LIMIT_IP_BURST = float(os.environ.get("RATE_LIMIT_IP_BURST", 600))
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")  # "memory", "file" or "redis"
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100000))  # buckets held per worker ("memory")
+RATE_LIMIT_FILE = os.environ.get("RATE_LIMIT_FILE", os.path.join(DATA_DIR, "ratelimit.bin"))
+RATE_LIMIT_FILE_SLOTS = int(os.environ.get("RATE_LIMIT_FILE_SLOTS", 65536))  # buckets shared by all workers ("file")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_BACKEND_RETRY = 30.0  # seconds on local buckets after the shared backend fails
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))  # proxies appending X-Forwarded-For
+RATE_LIMITED_ENDPOINTS = ("predict", "feedback", "submit_feedback")
+
+class TokenBuckets:
+    """Per-worker token buckets in one OrderedDict, least recently used first.
+
+    A bucket left idle long enough to refill is the same as a missing one, so
+    buckets are evicted from the front as new keys arrive: every request is
+    O(1) and memory stays bounded by RATE_LIMIT_MAX_KEYS.
+    """
+    
+    def __init__(self, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, last update, time it is full again), monotonic
+        self._lock = threading.Lock()
+    
+    def acquire(self, key, rate, burst):
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._evict(now)
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return 0 if allowed else (1 - tokens) / rate
+    
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            full_at = next(iter(buckets.values()))[2]
+            if len(buckets) < self.max_keys and now < full_at:
+                break
+            buckets.popitem(last=False)
+
+class FileTokenBuckets:
+    """Token buckets in a fixed mmap'd table shared by every worker on the host.
+
+    Each slot holds (key hash, tokens, updated) and is guarded by its own
+    fcntl byte-range lock, so workers only contend on the same slot. A key
+    whose slot holds another key's bucket starts full, which only ever errs
+    on the side of allowing a request.
+    """
+    
+    SLOT = struct.Struct('<Qdd')
+    
+    def __init__(self, path, slots=RATE_LIMIT_FILE_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._fd = None
+        self._map = None
+    
+    def _ensure_open(self):
+        if self._pid != os.getpid():
+            # Mappings inherited from a parent process are dropped, not reused
+            self._map = None
+            self._fd = None
+            self._pid = os.getpid()
+        if self._map is not None:
+            return
+        size = self.slots * self.SLOT.size
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size != size:
+            os.ftruncate(fd, size)  # zeroed slots are empty buckets
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+    
+    def acquire(self, key, rate, burst):
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') | 1
+        now = time.time()  # shared by every process, unlike time.monotonic()
+        with self._thread_lock:
+            self._ensure_open()
+            offset = (digest % self.slots) * self.SLOT.size
+            if has_fcntl:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+            try:
+                stored, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                if stored != digest:
+                    tokens, updated = burst, now
+                tokens = min(burst, tokens + max(now - updated, 0) * rate)
+                allowed = tokens >= 1
+                self.SLOT.pack_into(self._map, offset, digest, tokens - 1 if allowed else tokens, now)
+            finally:
+                if has_fcntl:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return 0 if allowed else (1 - tokens) / rate
+
+class RedisTokenBuckets:
+    """Token buckets in Redis (or anything speaking its protocol, e.g. Valkey or KeyDB).
+
+    One Lua script refills and takes a token atomically on the server, so any
+    number of hosts share the limits. Buckets expire once they would be full.
+    """
+    
+    SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+    
+    def __init__(self, url, prefix="ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self._script = None
+        self._lock = threading.Lock()
+    
+    def _ensure_script(self):
+        if self._script is None:
+            with self._lock:
+                if self._script is None:
+                    import redis  # optional; only needed for RATE_LIMIT_BACKEND=redis
+                    client = redis.Redis.from_url(self.url, socket_timeout=0.1, socket_connect_timeout=0.1)
+                    self._script = client.register_script(self.SCRIPT)
+        return self._script
+    
+    def acquire(self, key, rate, burst):
+        """Take a token; returns 0 on success, else the seconds until one is available."""
+        allowed, tokens = self._ensure_script()(keys=[self.prefix + key], args=[rate, burst, time.time()])
+        return 0 if int(allowed) else (1 - float(tokens)) / rate
+
+class RateLimiter:
+    """Token bucket per client IP and per user_id cookie for the write routes.
+
+    A request must get a token from both of its buckets. The per-visitor
+    bucket is the tight one; a client without the cookie gets a bucket of the
+    same size keyed on its IP and User-Agent instead. The IP bucket is sized
+    for many students behind one NAT address and only stops clients that
+    rotate cookies and User-Agents. If the shared backend fails the limiter
+    falls back to this worker's in-memory buckets rather than rejecting.
+    """
+    
+    def __init__(self, backend, limits, enabled=True):
+        self.backend = backend
+        self.limits = limits  # "ip" / "user" -> (rate, burst)
+        self.enabled = enabled and all(rate > 0 for rate, _ in limits.values())
+        self._buckets = None
+        self._local = TokenBuckets()
+        self._retry_shared_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _shared(self):
+        if self._buckets is None:
+            with self._lock:
+                if self._buckets is None:
+                    if self.backend == "file":
+                        self._buckets = FileTokenBuckets(RATE_LIMIT_FILE)
+                    elif self.backend == "redis":
+                        self._buckets = RedisTokenBuckets(RATE_LIMIT_REDIS_URL)
+                    else:
+                        self._buckets = self._local
+        return self._buckets
+    
+    def _acquire(self, kind, value):
+        key = f"{kind}:{value}"
+        rate, burst = self.limits[kind]
+        buckets = self._shared()
+        if buckets is self._local or time.monotonic() < self._retry_shared_at:
+            return self._local.acquire(key, rate, burst)
+        try:
+            return buckets.acquire(key, rate, burst)
+        except Exception as e:
+            print(f"⚠️ Rate limit backend {self.backend} failed, using this worker's buckets "
+                  f"for {RATE_LIMIT_BACKEND_RETRY:g}s: {str(e)}")
+            self._retry_shared_at = time.monotonic() + RATE_LIMIT_BACKEND_RETRY
+            return self._local.acquire(key, rate, burst)
+    
+    def check(self, ip_address, user_id=None, user_agent=None):
+        """Seconds the client must wait, or 0 if the request may proceed."""
+        if not self.enabled:
+            return 0
+        if not user_id:
+            # Dropping the cookie must not escape the tight bucket for the loose shared-NAT one
+            client = hashlib.sha1(f"{ip_address}\0{user_agent or ''}".encode('utf-8')).hexdigest()[:16]
+            user_id = f"anon:{client}"
+        retry_after = self._acquire("user", user_id)
+        if not retry_after:
+            retry_after = self._acquire("ip", ip_address)
+        return retry_after
+
+rate_limiter = RateLimiter(
+    RATE_LIMIT_BACKEND,
+    {"user": (RATE_LIMIT_RATE, RATE_LIMIT_BURST), "ip": (RATE_LIMIT_IP_RATE, RATE_LIMIT_IP_BURST)},
+    enabled=RATE_LIMIT_ENABLED
+)
+
+# Function to find the client's address behind RATE_LIMIT_TRUSTED_PROXIES proxies (Render adds one)
+def client_ip(remote_addr, forwarded_for=None):
+    if RATE_LIMIT_TRUSTED_PROXIES and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= RATE_LIMIT_TRUSTED_PROXIES:
+            return hops[-RATE_LIMIT_TRUSTED_PROXIES]
+    return remote_addr
+
+# Function to build the 429 for a limited route: (body, content type, headers)
+def rate_limited_response(endpoint, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    headers = {'Retry-After': str(seconds), 'Cache-Control': 'no-store'}
+    message = f"Too many requests, please wait {seconds}s and try again."
+    if endpoint == "submit_feedback":  # a JSON endpoint
+        return json.dumps({'success': False, 'message': message}), 'application/json', headers
+    return message, 'text/plain; charset=utf-8', headers
+
+# before_request hook (registered ahead of ensure_database) - a rejection costs no DB work or render
+def enforce_rate_limit():
+    if request.endpoint not in RATE_LIMITED_ENDPOINTS:
+        return None
+    retry_after = rate_limiter.check(client_ip(request.remote_addr, request.headers.get('X-Forwarded-For')),
+                                     request.cookies.get('user_id'), request.headers.get('User-Agent'))
+    if not retry_after:
+        return None
+    metrics.rate_limited_request(request.url_rule.rule)
+    body, content_type, headers = rate_limited_response(request.endpoint, retry_after)
+    return app.response_class(body, status=429, headers=headers, content_type=content_type)
+
+# Longest time (seconds) counts may be served from memory before re-reading the store
+COUNTER_CACHE_TTL = float(os.environ.get("COUNTER_CACHE_TTL", 5.0))
+
+class CounterCache:
+    """Per-process copy of the stored (total_users, predictions) counters.
+
+    Pages read the counts from here instead of MongoDB or the counter file.
+    Entries older than max_age are reloaded on the next read; the analytics
+    worker refreshes them in the background before that happens.
+    """
+    
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._counts = None
+        self._loaded_at = 0.0
+    
+    def get(self):
+        with self._lock:
+            if self._counts is not None and time.monotonic() - self._loaded_at < self.max_age:
+                return self._counts
+        return None
+    
+    def age(self):
+        with self._lock:
+            if self._counts is None:
+                return float('inf')
+            return time.monotonic() - self._loaded_at
+    
+    def set(self, counts, generation=None):
+        """Store fresh counts; a read started before a newer set() is discarded."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._counts = tuple(counts)
+            self._loaded_at = time.monotonic()
+            self.generation += 1
+    
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+            self.generation += 1
+
+counter_cache = CounterCache(COUNTER_CACHE_TTL)
+
+# Write-behind analytics settings (visitor/prediction events and counter increments)
+ANALYTICS_WRITE_BEHIND = os.environ.get("ANALYTICS_WRITE_BEHIND", "1") == "1"
+ANALYTICS_FLUSH_INTERVAL = float(os.environ.get("ANALYTICS_FLUSH_INTERVAL", 2.0))  # seconds
+ANALYTICS_BATCH_SIZE = int(os.environ.get("ANALYTICS_BATCH_SIZE", 500))
+ANALYTICS_QUEUE_SIZE = int(os.environ.get("ANALYTICS_QUEUE_SIZE", 10000))
+ANALYTICS_QUEUE_POLICY = os.environ.get("ANALYTICS_QUEUE_POLICY", "drop")  # "drop" or "block"
+ANALYTICS_BLOCK_TIMEOUT = float(os.environ.get("ANALYTICS_BLOCK_TIMEOUT", 0.05))  # seconds
+
+class AnalyticsBuffer:
+    """In-process write-behind queue for analytics writes.
+
+    Request threads only enqueue events and add counter deltas; a background
+    thread drains events with insert_many and folds the deltas into a single
+    $inc on the stats document per flush. The thread is started lazily in each
+    process so it survives gunicorn forking workers.
+    """
+    
+    def __init__(self, flush_interval, batch_size, max_queue, policy, block_timeout):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._pending = {"total_users": 0, "predictions": 0}
+        self._inflight = {"total_users": 0, "predictions": 0}
+        self._wake = threading.Event()
+        self._stopping = False
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retry = {}  # collection -> documents whose insert failed, written again by the next flush
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # Fresh state after a fork - the parent's thread does not exist here
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._wake = threading.Event()
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+            self._thread.start()
+    
+    def enqueue(self, collection, document):
+        """Queue a document for the named collection; returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            if self.policy == "block":
+                self._queue.put((collection, document), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((collection, document))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                print(f"⚠️ Analytics queue full, dropped {self.dropped} events so far")
+            return False
+        
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+    
+    def defer(self, func, *args):
+        """Run func(*args) on the analytics thread; returns False if it was dropped."""
+        return self.enqueue(None, (func, args))
+    
+    def add_counts(self, total_users=0, predictions=0):
+        self._ensure_started()
+        with self._counter_lock:
+            self._pending["total_users"] += total_users
+            self._pending["predictions"] += predictions
+    
+    def pending_counts(self):
+        """Counter increments not yet visible in MongoDB."""
+        with self._counter_lock:
+            return (self._pending["total_users"] + self._inflight["total_users"],
+                    self._pending["predictions"] + self._inflight["predictions"])
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if self._stopping:
+                break
+    
+    def flush(self):
+        # Drain everything queued so far (after any batches a failed flush kept), batch_size documents at a time
+        batches, self._retry = self._retry, {}
+        for collection in list(batches):
+            while len(batches[collection]) >= self.batch_size:
+                self._insert(collection, batches[collection][:self.batch_size])
+                batches[collection] = batches[collection][self.batch_size:]
+        while True:
+            try:
+                collection, document = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if collection is None:
+                # Deferred call - anything it enqueues is drained by this same loop
+                func, args = document
+                try:
+                    func(*args)
+                except Exception as e:
+                    print(f"❌ Error in deferred analytics task: {str(e)}")
+                continue
+            batch = batches.setdefault(collection, [])
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                self._insert(collection, batch)
+                del batches[collection]
+        for collection, batch in batches.items():
+            self._insert(collection, batch)
+        
+        if not self._flush_counts() and counter_cache.age() >= counter_cache.max_age / 2:
+            # Nothing to push - refresh the cached counts so readers never wait on MongoDB
+            generation = counter_cache.generation
+            counter_cache.set(load_user_count(), generation=generation)
+    
+    def _insert(self, collection, documents):
+        """insert_many one batch; only stored events are bucketed and rolled up, failed ones are retried."""
+        failed = []
+        try:
+            with metrics.mongo_timer("analytics_flush", f"{collection}.insert_many"):
+                mongo.collection(collection).insert_many(documents, ordered=False)
+            inserted = documents
+        except import_pymongo().errors.BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            # Duplicate _ids (code 11000) were stored by an earlier attempt
+            real_errors = [error for error in errors if error.get("code") != 11000]
+            failed = [documents[error["index"]] for error in real_errors]
+            skipped = {error["index"] for error in errors}
+            inserted = [document for i, document in enumerate(documents) if i not in skipped]
+            if failed:
+                print(f"❌ Error writing {len(failed)} of {len(documents)} {collection} events: "
+                      f"{real_errors[0].get('errmsg')}")
+        except Exception as e:
+            failed, inserted = documents, []
+            print(f"❌ Error writing {len(documents)} {collection} events: {str(e)}")
+        if failed:
+            self._keep_for_retry(collection, failed)
+        if inserted:
+            bucket_events(collection, inserted)
+            rollups.record(collection, inserted)
+    
+    def _keep_for_retry(self, collection, documents):
+        # insert_many already gave them _ids, so a retry that partly succeeded earlier cannot duplicate them
+        room = self.max_queue - sum(len(batch) for batch in self._retry.values())
+        if len(documents) > room:
+            self.dropped += len(documents) - max(room, 0)
+            print(f"⚠️ Analytics retry buffer full, dropped {self.dropped} events so far")
+            documents = documents[:max(room, 0)]
+        if documents:
+            self._retry.setdefault(collection, []).extend(documents)
+    
+    def _flush_counts(self):
+        """Push pending increments as one $inc; returns False if there were none."""
+        with self._counter_lock:
+            if not any(self._pending.values()):
+                return False
+            self._inflight = self._pending
+            self._pending = {"total_users": 0, "predictions": 0}
+        
+        inc = {key: value for key, value in self._inflight.items() if value}
+        try:
+            with metrics.mongo_timer("analytics_flush", "stats.find_one_and_update"):
+                stats = mongo.collection("stats").find_one_and_update(
+                    {"_id": "counter"},
+                    {"$inc": inc, "$set": {"updated_at": datetime.now()}},
+                    return_document=import_pymongo().ReturnDocument.AFTER
+                )
+            failed = None
+        except Exception as e:
+            print(f"❌ Error flushing counter increments: {str(e)}")
+            stats = None
+            failed = self._inflight
+        
+        with self._counter_lock:
+            # Keep failed increments pending so the next flush retries them
+            if failed:
+                for key, value in failed.items():
+                    self._pending[key] += value
+            elif stats:
+                # The updated document already includes every worker's increments
+                counter_cache.set((stats.get("total_users", 0), stats.get("predictions", 0)))
+            self._inflight = {"total_users": 0, "predictions": 0}
+        return True
+    
+    def close(self):
+        """Stop the worker thread and write out anything still buffered."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout=max(self.flush_interval, 5.0))
+        self._thread = None
+        self.flush()
+
+analytics = AnalyticsBuffer(
+    flush_interval=ANALYTICS_FLUSH_INTERVAL,
+    batch_size=ANALYTICS_BATCH_SIZE,
+    max_queue=ANALYTICS_QUEUE_SIZE,
+    policy=ANALYTICS_QUEUE_POLICY,
+    block_timeout=ANALYTICS_BLOCK_TIMEOUT
+)
+atexit.register(analytics.close)
+
+def use_write_behind():
+    return using_mongodb and ANALYTICS_WRITE_BEHIND
 
 # Track visitor data
 def track_visitor(user_id, ip_address=None, user_agent=None, path=None):
+    unique_visitors.add(user_id)
     if using_mongodb:
+        visitor = {
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "path": path,
+            "timestamp": datetime.now()
+        }
+        if use_write_behind():
+            analytics.enqueue("visitors", visitor)
+            return
         try:
-            visitors_collection.insert_one({
-                "user_id": user_id,
-                "ip_address": ip_address,
-                "user_agent": user_agent,
-                "path": path,
-                "timestamp": datetime.now()
-            })
-            print(f"✅ Visitor tracked: {user_id}")
+            with metrics.mongo_timer("track_visitor", "visitors.insert_one"):
+                mongo.collection("visitors").insert_one(visitor)
+            bucket_events("visitors", [visitor])
+            rollups.record("visitors", [visitor])
         except Exception as e:
             print(f"❌ Error tracking visitor: {str(e)}")
 
-# Function to get current user count
-def get_user_count():
+# Read the stored counters, bypassing the in-memory cache
+def load_user_count():
     if using_mongodb:
         try:
-            stats = stats_collection.find_one({"_id": "counter"})
+            with metrics.mongo_timer("get_user_count", "stats.find_one"):
+                stats = mongo.collection("stats").find_one({"_id": "counter"})
             if stats:
                 return stats.get("total_users", 0), stats.get("predictions", 0)
             return 0, 0
@@ -208,20 +2399,40 @@ def get_user_count():
             pass
     
     # Fallback to file-based storage if MongoDB is not available
+    return load_local_count()
+
+# Read the counters from the local counter file (or memory if the file fails)
+def load_local_count():
     try:
-        if os.path.exists(COUNTER_FILE):
-            with open(COUNTER_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('total_users', 0), data.get('predictions', 0)
-        else:
-            # If counter file doesn't exist, use in-memory fallback
-            return in_memory_stats.get("total_users", 0), in_memory_stats.get("predictions", 0)
+        counts = counter_file.read()
+        metrics.fallback("get_user_count", "file")
+        return counts
     except Exception as e:
         print(f"Error reading counter file: {str(e)}")
+        metrics.fallback("get_user_count", "memory")
         return in_memory_stats.get("total_users", 0), in_memory_stats.get("predictions", 0)
 
+# Function to get current user count
+def get_user_count():
+    counts = counter_cache.get()
+    if counts is None:
+        generation = counter_cache.generation
+        counts = load_user_count()
+        counter_cache.set(counts, generation=generation)
+    
+    if use_write_behind():
+        # Local increments count immediately, before the next flush reaches MongoDB
+        pending_users, pending_predictions = analytics.pending_counts()
+        return counts[0] + pending_users, counts[1] + pending_predictions
+    return counts
+
 # Function to increment user count
 def increment_user_count(is_new_user=False):
+    if use_write_behind():
+        # Folded into one $inc per flush by the analytics worker
+        analytics.add_counts(total_users=1 if is_new_user else 0, predictions=1)
+        return get_user_count()
+    
     if using_mongodb:
         try:
             update_data = {"$inc": {"predictions": 1}, "$set": {"updated_at": datetime.now()}}
@@ -229,133 +2440,1064 @@ def increment_user_count(is_new_user=False):
             if is_new_user:
                 update_data["$inc"]["total_users"] = 1
             
-            result = stats_collection.update_one(
-                {"_id": "counter"},
-                update_data
-            )
-            
-            # Get and return the updated counts
-            stats = stats_collection.find_one({"_id": "counter"})
-            if stats:
-                return stats.get("total_users", 0), stats.get("predictions", 0)
-            return 0, 0
+            # Update and read back the counts in one round trip
+            with metrics.mongo_timer("increment_user_count", "stats.find_one_and_update"):
+                stats = mongo.collection("stats").find_one_and_update(
+                    {"_id": "counter"},
+                    update_data,
+                    return_document=import_pymongo().ReturnDocument.AFTER
+                )
+            counts = (stats.get("total_users", 0), stats.get("predictions", 0)) if stats else (0, 0)
+            counter_cache.set(counts)
+            return counts
         except Exception as e:
             print(f"Error updating MongoDB: {str(e)}")
-            # Fallback to file if MongoDB fails
-            pass
-    
-    # Fallback to file-based storage
-    total_users, predictions = get_user_count()
-    
-    # Always increment predictions
-    predictions += 1
+            # Fallback to file if MongoDB fails
+            pass
     
-    # Increment total_users only if it's a new user
-    if is_new_user:
-        total_users += 1
-        
-    # Save updated counts
+    # Fallback to file-based storage - one atomic increment shared by all workers
+    return increment_local_count(is_new_user)
+
+# Increment the counters in the local counter file (or memory if the file fails)
+def increment_local_count(is_new_user=False):
     try:
-        with open(COUNTER_FILE, 'w') as f:
-            json.dump({
-                'total_users': total_users,
-                'predictions': predictions
-            }, f)
+        total_users, predictions = counter_file.increment(
+            total_users=1 if is_new_user else 0,
+            predictions=1
+        )
+        metrics.fallback("increment_user_count", "file")
     except Exception as e:
         print(f"Error saving counter: {str(e)}")
+        metrics.fallback("increment_user_count", "memory")
         # Update in-memory stats as last resort
         in_memory_stats["predictions"] += 1
         if is_new_user:
             in_memory_stats["total_users"] += 1
         total_users, predictions = in_memory_stats.get("total_users", 0), in_memory_stats.get("predictions", 0)
     
+    counter_cache.set((total_users, predictions))
     return total_users, predictions
 
 # Function to log a prediction
-def log_prediction(cgpa, prediction, user_id):
+def log_prediction(cgpa, prediction, user_id, model_version=None, features=None):
     if using_mongodb:
+        prediction_doc = {
+            "cgpa": cgpa,
+            "prediction": prediction,
+            "user_id": user_id,
+            "model_version": model_version,
+            "timestamp": datetime.now()
+        }
+        if features:
+            prediction_doc["features"] = features
+        if use_write_behind():
+            analytics.enqueue("predictions", prediction_doc)
+            return
         try:
-            predictions_collection.insert_one({
-                "cgpa": cgpa,
-                "prediction": prediction,
-                "user_id": user_id,
-                "timestamp": datetime.now()
-            })
-            print(f"✅ Prediction logged: CGPA {cgpa}, Package {prediction}")
+            with metrics.mongo_timer("log_prediction", "predictions.insert_one"):
+                mongo.collection("predictions").insert_one(prediction_doc)
+            bucket_events("predictions", [prediction_doc])
+            rollups.record("predictions", [prediction_doc])
         except Exception as e:
             print(f"❌ Error logging prediction: {str(e)}")
 
-# Function to save feedback
-def save_feedback(user_id, name, email, message, rating):
-    if using_mongodb:
+# Feedback ingestion: spooled locally first, then delivered to MongoDB (or the local store) in batches
+FEEDBACK_SPOOL_DIR = os.environ.get("FEEDBACK_SPOOL_DIR", os.path.join(DATA_DIR, "feedback_spool"))
+FEEDBACK_BATCH_SIZE = int(os.environ.get("FEEDBACK_BATCH_SIZE", 100))  # documents per insert_many
+FEEDBACK_DELIVERY_INTERVAL = float(os.environ.get("FEEDBACK_DELIVERY_INTERVAL", 1.0))  # seconds
+FEEDBACK_RETRY_BASE = float(os.environ.get("FEEDBACK_RETRY_BASE", 1.0))  # first retry delay, doubled per failure
+FEEDBACK_RETRY_MAX = float(os.environ.get("FEEDBACK_RETRY_MAX", 300.0))  # longest retry delay
+FEEDBACK_DEDUP_TTL = float(os.environ.get("FEEDBACK_DEDUP_TTL", 24 * 60 * 60))  # seconds a key is remembered
+FEEDBACK_CONTENT_DEDUP_TTL = float(os.environ.get("FEEDBACK_CONTENT_DEDUP_TTL", 60))  # same user + content, no key
+FEEDBACK_DEDUP_MAX_KEYS = int(os.environ.get("FEEDBACK_DEDUP_MAX_KEYS", 10000))  # keys remembered per worker
+
+class FeedbackIngest:
+    """The one write path for /feedback and /submit-feedback.
+
+    A submission gets an _id from its idempotency key (or a random one without
+    a key), is checked against a per-worker dedup cache and appended to
+    an fsync'd NDJSON spool; the request returns right after that write. A
+    background thread seals the spool, delivers sealed segments with
+    insert_many - duplicate _ids from other workers or retried batches are
+    ignored - and deletes them, backing off exponentially while MongoDB is
+    failing. Without MongoDB entries move to the local feedback store, skipping
+    _ids it already holds.
+    """
+    
+    def __init__(self, spool_dir, batch_size, interval, retry_base, retry_max, dedup_ttl, content_dedup_ttl,
+                 dedup_max_keys):
+        self.spool = NDJSONSegmentStore(spool_dir, "spool", fsync_every=1)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.dedup_ttl = dedup_ttl
+        self.content_dedup_ttl = content_dedup_ttl
+        self.dedup_max_keys = dedup_max_keys
+        self.failures = 0
+        self._seen = OrderedDict()  # dedup key -> (monotonic expiry, entry _id), oldest first
+        self._seen_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stopping = False
+        self._backlog = True  # the spool may hold entries from an earlier run
+        self._retry_at = 0.0
+        self._spooled = 0
+        self._stored_ids = None  # _ids already in the local feedback store, read once per delivery
+    
+    @staticmethod
+    def dedup_key(idempotency_key, user_id, name, email, message, rating):
+        """(cache key, entry _id): a keyed submission's _id is stable, any other gets a random one."""
+        if idempotency_key:
+            entry_id = hashlib.sha256(f"key\0{idempotency_key}".encode('utf-8')).hexdigest()[:32]
+            return entry_id, entry_id
+        source = "\0".join(("content", user_id or "", name or "", email or "", message or "", str(rating)))
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()[:32], uuid.uuid4().hex
+    
+    def start(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # Fresh state after a fork - the parent's thread does not exist here
+            self._wake = threading.Event()
+            self._stopping = False
+            self._backlog = True
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="feedback-delivery", daemon=True)
+            self._thread.start()
+    
+    def _remember(self, cache_key, entry_id, ttl):
+        """Cache cache_key -> entry_id for ttl seconds; returns the id already cached, if any."""
+        now = time.monotonic()
+        with self._seen_lock:
+            seen = self._seen
+            while seen:
+                expires, _ = next(iter(seen.values()))
+                if len(seen) < self.dedup_max_keys and now < expires:
+                    break
+                seen.popitem(last=False)
+            cached = seen.get(cache_key)
+            if cached is not None and now < cached[0]:
+                return cached[1]
+            seen[cache_key] = (now + ttl, entry_id)
+            return None
+    
+    def _forget(self, cache_key):
+        with self._seen_lock:
+            self._seen.pop(cache_key, None)
+    
+    def submit(self, user_id, name, email, message, rating, idempotency_key=None):
+        """Spool one submission; returns (entry id, duplicate), or (None, False) if it could not be written.
+        
+        Only a repeated idempotency key is a duplicate for good (its _id is
+        derived from the key). Identical content from the same user is only
+        folded together within FEEDBACK_CONTENT_DEDUP_TTL, e.g. a double click.
+        """
+        self.start()
+        cache_key, entry_id = self.dedup_key(idempotency_key, user_id, name, email, message, rating)
+        cached_id = self._remember(cache_key, entry_id, self.dedup_ttl if idempotency_key else self.content_dedup_ttl)
+        if cached_id is not None:
+            return cached_id, True
         try:
-            feedback_collection.insert_one({
+            self.spool.append({
+                "_id": entry_id,
                 "user_id": user_id,
                 "name": name,
                 "email": email,
                 "message": message,
                 "rating": rating,
-                "timestamp": datetime.now()
+                "timestamp": datetime.now().isoformat()
             })
-            return True
         except Exception as e:
-            print(f"❌ Error saving feedback to MongoDB: {str(e)}")
-            # If MongoDB fails, fall back to file storage
-            pass
+            self._forget(cache_key)
+            print(f"❌ Error spooling feedback: {str(e)}")
+            return None, False
+        self._backlog = True
+        self._spooled += 1
+        if self._spooled >= self.batch_size:
+            self._spooled = 0
+            self._wake.set()
+        return entry_id, False
     
-    # Fallback to JSON file storage if MongoDB is not available or fails
-    try:
-        feedback_data = {
-            "user_id": user_id,
-            "name": name,
-            "email": email,
-            "message": message,
-            "rating": rating,
-            "timestamp": datetime.now().isoformat()
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping:
+                break
+            if not self._backlog or time.monotonic() < self._retry_at:
+                continue
+            try:
+                self.deliver()
+                self.failures = 0
+            except Exception as e:
+                self._backlog = True
+                self.failures += 1
+                delay = min(self.retry_max, self.retry_base * 2 ** (self.failures - 1))
+                self._retry_at = time.monotonic() + delay
+                print(f"❌ Error delivering feedback (attempt {self.failures}), retrying in {delay:g}s: {str(e)}")
+    
+    @contextmanager
+    def _delivery_lock(self):
+        """Yield True if this process may deliver - one worker drains the spool at a time."""
+        if not has_fcntl:
+            yield True
+            return
+        os.makedirs(self.spool.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.spool.directory, ".delivery.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)  # also releases the lock
+    
+    def deliver(self):
+        """Deliver and delete every sealed spool segment; raises if a batch could not be stored."""
+        with self._delivery_lock() as owner:
+            if not owner:
+                return  # another worker is draining the spool; ours stays flagged for the next round
+            self._backlog = False  # submissions from here on flag it again
+            self._stored_ids = None
+            for index in self.spool.seal():
+                batch = []
+                for record in self.spool.read_segment(index):
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        self._store(batch)
+                        batch = []
+                if batch:
+                    self._store(batch)
+                self.spool.remove_segment(index)
+    
+    def _store(self, records):
+        if not using_mongodb:
+            # A segment replayed after a crash before remove_segment() was partly stored already
+            if self._stored_ids is None:
+                self._stored_ids = {record.get("_id") for record in feedback_store.iter_records()}
+            records = [record for record in records if record["_id"] not in self._stored_ids]
+            if records:
+                feedback_store.append_many(records)
+                self._stored_ids.update(record["_id"] for record in records)
+                metrics.fallback("save_feedback", "file")
+            return
+        documents = []
+        for record in records:
+            document = dict(record)
+            try:
+                document["timestamp"] = datetime.fromisoformat(document["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                document["timestamp"] = datetime.now()
+            documents.append(document)
+        skipped = set()
+        try:
+            with metrics.mongo_timer("feedback_delivery", "feedback.insert_many"):
+                mongo.collection("feedback").insert_many(documents, ordered=False)
+        except import_pymongo().errors.BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            skipped = {error["index"] for error in errors}  # already delivered
+        inserted = [document for i, document in enumerate(documents) if i not in skipped]
+        if inserted:
+            rollups.record("feedback", inserted)
+    
+    def status(self):
+        return {
+            "spool_segments": len(self.spool.segment_indexes()),
+            "delivery_failures": self.failures,
+            "retrying_in": max(0.0, round(self._retry_at - time.monotonic(), 1)) if self.failures else 0.0
         }
+    
+    def close(self):
+        """Stop the delivery thread; spooled entries stay on disk for the next run."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout=5.0)
+        self._thread = None
+        self.spool.close()
+
+feedback_ingest = FeedbackIngest(
+    spool_dir=FEEDBACK_SPOOL_DIR,
+    batch_size=FEEDBACK_BATCH_SIZE,
+    interval=FEEDBACK_DELIVERY_INTERVAL,
+    retry_base=FEEDBACK_RETRY_BASE,
+    retry_max=FEEDBACK_RETRY_MAX,
+    dedup_ttl=FEEDBACK_DEDUP_TTL,
+    content_dedup_ttl=FEEDBACK_CONTENT_DEDUP_TTL,
+    dedup_max_keys=FEEDBACK_DEDUP_MAX_KEYS
+)
+atexit.register(feedback_ingest.close)
+
+# Function to parse a submitted rating (default 5)
+def parse_rating(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 5
+
+# Function to save feedback (spooled; delivered in the background)
+def save_feedback(user_id, name, email, message, rating, idempotency_key=None):
+    entry_id, _ = feedback_ingest.submit(user_id, name, email, message, rating, idempotency_key)
+    return entry_id is not None
+
+# Model artifacts: JSON documents {"version", "type": "linear", "coefficients": {"m", "b"}, "metadata"}
+MODEL_SOURCE = os.environ.get("MODEL_SOURCE", "file")  # "file" (MODEL_DIR) or "mongo" (models collection)
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(os.getcwd(), 'models'))  # holds active.json / candidate.json
+MODEL_COLLECTION = "models"  # one document per version, with "role": "active", "candidate" or "retired"
+MODEL_ROLES = ("active", "candidate")
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", 5.0))  # seconds between artifact checks
+MODEL_CANDIDATE_MODE = os.environ.get("MODEL_CANDIDATE_MODE", "shadow")  # "shadow" or "ab"
+MODEL_CANDIDATE_FRACTION = float(os.environ.get("MODEL_CANDIDATE_FRACTION", 0.1))  # users served the candidate in "ab" mode
+
+# Served until an active artifact is published
+BUILTIN_MODEL = {
+    "version": "builtin",
+    "type": "linear",
+    "coefficients": {"m": 0.55795197, "b": -0.8961119222429126},
+    "metadata": {"description": "Original CGPA regression shipped with the app"}
+}
+
+class LinearModel:
+    """package = intercept + weights · x over named features, in flat float arrays.
+    
+    A feature is a numeric input ("cgpa", "backlogs") or one level of a
+    categorical input written "name=value" ("branch=CSE", 1.0 when the input
+    equals value). Inputs other than cgpa fall back to `defaults`, so the
+    CGPA-only form and table still work with a richer model. With a stored
+    coefficient covariance and residual variance the model also gives
+    prediction intervals.
+    """
+    __slots__ = ("version", "metadata", "features", "weights", "intercept", "defaults",
+                 "covariance", "residual_variance", "interval_level", "inputs",
+                 "m", "b", "table", "_specs")
+    
+    def __init__(self, features, weights, intercept, defaults=None, covariance=None,
+                 residual_variance=None, interval_level=0.95):
+        self.features = list(features)
+        self.weights = array('d', weights)
+        self.intercept = float(intercept)
+        self.defaults = dict(defaults or {})
+        self.covariance = array('d', (value for row in covariance for value in row)) if covariance else None
+        self.residual_variance = residual_variance
+        self.interval_level = interval_level
+        # (input name, level or None) per feature, and the inputs a request may supply
+        self._specs = [tuple(name.split('=', 1)) if '=' in name else (name, None) for name in self.features]
+        self.inputs = list(dict.fromkeys(name for name, _ in self._specs))
+        # CGPA-only view: package = m * cgpa + b with every other input at its default
+        cgpa_index = self.features.index('cgpa')
+        base = self.encode(dict(self.defaults, cgpa=0.0))
+        self.m = self.weights[cgpa_index]
+        self.b = self.intercept + math.fsum(w * x for w, x in zip(self.weights, base))
+    
+    def predict(self, X):
+        return self.m * X + self.b
+    
+    def predict_batch(self, X):
+        # One vectorized pass over the whole batch, rounded like /predict
+        if numpy_available():
+            return np.round(self.predict(np.asarray(X, dtype=np.float64)), 2).tolist()
+        m, b = self.m, self.b
+        return [round(m * x + b, 2) for x in X]
+    
+    def encode(self, record):
+        """One record's feature row; raises KeyError/TypeError/ValueError on bad input."""
+        row = []
+        for name, level in self._specs:
+            value = record[name] if name in record else self.defaults[name]
+            if level is not None:
+                row.append(1.0 if str(value) == level else 0.0)
+            else:
+                number = float(value)
+                if not math.isfinite(number):
+                    raise ValueError(f"{name} must be a finite number")
+                row.append(number)
+        return row
+    
+    def design_matrix(self, records):
+        """(rows, invalid) - feature rows for the records and the indices that could not be used."""
+        rows = []
+        invalid = []
+        nan_row = [float('nan')] * len(self.features)
+        for i, record in enumerate(records):
+            try:
+                row = self.encode(record)
+                if not 0 <= float(record['cgpa']) <= 10:
+                    raise ValueError('cgpa out of range')
+            except (KeyError, TypeError, ValueError):
+                invalid.append(i)
+                row = nan_row
+            rows.append(row)
+        return rows, invalid
+    
+    def has_intervals(self):
+        return self.covariance is not None and self.residual_variance is not None
+    
+    def predict_matrix(self, rows, level=None):
+        """(predictions, intervals) for feature rows; intervals is None unless a level is asked for."""
+        with_intervals = level is not None and self.has_intervals()
+        size = len(self.features) + 1
+        if numpy_available():
+            X = np.asarray(rows, dtype=np.float64).reshape(len(rows), len(self.features))
+            predictions = X @ np.frombuffer(self.weights, dtype=np.float64) + self.intercept
+            intervals = None
+            if with_intervals:
+                # Var = s² + x'Σx over [1, x], Σ the coefficient covariance
+                Xa = np.column_stack([np.ones(len(rows)), X])
+                C = np.frombuffer(self.covariance, dtype=np.float64).reshape(size, size)
+                half = interval_z(level) * np.sqrt(self.residual_variance + np.einsum('ij,jk,ik->i', Xa, C, Xa))
+                intervals = np.round(np.column_stack([predictions - half, predictions + half]), 2).tolist()
+            return np.round(predictions, 2).tolist(), intervals
         
-        # Path for feedback file
-        feedback_file = os.path.join(os.getcwd(), 'feedback.json')
-        
-        # Check if file exists and load existing data
-        if os.path.exists(feedback_file):
+        predictions = []
+        intervals = [] if with_intervals else None
+        z = interval_z(level) if with_intervals else None
+        for row in rows:
+            prediction = self.intercept + math.fsum(w * x for w, x in zip(self.weights, row))
+            predictions.append(round(prediction, 2))
+            if with_intervals:
+                xa = [1.0] + list(row)
+                variance = self.residual_variance + math.fsum(
+                    xa[i] * self.covariance[i * size + j] * xa[j] for i in range(size) for j in range(size))
+                half = z * math.sqrt(max(variance, 0.0))
+                intervals.append([round(prediction - half, 2), round(prediction + half, 2)])
+        return predictions, intervals
+    
+    def predict_records(self, records):
+        """Rounded predictions for feature dicts (NaN where a record is unusable)."""
+        rows, _ = self.design_matrix(records)
+        return self.predict_matrix(rows)[0]
+    
+    def coefficient_key(self):
+        # CGPA-only models keep the (m, b) key, so their API ETags are unchanged
+        if self.features == ['cgpa']:
+            return (self.m, self.b)
+        return (tuple(self.features), tuple(self.weights), self.intercept, tuple(sorted(self.defaults.items())))
+    
+    def describe(self):
+        description = {"version": self.version, "type": "linear"}
+        if self.features == ['cgpa'] and not self.has_intervals():
+            description["coefficients"] = {"m": self.m, "b": self.b}
+        else:
+            size = len(self.features) + 1
+            description.update({
+                "features": self.features,
+                "weights": list(self.weights),
+                "intercept": self.intercept,
+                "defaults": self.defaults
+            })
+            if self.has_intervals():
+                description["covariance"] = [list(self.covariance[i * size:(i + 1) * size]) for i in range(size)]
+                description["residual_variance"] = self.residual_variance
+        description["metadata"] = self.metadata
+        return description
+
+# Function to turn an interval level (e.g. 0.95) into its two-sided normal quantile
+@lru_cache(maxsize=32)
+def interval_z(level):
+    from statistics import NormalDist  # only needed once a request asks for intervals
+    return NormalDist().inv_cdf((1 + level) / 2)
+
+# Function to read a finite float from an artifact field
+def artifact_number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be finite")
+    return number
+
+# Load a model from an artifact, raising ValueError if it could not serve predictions
+def load_model(artifact=BUILTIN_MODEL):
+    if not isinstance(artifact, dict):
+        raise ValueError("model artifact must be a JSON object")
+    if artifact.get("type", "linear") != "linear":
+        raise ValueError(f"unsupported model type {artifact.get('type')!r}")
+    
+    if "features" in artifact:
+        features = artifact["features"]
+        weights = artifact.get("weights")
+        if not isinstance(features, list) or not all(isinstance(name, str) and name for name in features):
+            raise ValueError("features must be a list of names")
+        if len(set(features)) != len(features):
+            raise ValueError("feature names must be unique")
+        if 'cgpa' not in features:
+            raise ValueError("multi-feature models need a numeric 'cgpa' feature")
+        if not isinstance(weights, list) or len(weights) != len(features):
+            raise ValueError("weights must list one number per feature")
+        weights = [artifact_number(weight, f"weight of {name}") for weight, name in zip(weights, features)]
+        intercept = artifact_number(artifact.get("intercept"), "intercept")
+        defaults = artifact.get("defaults") or {}
+        if not isinstance(defaults, dict):
+            raise ValueError("defaults must be an object")
+    else:
+        coefficients = artifact.get("coefficients")
+        try:
+            weights = [artifact_number(coefficients["m"], "m")]
+            intercept = artifact_number(coefficients["b"], "b")
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("linear models need numeric coefficients m and b")
+        features, defaults = ['cgpa'], {}
+    
+    covariance = artifact.get("covariance")
+    residual_variance = artifact.get("residual_variance")
+    if covariance is not None or residual_variance is not None:
+        size = len(features) + 1
+        if (not isinstance(covariance, list) or len(covariance) != size
+                or not all(isinstance(row, list) and len(row) == size for row in covariance)):
+            raise ValueError(f"covariance must be a {size}x{size} matrix over [intercept, *features]")
+        covariance = [[artifact_number(value, "covariance entry") for value in row] for row in covariance]
+        residual_variance = artifact_number(residual_variance, "residual_variance")
+        if residual_variance < 0:
+            raise ValueError("residual_variance must not be negative")
+    
+    try:
+        model = LinearModel(features, weights, intercept, defaults, covariance, residual_variance)
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("every input other than cgpa needs a usable value in defaults")
+    model.version = str(artifact.get("version") or "unversioned")
+    model.metadata = artifact.get("metadata") or {}
+    model.table = PredictionTable(model)
+    return model
+
+class ModelRegistry:
+    """The active model and an optional candidate, reloaded when their artifacts change.
+    
+    A poller thread in each worker re-reads the artifacts every `interval`
+    seconds and builds a replacement model (prediction table included) before
+    swapping the reference, so requests always see one complete model and
+    never wait on a reload. An artifact that fails validation is logged and
+    the current model keeps serving.
+    
+    The candidate is either scored in the background on the same inputs
+    ("shadow") or served to a stable share of users ("ab", the active model
+    is then the one scored in the background); the differences go to /model
+    and /metrics.
+    """
+    
+    def __init__(self, source, directory, interval, candidate_mode, candidate_fraction):
+        self.source = source
+        self.directory = directory
+        self.interval = interval
+        self.candidate_mode = candidate_mode
+        self.candidate_fraction = candidate_fraction
+        self.active = load_model()
+        self.candidate = None
+        self.last_error = None
+        self.comparisons = {}  # (served version, scored version) -> running totals, per worker
+        self._signatures = dict.fromkeys(MODEL_ROLES)
+        self._stats_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            # Load the published models before the first prediction in this process
+            self.reload()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="model-reloader", daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.reload()
+    
+    def read_artifact(self, role):
+        """(signature, artifact) for a role; the signature changes whenever the artifact does."""
+        if self.source == "mongo":
+            if not using_mongodb:
+                return self._signatures[role], None  # keep serving what we have
+            with metrics.mongo_timer("model_registry", "models.find_one"):
+                document = mongo.collection(MODEL_COLLECTION).find_one({"role": role}, sort=[("updated_at", -1)])
+            return document, document
+        path = os.path.join(self.directory, f"{role}.json")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None, None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature == self._signatures[role]:
+            return signature, None
+        with open(path, 'r', encoding='utf-8') as f:
+            return signature, json.load(f)
+    
+    def reload(self):
+        for role in MODEL_ROLES:
+            try:
+                signature, artifact = self.read_artifact(role)
+            except Exception as e:
+                print(f"❌ Error reading {role} model artifact: {str(e)}")
+                continue
+            if signature == self._signatures[role]:
+                continue
+            # Remembered even if loading fails, so a bad artifact is reported once rather than every poll
+            self._signatures[role] = signature
             try:
-                with open(feedback_file, 'r') as f:
-                    all_feedback = json.load(f)
-            except:
-                all_feedback = []
+                if artifact is None:
+                    model = load_model() if role == "active" else None
+                else:
+                    model = load_model(artifact)
+            except Exception as e:
+                self.last_error = f"{role}: {str(e)}"
+                print(f"❌ Error loading {role} model, keeping the current one: {str(e)}")
+                continue
+            setattr(self, role, model)  # the swap - readers see the old or the new model, never a mix
+            print(f"✅ {role.capitalize()} model: {model.version if model else 'none'}")
+    
+    def pick(self, user_id=None):
+        """(served, shadow) models for one request; shadow is None without a candidate."""
+        self._ensure_started()
+        active, candidate = self.active, self.candidate
+        if candidate is None:
+            return active, None
+        if self.candidate_mode == "ab" and user_id and self.in_candidate_group(user_id):
+            return candidate, active
+        return active, candidate
+    
+    def in_candidate_group(self, user_id):
+        bucket = int(hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:8], 16) / 0x100000000
+        return bucket < self.candidate_fraction
+    
+    def varies_by_user(self):
+        """True if two users can get different models for the same input."""
+        return self.candidate is not None and self.candidate_mode == "ab"
+    
+    def compare(self, shadow, inputs, predictions, served_version):
+        """Score shadow on the served inputs and record the differences (analytics thread)."""
+        if len(inputs) and isinstance(inputs[0], dict):
+            scored_predictions = shadow.predict_records(inputs)
         else:
-            all_feedback = []
+            scored_predictions = shadow.predict_batch(inputs)
+        # Records the shadow model cannot score (e.g. it lacks one of their inputs) give NaN and are skipped
+        differences = [abs(served - scored) for served, scored in zip(predictions, scored_predictions)
+                       if math.isfinite(scored)]
+        if not differences:
+            return
+        with self._stats_lock:
+            totals = self.comparisons.setdefault((served_version, shadow.version),
+                                                 {"count": 0, "abs_diff_sum": 0.0, "max_abs_diff": 0.0})
+            totals["count"] += len(differences)
+            totals["abs_diff_sum"] += sum(differences)
+            totals["max_abs_diff"] = max(totals["max_abs_diff"], max(differences))
+        metrics.observe_model_differences(served_version, shadow.version, differences)
+    
+    def status(self):
+        with self._stats_lock:
+            comparisons = [
+                {"served": served, "scored": scored, "count": totals["count"],
+                 "mean_abs_diff": round(totals["abs_diff_sum"] / totals["count"], 4),
+                 "max_abs_diff": round(totals["max_abs_diff"], 4)}
+                for (served, scored), totals in self.comparisons.items()
+            ]
+        return {
+            "source": self.source,
+            "active": self.active.describe(),
+            "candidate": self.candidate.describe() if self.candidate else None,
+            "candidate_mode": self.candidate_mode,
+            "candidate_fraction": self.candidate_fraction if self.candidate_mode == "ab" else None,
+            "comparisons": comparisons,
+            "last_error": self.last_error
+        }
+
+# Function to validate an artifact and install it as the active or candidate model
+def publish_model(artifact, role="active"):
+    model = load_model(artifact)
+    artifact = dict(artifact, version=model.version)
+    if MODEL_SOURCE == "mongo":
+        ensure_database()
+        if not using_mongodb:
+            raise RuntimeError("MODEL_SOURCE=mongo but MongoDB is not available")
+        models_collection = mongo.collection(MODEL_COLLECTION)
+        # Promote first, then retire the previous holder, so the role is never empty
+        models_collection.replace_one(
+            {"_id": model.version},
+            dict(artifact, _id=model.version, role=role, updated_at=datetime.now()),
+            upsert=True
+        )
+        models_collection.update_many({"role": role, "_id": {"$ne": model.version}}, {"$set": {"role": "retired"}})
+    else:
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        path = os.path.join(MODEL_DIR, f"{role}.json")
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(artifact, f, indent=2)
+        os.replace(path + '.tmp', path)  # pollers see the old file or the new one
+    return model
+
+# Function to stop using a candidate model
+def remove_candidate_model():
+    if MODEL_SOURCE == "mongo":
+        ensure_database()
+        if using_mongodb:
+            mongo.collection(MODEL_COLLECTION).update_many({"role": "candidate"}, {"$set": {"role": "retired"}})
+    else:
+        try:
+            os.remove(os.path.join(MODEL_DIR, "candidate.json"))
+        except FileNotFoundError:
+            pass
+
+# Function to score the other model on a served request without delaying it
+def shadow_predictions(shadow, inputs, predictions, served_version):
+    if shadow is not None:
+        analytics.defer(model_registry.compare, shadow, inputs, predictions, served_version)
+
+# Function to format the message shown after a prediction
+def format_prediction_message(cgpa, prediction):
+    return f"With a CGPA of {cgpa}, your predicted package is ₹{prediction} LPA"
+
+class PredictionTable:
+    """Every quantized CGPA's rounded package and message, computed at model load."""
+    
+    def __init__(self, model, steps_per_point=CGPA_STEPS_PER_POINT, max_cgpa=CGPA_MAX):
+        self.steps_per_point = steps_per_point
+        size = steps_per_point * max_cgpa + 1
+        self.cgpas = [i / steps_per_point for i in range(size)]
+        self.packages = array('d', (round(model.predict(cgpa), 2) for cgpa in self.cgpas))
+        self.messages = [format_prediction_message(cgpa, package)
+                         for cgpa, package in zip(self.cgpas, self.packages)]
+        # Identifies the model in API ETags so clients revalidate after a model change
+        self.version = hashlib.sha1(repr(model.coefficient_key()).encode('utf-8')).hexdigest()[:12]
+        self._api_bodies = [None] * size
+    
+    def key(self, cgpa):
+        """Index of cgpa in the table, or None if it is not exactly on the grid."""
+        scaled = round(cgpa * self.steps_per_point)
+        if 0 <= scaled < len(self.cgpas) and self.cgpas[scaled] == cgpa:
+            return scaled
+        return None
+    
+    def api_body(self, key):
+        """Compact JSON body for /api/v1/predict, built on first use."""
+        body = self._api_bodies[key]
+        if body is None:
+            body = self._api_bodies[key] = json.dumps(
+                {"cgpa": self.cgpas[key], "package": self.packages[key]},
+                separators=(',', ':')
+            ).encode('utf-8')
+        return body
+
+# Placeholders rendered in place of the counters so cached pages can be reused
+COUNTER_MARKERS = ("@@TOTAL_USERS@@", "@@PREDICTIONS@@")
+
+# gzip member framing around the spliced deflate blocks (no file name or mtime)
+GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+DEFLATE_FINAL_BLOCK = b'\x03\x00'  # empty final block, ends the deflate stream
+
+def deflate_segment(data, level):
+    """Raw deflate blocks for data, sync-flushed so they can be concatenated."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def stored_block(data):
+    """data as one uncompressed (non-final) deflate block - cheap for a few digits."""
+    return b'\x00' + struct.pack('<HH', len(data), len(data) ^ 0xFFFF) + data
+
+class PageShell:
+    """One page state rendered with counter placeholders and split around them.
+
+    Holds the three static segments as bytes and as pre-compressed deflate
+    blocks; a response only adds the two counter values as stored blocks.
+    """
+    
+    def __init__(self, segments, gzip_level):
+        self.segments = [segment.encode('utf-8') for segment in segments]
+        self.deflated = [deflate_segment(segment, gzip_level) for segment in self.segments]
+        # Content hash of the static parts - the same in every worker
+        self.tag = hashlib.sha1(b'\0'.join(self.segments)).hexdigest()[:16]
+    
+    def parts(self, total_users, predictions):
+        first, middle, last = self.segments
+        return first, str(total_users).encode('ascii'), middle, str(predictions).encode('ascii'), last
+    
+    def body(self, total_users, predictions):
+        return b''.join(self.parts(total_users, predictions))
+    
+    def gzip_body(self, total_users, predictions):
+        first, users, middle, count, last = self.parts(total_users, predictions)
+        crc = size = 0
+        for part in (first, users, middle, count, last):
+            crc = zlib.crc32(part, crc)
+            size += len(part)
+        return b''.join((
+            GZIP_HEADER,
+            self.deflated[0], stored_block(users),
+            self.deflated[1], stored_block(count),
+            self.deflated[2], DEFLATE_FINAL_BLOCK,
+            struct.pack('<II', crc, size & 0xFFFFFFFF)
+        ))
+
+class PageCache:
+    """Renders index.html as a cached static shell plus the two live counters.
+
+    Each distinct page state (home, a prediction message, feedback results)
+    is rendered once per worker with placeholder counters, split into static
+    segments and compressed; later requests only splice in the counters. The
+    ETag covers the shell and the counters, so an unchanged page revalidates
+    with a 304. Brotli bodies cannot be spliced and are cached per ETag.
+    """
+    
+    def __init__(self, template_name, cache_size, gzip_level, brotli_quality, brotli_cache_size):
+        self.template_name = template_name
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.shell = lru_cache(maxsize=cache_size)(self._shell)
+        self.brotli_body = lru_cache(maxsize=brotli_cache_size)(self._brotli_body)
+    
+    def _shell(self, state):
+        page = render_template(self.template_name, **dict(state),
+                               total_users=COUNTER_MARKERS[0], predictions=COUNTER_MARKERS[1])
+        before, found_users, rest = page.partition(COUNTER_MARKERS[0])
+        middle, found_predictions, after = rest.partition(COUNTER_MARKERS[1])
+        if not (found_users and found_predictions) or any(marker in after for marker in COUNTER_MARKERS):
+            return None  # template does not show each counter exactly once
+        return PageShell((before, middle, after), self.gzip_level)
+    
+    def _brotli_body(self, state, total_users, predictions):
+        return brotli.compress(self.shell(state).body(total_users, predictions), quality=self.brotli_quality)
+    
+    def clear(self):
+        self.shell.cache_clear()
+        self.brotli_body.cache_clear()
+    
+    def render(self, total_users, predictions, **context):
+        """The page as a string, for callers that build their own response."""
+        shell = self.shell(tuple(sorted(context.items())))
+        if shell is None:
+            return render_template(self.template_name, total_users=total_users,
+                                   predictions=predictions, **context)
+        return shell.body(total_users, predictions).decode('utf-8')
+    
+    def build(self, total_users, predictions, accept_encoding='', if_none_match=None, **context):
+        """(status, body, headers) for the page, negotiated and conditional.
+        
+        Pass if_none_match only for GET/HEAD requests.
+        """
+        state = tuple(sorted(context.items()))
+        shell = self.shell(state)
+        headers = {'Content-Type': 'text/html; charset=utf-8'}
+        if shell is None:
+            body = render_template(self.template_name, total_users=total_users,
+                                   predictions=predictions, **context).encode('utf-8')
+            return 200, body, headers
         
-        # Add new feedback and save
-        all_feedback.append(feedback_data)
-        with open(feedback_file, 'w') as f:
-            json.dump(all_feedback, f, indent=2)
+        encoding = negotiate_encoding(accept_encoding)
+        etag = f'"{shell.tag}-{total_users}-{predictions}' + (f'-{encoding}"' if encoding else '"')
+        headers.update({
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+            'Cache-Control': 'no-cache'  # counters change, so always revalidate
+        })
+        if if_none_match and etag_matches(if_none_match, etag):
+            del headers['Content-Type']
+            return 304, b'', headers
         
-        print(f"✅ Feedback saved to file: {feedback_file}")
+        if encoding == 'br':
+            body = self.brotli_body(state, total_users, predictions)
+        elif encoding == 'gzip':
+            body = shell.gzip_body(total_users, predictions)
+        else:
+            body = shell.body(total_users, predictions)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return 200, body, headers
+
+# File suffix of each pre-compressed variant
+ENCODING_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+# Function to pick the response encoding from an Accept-Encoding header
+def negotiate_encoding(accept_encoding):
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    if has_brotli and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+# Function to check an If-None-Match header against an ETag
+def etag_matches(if_none_match, etag):
+    if if_none_match.strip() == '*':
         return True
-    except Exception as e:
-        print(f"❌ Error saving feedback to file: {str(e)}")
-        return False
+    return etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+page_cache = PageCache(
+    'index.html',
+    cache_size=PAGE_CACHE_SIZE,
+    gzip_level=PAGE_GZIP_LEVEL,
+    brotli_quality=PAGE_BROTLI_QUALITY,
+    brotli_cache_size=PAGE_BROTLI_CACHE_SIZE
+)
+
+# Flask response for a cached page (home/predict/feedback)
+def page_response(total_users, predictions, conditional=False, **context):
+    status, body, headers = page_cache.build(
+        total_users, predictions,
+        accept_encoding=request.headers.get('Accept-Encoding', ''),
+        if_none_match=request.headers.get('If-None-Match') if conditional else None,
+        **context
+    )
+    return app.response_class(body, status=status, headers=headers)
+
+# Function to validate a batch of CGPAs in one pass
+def validate_cgpa_batch(values):
+    """Convert raw CGPA values to floats and range-check them.
 
-# Load the model
-def load_model():
-    # Model coefficients
-    m = 0.55795197
-    b = -0.8961119222429126
+    Returns (cgpas, invalid) where invalid lists the indices that are not
+    numbers between 0 and 10.
+    """
+    if numpy_available():
+        try:
+            cgpas = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            cgpas = None
+        if cgpas is not None and cgpas.ndim == 1:
+            bad = ~np.isfinite(cgpas) | (cgpas < 0) | (cgpas > 10)
+            return cgpas, np.flatnonzero(bad).tolist()
     
-    class SimpleLinearModel:
-        def __init__(self, m, b):
-            self.m = m
-            self.b = b
-        
-        def predict(self, X):
-            return self.m * X + self.b
+    # Element-wise fallback (no NumPy, or values NumPy could not convert)
+    cgpas = array('d')
+    invalid = []
+    for i, value in enumerate(values):
+        try:
+            cgpa = float(value)
+        except (TypeError, ValueError):
+            cgpa = float('nan')
+        if not 0 <= cgpa <= 10:
+            invalid.append(i)
+        cgpas.append(cgpa)
+    return cgpas, invalid
+
+# Function to read the CGPA list from a JSON or NDJSON request body
+def parse_cgpa_payload(req):
+    """Accepts a JSON array, {"cgpa": [...]}, {"records": [...]} or one value/record per NDJSON line."""
+    return parse_cgpa_body(req.get_data(cache=False, as_text=True), req.mimetype)
+
+def parse_cgpa_body(body, mimetype):
+    if mimetype in ('application/x-ndjson', 'application/ndjson'):
+        values = []
+        for line in body.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            values.append(json.loads(line))
+        return values
     
-    return SimpleLinearModel(m, b)
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        payload = payload.get('records', payload.get('cgpa'))
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array of CGPAs or records, {"cgpa": [...]} or {"records": [...]}')
+    return payload
 
-# Create model instance
-model = load_model()
+# Compact JSON response (no whitespace) for the API routes
+def json_response(payload, status=200):
+    return app.response_class(
+        json.dumps(payload, separators=(',', ':')),
+        status=status,
+        mimetype='application/json'
+    )
+
+# Interval level used when a request asks for prediction intervals without one (?interval=1)
+PREDICTION_INTERVAL_LEVEL = 0.95
+
+# Function to read the ?interval= option: None, or the interval level
+def parse_interval_level(value):
+    if value in (None, '', '0', 'false'):
+        return None
+    if value in ('1', 'true'):
+        return PREDICTION_INTERVAL_LEVEL
+    level = float(value)
+    if not 0 < level < 1:
+        raise ValueError('interval must be 1 or a level between 0 and 1, e.g. 0.9')
+    return level
+
+# Function to pick the model's other inputs (everything but cgpa) out of form or query args
+def extra_features(model, args):
+    return {name: args[name] for name in model.inputs if name != 'cgpa' and name in args}
+
+# Function to predict one CGPA with other inputs and/or an interval: (prediction, [low, high] or None)
+def predict_features(model, cgpa, extras, level=None):
+    rows, invalid = model.design_matrix([dict(extras, cgpa=cgpa)])
+    if invalid:
+        raise ValueError(f"Invalid input values, expected usable values for {', '.join(model.inputs)}")
+    predictions, intervals = model.predict_matrix(rows, level)
+    return predictions[0], intervals[0] if intervals else None
+
+# Function to build one /api/v1/predict answer: (prediction, JSON body, ETag); ValueError for bad inputs
+def api_prediction(model, cgpa, extras, level=None):
+    table = model.table
+    key = table.key(cgpa) if not extras and level is None else None
+    if key is not None:
+        return table.packages[key], table.api_body(key), f"{table.version}-{key}"
+    if extras or level is not None:
+        if level is not None and not model.has_intervals():
+            raise ValueError('This model has no stored covariance, so it cannot give intervals')
+        prediction, interval = predict_features(model, cgpa, extras, level)
+        payload = {'cgpa': cgpa, 'package': prediction}
+        if interval is not None:
+            payload['interval'] = interval
+        request_key = hashlib.sha1(repr((cgpa, sorted(extras.items()), level)).encode('utf-8')).hexdigest()[:12]
+        return prediction, json.dumps(payload, separators=(',', ':')), f"{table.version}-{request_key}"
+    prediction = round(model.predict(cgpa), 2)
+    return prediction, json.dumps({'cgpa': cgpa, 'package': prediction}, separators=(',', ':')), f"{table.version}-{cgpa!r}"
+
+# Function to score a parsed batch body: (payload, status, inputs, predictions)
+def batch_predictions(model, values, level=None):
+    """values are CGPAs or feature records ({"cgpa": 8.1, "backlogs": 0, ...}), as parse_cgpa_body returns."""
+    if len(values) > BATCH_MAX_SIZE:
+        return {'error': f'Batch too large, at most {BATCH_MAX_SIZE} CGPAs per request'}, 413, None, None
+    if level is not None and not model.has_intervals():
+        return {'error': 'This model has no stored covariance, so it cannot give intervals'}, 400, None, None
+    
+    if level is None and not any(isinstance(value, dict) for value in values):
+        # Plain CGPAs: one vectorized m * cgpa + b pass
+        cgpas, invalid = validate_cgpa_batch(values)
+        if invalid:
+            return {'error': 'CGPA must be a number between 0 and 10', 'invalid': invalid}, 400, None, None
+        predictions = model.predict_batch(cgpas)
+        return {'count': len(cgpas), 'predictions': predictions}, 200, cgpas, predictions
+    
+    records = [value if isinstance(value, dict) else {'cgpa': value} for value in values]
+    rows, invalid = model.design_matrix(records)
+    if invalid:
+        error = 'CGPA must be a number between 0 and 10'
+        others = [name for name in model.inputs if name != 'cgpa']
+        if others:
+            error += f", with usable values for {', '.join(others)}"
+        return {'error': error, 'invalid': invalid}, 400, None, None
+    predictions, intervals = model.predict_matrix(rows, level)
+    payload = {'count': len(predictions), 'predictions': predictions}
+    if intervals is not None:
+        payload['intervals'] = intervals
+    return payload, 200, records, predictions
+
+# Active/candidate models, hot-reloaded from MODEL_DIR or MongoDB
+model_registry = ModelRegistry(
+    MODEL_SOURCE,
+    MODEL_DIR,
+    interval=MODEL_RELOAD_INTERVAL,
+    candidate_mode=MODEL_CANDIDATE_MODE,
+    candidate_fraction=MODEL_CANDIDATE_FRACTION
+)
 
 @app.route('/')
 def home():
@@ -378,17 +3520,14 @@ def home():
     total_users, predictions = get_user_count()
     
     try:
-        response = render_template('index.html', 
-                              total_users=total_users, 
-                              predictions=predictions)
+        # Cached shell + live counters; 304 if the browser already has this state
+        resp = page_response(total_users, predictions, conditional=True)
         
         # Set cookie if new user
         if is_new_user:
-            resp = app.make_response(response)
             resp.set_cookie('user_id', user_id, max_age=365*24*60*60)  # 1 year
-            return resp
             
-        return response
+        return resp
         
     except Exception as e:
         error_message = f"Error rendering template: {str(e)}<br>App template folder: {app.template_folder}<br>Current directory: {os.getcwd()}"
@@ -407,37 +3546,41 @@ def feedback():
         name = request.form.get('name', '')
         email = request.form.get('email', '')
         message = request.form.get('message', '')
-        rating = request.form.get('rating', 5)
-        
-        # Convert rating to integer
-        try:
-            rating = int(rating)
-        except:
-            rating = 5
+        rating = parse_rating(request.form.get('rating', 5))
+        idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
             
-        # Save feedback
-        success = save_feedback(user_id, name, email, message, rating)
+        # Spool feedback - a repeated idempotency key is accepted but stored once
+        success = save_feedback(user_id, name, email, message, rating, idempotency_key)
         
         # Get current counts for rendering the page
         total_users, predictions = get_user_count()
         
         # Return thank you page or message
         if success:
-            return render_template('index.html', 
-                             feedback_success=True, 
-                             total_users=total_users, 
-                             predictions=predictions)
+            return page_response(total_users, predictions, feedback_success=True)
         else:
-            return render_template('index.html', 
-                             feedback_error="Unable to save feedback. Please try again later.", 
-                             total_users=total_users, 
-                             predictions=predictions)
+            return page_response(total_users, predictions,
+                                 feedback_error="Unable to save feedback. Please try again later.")
             
     except Exception as e:
+        total_users, predictions = get_user_count()
         return render_template('index.html', 
                          feedback_error=f"Error: {str(e)}", 
-                         total_users=get_user_count()[0], 
-                         predictions=get_user_count()[1])
+                         total_users=total_users, 
+                         predictions=predictions)
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the worker is up and serving. No database, disk or template access."""
+    return app.response_class('ok\n', mimetype='text/plain', headers={'Cache-Control': 'no-store'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness from the background MongoDB check (503 until the first one completes)."""
+    ready, details = readiness.status()
+    resp = json_response(details, 200 if ready else 503)
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
 
 @app.route('/debug')
 def debug():
@@ -457,32 +3600,32 @@ def debug():
     # Check MongoDB connection
     if using_mongodb:
         try:
-            client.admin.command('ping')
+            mongo.client().admin.command('ping')
             info['MongoDB Ping'] = "Success"
             
             # Get stats
-            stats = stats_collection.find_one({"_id": "counter"})
+            stats = mongo.collection("stats").find_one({"_id": "counter"})
             if stats:
                 info['MongoDB Stats'] = str(stats)
             else:
                 info['MongoDB Stats'] = "No stats found"
                 
             # Get recent predictions (last 5)
-            recent_predictions = list(predictions_collection.find().sort("timestamp", -1).limit(5))
+            recent_predictions = list(mongo.collection("predictions").find().sort("timestamp", -1).limit(5))
             if recent_predictions:
                 info['Recent Predictions'] = str(recent_predictions)
             else:
                 info['Recent Predictions'] = "No predictions found"
                 
             # Get recent visitors (last 5)
-            recent_visitors = list(visitors_collection.find().sort("timestamp", -1).limit(5))
+            recent_visitors = list(mongo.collection("visitors").find().sort("timestamp", -1).limit(5))
             if recent_visitors:
                 info['Recent Visitors'] = str(recent_visitors)
             else:
                 info['Recent Visitors'] = "No visitors found"
                 
             # Get recent feedback (last 5)
-            recent_feedback = list(feedback_collection.find().sort("timestamp", -1).limit(5))
+            recent_feedback = list(mongo.collection("feedback").find().sort("timestamp", -1).limit(5))
             if recent_feedback:
                 info['Recent Feedback'] = str(recent_feedback)
             else:
@@ -492,15 +3635,17 @@ def debug():
             info['MongoDB Error'] = str(e)
     
     # Check counter file
-    if os.path.exists(COUNTER_FILE):
+    if os.path.exists(counter_file.path):
         try:
-            with open(COUNTER_FILE, 'r') as f:
-                data = json.load(f)
-                info['Counter File Content'] = str(data)
+            total_users, predictions = counter_file.read()
+            info['Counter File Content'] = str({'total_users': total_users, 'predictions': predictions})
         except Exception as e:
             info['Counter File Error'] = str(e)
     else:
         info['Counter File'] = "Does not exist"
+    
+    # Feedback waiting in the spool for background delivery
+    info['Feedback Spool'] = str(feedback_ingest.status())
         
     # Check index.html existence
     if os.path.exists('templates/index.html'):
@@ -547,10 +3692,11 @@ def debug():
 def reset_database():
     if using_mongodb:
         try:
-            stats_collection.update_one(
+            mongo.collection("stats").update_one(
                 {"_id": "counter"},
                 {"$set": {"total_users": 0, "predictions": 0, "updated_at": datetime.now()}}
             )
+            counter_cache.invalidate()
             return "Database counters reset successfully! <a href='/debug'>Back to Debug</a>"
         except Exception as e:
             return f"Error resetting database: {str(e)}"
@@ -560,11 +3706,8 @@ def reset_database():
 @app.route('/reset-counter-file', methods=['POST'])
 def reset_counter_file():
     try:
-        with open(COUNTER_FILE, 'w') as f:
-            json.dump({
-                'total_users': 0,
-                'predictions': 0
-            }, f)
+        counter_file.reset()
+        counter_cache.invalidate()
         return "Counter file reset successfully! <a href='/debug'>Back to Debug</a>"
     except Exception as e:
         return f"Error resetting counter file: {str(e)}"
@@ -582,8 +3725,9 @@ def emergency_create_template():
                 with open('index.html', 'r') as src, open('templates/index.html', 'w') as dst:
                     dst.write(src.read())
                 print("Successfully copied index.html to templates/")
-                # Reset the Flask template path
+                # Reset the Flask template path and the cached page shells
                 app.template_folder = 'templates'
+                page_cache.clear()
                 return "Found and copied index.html to templates directory! <a href='/'>Go to homepage</a>"
             except Exception as e:
                 print(f"Error copying index.html: {str(e)}")
@@ -694,6 +3838,7 @@ def emergency_create_template():
             {% endif %}
             
             <form action="/feedback" method="post">
+                <input type="hidden" name="idempotency_key">
                 <div class="form-group">
                     <label for="name">Name</label>
                     <input type="text" id="name" name="name" required>
@@ -754,6 +3899,12 @@ def emergency_create_template():
                 }, 16);
             });
             
+            // One key per rendered form, so a double click or a resubmitted POST is stored once
+            document.querySelectorAll('input[name="idempotency_key"]').forEach(function(input) {
+                input.value = window.crypto && crypto.randomUUID ? crypto.randomUUID()
+                    : Date.now().toString(36) + Math.random().toString(36).slice(2);
+            });
+            
             // Star rating functionality
             const stars = document.querySelectorAll('.rating label');
             stars.forEach((star, index) => {
@@ -769,8 +3920,9 @@ def emergency_create_template():
         with open('templates/index.html', 'w') as f:
             f.write(minimal_template)
         
-        # Reset the Flask template path
+        # Reset the Flask template path and the cached page shells
         app.template_folder = 'templates'
+        page_cache.clear()
         
         return "Emergency template created successfully! <a href='/'>Go to homepage</a>"
     except Exception as e:
@@ -786,15 +3938,6 @@ def predict():
         if cgpa < 0 or cgpa > 10:
             return render_template('index.html', error='CGPA must be between 0 and 10', cgpa=cgpa)
         
-        # Make prediction
-        prediction = model.predict(cgpa)
-        
-        # Round to 2 decimal places
-        prediction = round(prediction, 2)
-        
-        # Format the prediction message
-        prediction_message = f"With a CGPA of {cgpa}, your predicted package is ₹{prediction} LPA"
-        
         # Get or create user_id from cookie
         user_id = request.cookies.get('user_id')
         is_new_user = user_id is None
@@ -802,6 +3945,24 @@ def predict():
         if is_new_user:
             user_id = secrets.token_hex(16)
         
+        # Look the prediction up in the precomputed table when the CGPA is on the 0.01 grid
+        # and the form sends no other model inputs
+        model, shadow = model_registry.pick(user_id)
+        extras = extra_features(model, request.form)
+        table = model.table
+        key = None if extras else table.key(cgpa)
+        if key is not None:
+            prediction = table.packages[key]
+            prediction_message = table.messages[key]
+        else:
+            # Make prediction, rounded to 2 decimal places
+            if extras:
+                prediction, _ = predict_features(model, cgpa, extras)
+            else:
+                prediction = round(model.predict(cgpa), 2)
+            prediction_message = format_prediction_message(cgpa, prediction)
+        shadow_predictions(shadow, [dict(extras, cgpa=cgpa)] if extras else [cgpa], [prediction], model.version)
+        
         # Track visitor
         track_visitor(
             user_id=user_id,
@@ -812,20 +3973,20 @@ def predict():
         
         # Log this prediction
         if using_mongodb:
-            log_prediction(cgpa, prediction, user_id)
+            log_prediction(cgpa, prediction, user_id, model.version, extras)
         
         # Increment the counter
         total_users, predictions = increment_user_count(is_new_user=is_new_user)
         
-        # Render template with prediction
-        response = render_template('index.html', 
-                           prediction_text=prediction_message, 
-                           cgpa=cgpa,
-                           total_users=total_users,
-                           predictions=predictions)
-        
-        # Create response object to set cookie
-        resp = app.make_response(response)
+        # Render the prediction page (repeated CGPAs reuse a cached shell)
+        if key is not None:
+            resp = page_response(total_users, predictions, prediction_text=prediction_message, cgpa=table.cgpas[key])
+        else:
+            resp = app.make_response(render_template('index.html', 
+                               prediction_text=prediction_message, 
+                               cgpa=cgpa,
+                               total_users=total_users,
+                               predictions=predictions))
         
         # Set a cookie to track returning users if it's a new user
         if is_new_user:
@@ -836,6 +3997,274 @@ def predict():
     except Exception as e:
         return render_template('index.html', error=f'Error: {str(e)}')
 
+# Function to record an API prediction - runs on the analytics thread, never the request
+def record_api_prediction(cgpa, prediction, user_id, ip_address, user_agent, model_version=None, features=None):
+    track_visitor(
+        user_id=user_id,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        path='/api/v1/predict'
+    )
+    log_prediction(cgpa, prediction, user_id, model_version, features)
+    increment_user_count(is_new_user=False)
+
+@app.route('/api/v1/predict')
+def api_predict():
+    """Single prediction as {cgpa, package} JSON - no template, no synchronous DB work."""
+    try:
+        cgpa = float(request.args['cgpa'])
+    except (KeyError, ValueError):
+        return json_response({'error': 'Query parameter cgpa must be a number'}, 400)
+    if not 0 <= cgpa <= 10:
+        return json_response({'error': 'CGPA must be between 0 and 10'}, 400)
+    
+    user_id = request.cookies.get('user_id')
+    model, shadow = model_registry.pick(user_id)
+    extras = extra_features(model, request.args)
+    try:
+        level = parse_interval_level(request.args.get('interval'))
+        prediction, body, etag = api_prediction(model, cgpa, extras, level)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    
+    analytics.defer(record_api_prediction, cgpa, prediction, user_id,
+                    request.remote_addr, request.user_agent.string, model.version, extras)
+    shadow_predictions(shadow, [dict(extras, cgpa=cgpa)] if extras else [cgpa], [prediction], model.version)
+    
+    resp = app.response_class(body, mimetype='application/json')
+    resp.set_etag(etag)
+    # Shared caches must not hand one user's A/B model answer to another
+    if model_registry.varies_by_user():
+        resp.cache_control.private = True
+    else:
+        resp.cache_control.public = True
+    resp.cache_control.max_age = API_CACHE_MAX_AGE
+    return resp.make_conditional(request)
+
+@app.route('/api/v1/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score a whole cohort of CGPAs or feature records in one request, returning compact JSON."""
+    try:
+        level = parse_interval_level(request.args.get('interval'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    try:
+        values = parse_cgpa_payload(request)
+    except ValueError as e:
+        return json_response({'error': f'Invalid request body: {str(e)}'}, 400)
+    
+    model, shadow = model_registry.pick(request.cookies.get('user_id'))
+    payload, status, inputs, predictions = batch_predictions(model, values, level)
+    if status == 200:
+        shadow_predictions(shadow, inputs, predictions, model.version)
+    return json_response(payload, status)
+
+# Streaming exports of the analytics collections
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")  # required by /export; exports are disabled without it
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))  # documents per cursor round trip
+EXPORT_CHUNK_BYTES = int(os.environ.get("EXPORT_CHUNK_BYTES", 64 * 1024))  # bytes per streamed chunk
+
+# CSV columns per collection (NDJSON exports every field)
+EXPORT_FIELDS = {
+    "predictions": ["_id", "timestamp", "user_id", "cgpa", "prediction", "model_version"],
+    "visitors": ["_id", "timestamp", "user_id", "ip_address", "user_agent", "path"],
+    "feedback": ["_id", "timestamp", "user_id", "name", "email", "rating", "message"]
+}
+
+# Function to turn BSON values (ObjectId, datetime) into JSON/CSV friendly ones
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    return str(value)
+
+# Function to parse an optional ISO 8601 time range bound
+def parse_export_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}, expected ISO 8601 such as 2024-05-01 or 2024-05-01T12:00:00")
+
+# Function to iterate over one collection's documents in constant memory
+def iter_export_documents(collection_name, since=None, until=None):
+    if using_mongodb:
+        query = {}
+        if since or until:
+            query["timestamp"] = {}
+            if since:
+                query["timestamp"]["$gte"] = since
+            if until:
+                query["timestamp"]["$lt"] = until
+        # Natural order: a sort on an unindexed field would be done in server memory
+        cursor = mongo.collection(collection_name).find(query, batch_size=EXPORT_BATCH_SIZE)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+        return
+    
+    # Without MongoDB only feedback is kept locally
+    if collection_name != "feedback":
+        return
+    for record in feedback_store.iter_records():
+        if since or until:
+            try:
+                timestamp = datetime.fromisoformat(record.get("timestamp", ""))
+            except (TypeError, ValueError):
+                continue
+            if (since and timestamp < since) or (until and timestamp >= until):
+                continue
+        yield record
+
+# Function to stream an export as NDJSON or CSV bytes, optionally gzipped
+def export_chunks(collection_name, fmt="ndjson", since=None, until=None, compress=False):
+    """Yield the export in ~EXPORT_CHUNK_BYTES pieces; memory stays flat for any size."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        fields = EXPORT_FIELDS[collection_name]
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+    
+    def drain():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+    
+    for document in iter_export_documents(collection_name, since, until):
+        if writer:
+            writer.writerow({field: export_value(document.get(field)) for field in writer.fieldnames})
+        else:
+            buffer.write(json.dumps({key: export_value(value) for key, value in document.items()},
+                                    separators=(',', ':'), default=str))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            chunk = drain()
+            if chunk:
+                yield chunk
+    
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+@app.route('/export/<collection_name>')
+def export(collection_name):
+    """Stream a full collection: ?format=ndjson|csv&since=&until=&gzip=1 (needs EXPORT_TOKEN)."""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip() or request.args.get('token')
+    if not EXPORT_TOKEN or not token or not secrets.compare_digest(token, EXPORT_TOKEN):
+        return json_response({'error': 'Exports need a valid EXPORT_TOKEN (Authorization: Bearer <token>)'}, 403)
+    if collection_name not in EXPORT_FIELDS:
+        return json_response({'error': f'Unknown collection, expected one of {", ".join(EXPORT_FIELDS)}'}, 404)
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return json_response({'error': 'format must be ndjson or csv'}, 400)
+    try:
+        since = parse_export_time(request.args.get('since'))
+        until = parse_export_time(request.args.get('until'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    compress = request.args.get('gzip') in ('1', 'true')
+    
+    filename = f"{collection_name}.{fmt}" + (".gz" if compress else "")
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    resp = app.response_class(
+        stream_with_context(export_chunks(collection_name, fmt, since, until, compress)),
+        mimetype=mimetype
+    )
+    resp.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+# Default /stats window per granularity
+STATS_DEFAULT_WINDOWS = {"minute": timedelta(hours=1), "hour": timedelta(days=1), "day": timedelta(days=30)}
+
+@app.route('/stats')
+def stats():
+    """Rolled-up usage: ?granularity=minute|hour|day&since=&until= (ISO 8601)."""
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in ROLLUP_FORMATS:
+        return json_response({'error': 'granularity must be minute, hour or day'}, 400)
+    try:
+        until = parse_export_time(request.args.get('until')) or datetime.now()
+        since = parse_export_time(request.args.get('since')) or until - STATS_DEFAULT_WINDOWS[granularity]
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    if not using_mongodb or not ROLLUPS_ENABLED:
+        return json_response({'error': 'Statistics need MongoDB with ROLLUPS=1'}, 503)
+    
+    try:
+        documents = rollups.query(granularity, since, until)
+    except Exception as e:
+        return json_response({'error': f'Error reading rollups: {str(e)}'}, 500)
+    
+    buckets = []
+    for document in documents:
+        bucket = {"start": document["_id"].split(":", 1)[1]}
+        bucket.update(rollups.format_bucket(
+            document, document.get("unique_users", 0) if granularity == "day" else None
+        ))
+        buckets.append(bucket)
+    
+    return json_response({
+        'granularity': granularity,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'buckets': buckets,
+        'totals': rollups.format_bucket(rollups.merge(documents))
+    })
+
+@app.route('/stats/unique-users')
+def stats_unique_users():
+    """Approximate distinct user_ids: ?days=7 (ending today) or ?since=&until= dates, inclusive."""
+    try:
+        if request.args.get('since'):
+            first_day = parse_export_time(request.args['since']).date()
+            last_day = (parse_export_time(request.args.get('until')) or datetime.now()).date()
+        else:
+            days = int(request.args.get('days', 7))
+            if days < 1:
+                raise ValueError('days must be at least 1')
+            last_day = datetime.now().date()
+            first_day = last_day - timedelta(days=days - 1)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    if (last_day - first_day).days + 1 > HLL_MAX_DAYS or last_day < first_day:
+        return json_response({'error': f'Window must cover 1 to {HLL_MAX_DAYS} days'}, 400)
+    
+    try:
+        unique_users, per_day = unique_visitors.estimate(first_day, last_day)
+    except Exception as e:
+        return json_response({'error': f'Error reading unique-visitor sketches: {str(e)}'}, 500)
+    return json_response({
+        'since': first_day.isoformat(),
+        'until': last_day.isoformat(),
+        'unique_users': unique_users,
+        'per_day': per_day,
+        'standard_error': round(1.04 / math.sqrt(1 << HLL_PRECISION), 4)
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition, summed over every worker's metrics file."""
+    exposition = metrics.exposition()
+    if exposition is None:
+        return app.response_class("Metrics are disabled (METRICS=0 or prometheus_client missing)\n",
+                                  status=503, mimetype='text/plain')
+    body, content_type = exposition
+    return app.response_class(body, headers={'Content-Type': content_type, 'Cache-Control': 'no-store'})
+
+@app.route('/model')
+def model_status():
+    """Active and candidate models, and this worker's shadow/A-B comparison totals."""
+    return json_response(model_registry.status())
+
 @app.route('/mongo-status')
 def mongo_status():
     """Route to check MongoDB connection status and try different configurations"""
@@ -855,6 +4284,9 @@ def mongo_status():
         try:
             import pymongo
             results["pymongo_version"] = pymongo.__version__
+            if using_mongodb:
+                results["shared_pool"] = mongo.stats()
+                results["indexes"] = index_status
             
             # Use the global has_certifi variable instead of importing again
             if has_certifi:
@@ -862,54 +4294,21 @@ def mongo_status():
             else:
                 results["certifi_version"] = "Not installed"
             
-            import ssl
-            
             # Test different connection configurations
-            connection_configs = []
-            
-            # Only add certifi config if certifi is available
-            if has_certifi:
-                connection_configs.append({
-                    "name": "Standard with certifi",
-                    "options": {
-                        "tlsCAFile": certifi.where(),
-                        "serverSelectionTimeoutMS": 5000
-                    }
-                })
-            
-            # Add configs that don't depend on certifi
-            connection_configs.extend([
-                {
-                    "name": "No certificate verification",
-                    "options": {
-                        "ssl_cert_reqs": ssl.CERT_NONE,
-                        "serverSelectionTimeoutMS": 5000
-                    }
-                },
-                {
-                    "name": "Allow invalid certificates",
-                    "options": {
-                        "tlsAllowInvalidCertificates": True,
-                        "serverSelectionTimeoutMS": 5000
-                    }
-                },
-                {
-                    "name": "Minimal options",
-                    "options": {
-                        "serverSelectionTimeoutMS": 5000
-                    }
-                }
-            ])
+            connection_configs = mongodb_tls_configs()
             
             # Try each configuration
             results["connection_attempts"] = []
             
             for config in connection_configs:
+                client = None
                 try:
-                    # Create a fresh connection for testing with this config
-                    client = pymongo.MongoClient(
-                        os.environ.get("MONGO_URI"),
-                        **config["options"]
+                    # Short-lived, unmonitored probe client - closed below so it never leaks a pool
+                    client = mongo.create_client(
+                        config["options"],
+                        monitored=False,
+                        connectTimeoutMS=5000,
+                        serverSelectionTimeoutMS=5000
                     )
                     
                     # Force a connection to verify
@@ -923,7 +4322,7 @@ def mongo_status():
                     })
                     
                     # Store the first successful config
-                    if "connection_status" != "Connected successfully":
+                    if results["connection_status"] != "Connected successfully":
                         results["connection_status"] = "Connected successfully"
                         results["working_config"] = config["name"]
                         
@@ -934,6 +4333,9 @@ def mongo_status():
                         "error": str(e),
                         "options": str(config["options"])
                     })
+                finally:
+                    if client is not None:
+                        client.close()
             
         except ImportError as e:
             results["connection_status"] = f"Import Error: {str(e)}"
@@ -972,17 +4374,24 @@ def mongo_status():
     
     return html
 
+@app.route('/mongo-pool')
+def mongo_pool():
+    """Connection pool statistics for this worker (checked-out connections, wait times)"""
+    stats = mongo.stats()
+    stats["mongodb_enabled"] = using_mongodb
+    return jsonify(stats)
+
 @app.route('/test-mongo')
 def test_mongo():
     try:
-        # Test MongoDB connection
-        client = pymongo.MongoClient(MONGO_URI)
-        db = client.tr_calculator
+        # Test MongoDB connection using the shared pool and the database feedback is delivered to
+        db = mongo.database()
         feedback_count = db.feedback.count_documents({})
         return jsonify({
             'status': 'connected',
-            'database': 'tr_calculator',
+            'database': db.name,
             'feedback_count': feedback_count,
+            'feedback_spool': feedback_ingest.status(),
             'collections': db.list_collection_names()
         })
     except Exception as e:
@@ -993,31 +4402,142 @@ def test_mongo():
 
 @app.route('/submit-feedback', methods=['POST'])
 def submit_feedback():
+    """JSON counterpart of /feedback, through the same spool and dedup cache."""
     try:
-        feedback_data = {
-            'name': request.form.get('name'),
-            'email': request.form.get('email'),
-            'message': request.form.get('message'),
-            'rating': request.form.get('rating'),
-            'timestamp': datetime.now()
-        }
-        
-        # Print for debugging
-        print("Attempting to save feedback:", feedback_data)
-        
-        if MONGO_URI:
-            client = pymongo.MongoClient(MONGO_URI)
-            db = client.tr_calculator
-            result = db.feedback.insert_one(feedback_data)
-            print("Feedback saved with ID:", result.inserted_id)
-            return jsonify({'success': True, 'message': 'Feedback submitted successfully!'})
-        else:
-            print("No MongoDB URI configured")
-            return jsonify({'success': False, 'message': 'Database connection not configured'})
-            
+        entry_id, duplicate = feedback_ingest.submit(
+            request.cookies.get('user_id', secrets.token_hex(16)),
+            request.form.get('name', ''),
+            request.form.get('email', ''),
+            request.form.get('message', ''),
+            parse_rating(request.form.get('rating', 5)),
+            request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        )
+        if entry_id is None:
+            return jsonify({'success': False, 'message': 'Unable to save feedback. Please try again later.'})
+        return jsonify({'success': True, 'id': entry_id, 'duplicate': duplicate,
+                        'message': 'Feedback submitted successfully!'})
     except Exception as e:
         print("Error saving feedback:", str(e))
         return jsonify({'success': False, 'message': f'Error saving feedback: {str(e)}'})
 
+@app.cli.command('prepare-assets')
+def prepare_assets_command():
+    """Copy index.html and style.css into templates/ and static/."""
+    prepare_assets()
+
+@app.cli.command('build-assets')
+@click.option('--vendor', is_flag=True, help='Also download and bundle the CDN CSS/JS into static/.')
+def build_assets_command(vendor):
+    """Fingerprint and pre-compress static/ (runs prepare-assets first)."""
+    build_assets(vendor=vendor)
+
+@app.cli.command('export')
+@click.argument('collection_name', type=click.Choice(list(EXPORT_FIELDS)))
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv']), default='ndjson')
+@click.option('--since', help='Only documents at or after this ISO 8601 time.')
+@click.option('--until', help='Only documents before this ISO 8601 time.')
+@click.option('--gzip', 'compress', is_flag=True, help='gzip the output.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Output file (default: stdout).')
+def export_command(collection_name, fmt, since, until, compress, output):
+    """Stream a collection (or the local feedback store) as NDJSON or CSV."""
+    try:
+        since, until = parse_export_time(since), parse_export_time(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    # Connection messages go to stderr so stdout stays a clean export
+    with redirect_stdout(sys.stderr):
+        ensure_database()
+    with (open(output, 'wb') if output else nullcontext(sys.stdout.buffer)) as out:
+        for chunk in export_chunks(collection_name, fmt, since, until, compress):
+            out.write(chunk)
+
+@app.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create/verify the MongoDB indexes and TTL retention settings."""
+    ensure_database()
+    if not using_mongodb:
+        print("⚠️ MongoDB is not in use, no indexes to manage")
+        return
+    for label, result in ensure_indexes().items():
+        print(f"{label}: {result}")
+
+@app.cli.command('backfill-rollups')
+@click.option('--since', help='Rebuild buckets from this ISO 8601 time (default: all history).')
+@click.option('--until', help='Rebuild buckets before this ISO 8601 time (default: now).')
+def backfill_rollups_command(since, until):
+    """Rebuild the /stats rollups from the raw MongoDB collections."""
+    try:
+        since, until = parse_export_time(since), parse_export_time(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    ensure_database()
+    if not using_mongodb:
+        print("⚠️ MongoDB is not in use, nothing to back-fill")
+        return
+    print(f"✅ Rebuilt {rollups.backfill(since, until)} rollup buckets")
+
+@app.cli.command('publish-model')
+@click.argument('artifact_path')
+@click.option('--candidate', is_flag=True, help='Install as the candidate (shadow/A-B) model instead of the active one')
+def publish_model_command(artifact_path, candidate):
+    """Validate a model artifact and install it; running workers pick it up within MODEL_RELOAD_INTERVAL."""
+    with open(artifact_path, 'r', encoding='utf-8') as f:
+        artifact = json.load(f)
+    try:
+        published = publish_model(artifact, role="candidate" if candidate else "active")
+    except (ValueError, RuntimeError) as e:
+        raise click.ClickException(str(e))
+    print(f"✅ Published model {published.version} as {'candidate' if candidate else 'active'} ({MODEL_SOURCE})")
+
+@app.cli.command('remove-candidate')
+def remove_candidate_command():
+    """Stop serving and shadow-scoring the candidate model."""
+    remove_candidate_model()
+    print("✅ Candidate model removed")
+
+@app.cli.command('compact-storage')
+def compact_storage():
+    """Merge sealed local storage segments into one file per store."""
+    kept = feedback_store.compact()
+    print(f"✅ feedback: {kept} records in compacted segments")
+
+# Set once the app has been configured by create_app()
+app_configured = False
+
+# before_request hook - `gunicorn app:app` or FLASK_APP=app.py would serve the unconfigured app
+@app.before_request
+def require_create_app():
+    if not app_configured:
+        raise RuntimeError("app:app is not configured - serve wsgi:app (or app:create_app()) instead")
+
+# Application factory - wsgi.py (`gunicorn wsgi:app`), `gunicorn 'app:create_app()'` and asgi.py all configure the app here
+def create_app():
+    """Configure and return the app without touching the network or disk.
+
+    The database layer initializes on the first request (ensure_database) and
+    templates/static are laid out at build time, so importing this module is
+    cheap and safe under gunicorn --preload.
+    """
+    global app_configured
+    if not app_configured:
+        # Fall back to the project root's index.html if prepare-assets has not run
+        app.jinja_loader = ChoiceLoader([
+            FileSystemLoader(os.path.join(app.root_path, 'templates')),
+            FileSystemLoader(app.root_path)
+        ])
+        # Route latency covers everything, including the first request's database setup
+        app.before_request(start_request_timer)
+        app.after_request(observe_request)
+        app.before_request(enforce_rate_limit)
+        app.before_request(ensure_database_for_request)
+        # Fingerprinted static URLs and the view that serves them
+        app.url_defaults(fingerprint_static_url)
+        app.add_template_global(vendored)
+        app.view_functions['static'] = serve_static
+        app_configured = True
+    return app
+
+# Entry points (wsgi.py, asgi.py, `python app.py`) call create_app(); importing this module configures nothing
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    prepare_assets()
+    create_app().run(debug=True) 
\ No newline at end of file
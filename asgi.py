@@ -0,0 +1,449 @@
+"""ASGI entry point: the same routes on Starlette, with non-blocking MongoDB I/O.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+/, /predict, /feedback and the JSON prediction API are async handlers that
+await MongoDB through pymongo's AsyncMongoClient (or Motor on older
+pymongo), so one worker keeps many requests in flight while Atlas answers.
+Every other route (/debug, the Mongo diagnostics, the emergency tools) is
+served by the sync Flask app from app.py, mounted behind the async routes.
+`gunicorn wsgi:app` keeps working unchanged.
+"""
+import inspect
+import json
+import secrets
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import HTMLResponse, RedirectResponse, Response
+from starlette.routing import Mount, Route
+
+import app as flask_app
+
+# Async MongoDB driver: pymongo >= 4.10 ships one, Motor covers older versions
+try:
+    from pymongo import AsyncMongoClient
+    has_async_mongo = True
+except ImportError:
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+        has_async_mongo = True
+    except ImportError:
+        has_async_mongo = False
+        print("⚠️ No async MongoDB driver (pymongo>=4.10 or motor), MongoDB calls will run in threads")
+
+COOKIE_MAX_AGE = 365*24*60*60  # 1 year
+
+
+class AsyncMongoConnectionManager:
+    """Async counterpart of app.mongo, built from the options that passed its probe.
+
+    The client is created on first use inside the running event loop; the
+    sync manager keeps serving the mounted Flask routes and the analytics
+    thread.
+    """
+
+    def __init__(self, sync_manager):
+        self.sync_manager = sync_manager
+        self._client = None
+        self._collections = {}
+
+    def client(self):
+        if self._client is None:
+            self._client = AsyncMongoClient(self.sync_manager.uri, **self.sync_manager.client_options())
+            self._collections = {}
+        return self._client
+
+    def collection(self, name):
+        client = self.client()
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = client[self.sync_manager.db_name][name]
+        return collection
+
+    async def close(self):
+        if self._client is not None:
+            closed = self._client.close()  # a coroutine for pymongo, plain call for Motor
+            if inspect.isawaitable(closed):
+                await closed
+        self._client = None
+        self._collections = {}
+
+mongo = AsyncMongoConnectionManager(flask_app.mongo)
+
+# Function to initialize the database layer on the first request (probing runs in a thread)
+async def ensure_database():
+    if not flask_app.database_initialized:
+        await run_in_threadpool(flask_app.ensure_database)
+
+# True when MongoDB calls should be awaited on the event loop
+def use_async_mongo():
+    return flask_app.using_mongodb and has_async_mongo
+
+# Track visitor data
+async def track_visitor(user_id, ip_address=None, user_agent=None, path=None):
+    flask_app.unique_visitors.add(user_id)
+    if not flask_app.using_mongodb:
+        return
+    if flask_app.use_write_behind():
+        # Only enqueues for the analytics thread, so it never blocks the loop
+        flask_app.track_visitor(user_id, ip_address, user_agent, path)
+        return
+    if not has_async_mongo:
+        await run_in_threadpool(flask_app.track_visitor, user_id, ip_address, user_agent, path)
+        return
+    try:
+        visitor = {
+            "user_id": user_id,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            "path": path,
+            "timestamp": datetime.now()
+        }
+        with flask_app.metrics.mongo_timer("track_visitor", "visitors.insert_one"):
+            await mongo.collection("visitors").insert_one(visitor)
+        await bucket_events("visitors", [visitor])
+        await record_rollups("visitors", [visitor])
+    except Exception as e:
+        print(f"❌ Error tracking visitor: {str(e)}")
+
+# Function to log a prediction
+async def log_prediction(cgpa, prediction, user_id, model_version=None, features=None):
+    if not flask_app.using_mongodb:
+        return
+    if flask_app.use_write_behind():
+        flask_app.log_prediction(cgpa, prediction, user_id, model_version, features)
+        return
+    if not has_async_mongo:
+        await run_in_threadpool(flask_app.log_prediction, cgpa, prediction, user_id, model_version, features)
+        return
+    try:
+        prediction_doc = {
+            "cgpa": cgpa,
+            "prediction": prediction,
+            "user_id": user_id,
+            "model_version": model_version,
+            "timestamp": datetime.now()
+        }
+        if features:
+            prediction_doc["features"] = features
+        with flask_app.metrics.mongo_timer("log_prediction", "predictions.insert_one"):
+            await mongo.collection("predictions").insert_one(prediction_doc)
+        await bucket_events("predictions", [prediction_doc])
+        await record_rollups("predictions", [prediction_doc])
+    except Exception as e:
+        print(f"❌ Error logging prediction: {str(e)}")
+
+# Function to append events to their hourly buckets (EVENT_BUCKETS=1), as app.bucket_events does
+async def bucket_events(collection_name, documents):
+    if not flask_app.EVENT_BUCKETS or collection_name not in flask_app.BUCKETED_COLLECTIONS:
+        return
+    try:
+        buckets = mongo.collection(f"{collection_name}_hourly")
+        for bucket_filter, update in flask_app.event_bucket_updates(documents):
+            await buckets.update_one(bucket_filter, update, upsert=True)
+    except Exception as e:
+        print(f"❌ Error bucketing {len(documents)} {collection_name} events: {str(e)}")
+
+# Function to fold stored events into the /stats rollups, as app.rollups.record does
+async def record_rollups(collection_name, documents):
+    if not flask_app.ROLLUPS_ENABLED:
+        return
+    try:
+        updates, markers = flask_app.rollups.operations(collection_name, documents)
+        if markers:
+            result = await mongo.collection(flask_app.ROLLUP_USERS_COLLECTION).bulk_write(markers, ordered=False)
+            updates += flask_app.rollups.unique_user_operations(markers, result.upserted_ids)
+        if updates:
+            await mongo.collection(flask_app.ROLLUP_COLLECTION).bulk_write(updates, ordered=False)
+    except Exception as e:
+        print(f"❌ Error updating {collection_name} rollups: {str(e)}")
+
+# Function to get current user count (same cache and pending write-behind counts as app.py)
+async def get_user_count():
+    counts = flask_app.counter_cache.get()
+    if counts is None:
+        generation = flask_app.counter_cache.generation
+        counts = None
+        if use_async_mongo():
+            try:
+                with flask_app.metrics.mongo_timer("get_user_count", "stats.find_one"):
+                    stats = await mongo.collection("stats").find_one({"_id": "counter"})
+                counts = (stats.get("total_users", 0), stats.get("predictions", 0)) if stats else (0, 0)
+            except Exception as e:
+                print(f"Error reading from MongoDB: {str(e)}")
+                # Fallback to the local counter file, as the sync app does
+                counts = flask_app.load_local_count()
+        if counts is None:
+            # Local counter file (an mmap read) or a sync MongoDB read off the loop
+            counts = await run_in_threadpool(flask_app.load_user_count)
+        flask_app.counter_cache.set(counts, generation=generation)
+
+    if flask_app.use_write_behind():
+        pending_users, pending_predictions = flask_app.analytics.pending_counts()
+        return counts[0] + pending_users, counts[1] + pending_predictions
+    return counts
+
+# Function to increment user count
+async def increment_user_count(is_new_user=False):
+    if use_async_mongo() and not flask_app.use_write_behind():
+        try:
+            update_data = {"$inc": {"predictions": 1}, "$set": {"updated_at": datetime.now()}}
+            if is_new_user:
+                update_data["$inc"]["total_users"] = 1
+            with flask_app.metrics.mongo_timer("increment_user_count", "stats.find_one_and_update"):
+                stats = await mongo.collection("stats").find_one_and_update(
+                    {"_id": "counter"},
+                    update_data,
+                    return_document=flask_app.import_pymongo().ReturnDocument.AFTER
+                )
+            counts = (stats.get("total_users", 0), stats.get("predictions", 0)) if stats else (0, 0)
+            flask_app.counter_cache.set(counts)
+            return counts
+        except Exception as e:
+            print(f"Error updating MongoDB: {str(e)}")
+            # Fallback to the local counter file, as the sync app does
+            return flask_app.increment_local_count(is_new_user)
+    # Write-behind delta, local counter file, or sync MongoDB without an async driver
+    if flask_app.use_write_behind():
+        return flask_app.increment_user_count(is_new_user)
+    return await run_in_threadpool(flask_app.increment_user_count, is_new_user)
+
+# Function to save feedback - one fsync'd spool append, kept off the loop
+async def save_feedback(user_id, name, email, message, rating, idempotency_key=None):
+    return await run_in_threadpool(flask_app.save_feedback, user_id, name, email, message, rating, idempotency_key)
+
+# Function to read an application/x-www-form-urlencoded body (the only kind index.html posts)
+async def read_form(request):
+    body = await request.body()
+    return dict(parse_qsl(body.decode('utf-8', 'replace'), keep_blank_values=True))
+
+# Render a template through the Flask app so url_for and the Jinja loader match app.py
+def render_template(template_name, **context):
+    with flask_app.app.test_request_context('/'):
+        return flask_app.render_template(template_name, **context)
+
+# Cached page shell + live counters, compressed and conditional like app.page_response
+def page_response(request, total_users, predictions, conditional=False, user_id=None, **context):
+    with flask_app.app.test_request_context('/'):
+        status, body, headers = flask_app.page_cache.build(
+            total_users, predictions,
+            accept_encoding=request.headers.get('accept-encoding', ''),
+            if_none_match=request.headers.get('if-none-match') if conditional else None,
+            **context
+        )
+    response = Response(body, status_code=status, headers=headers)
+    if user_id is not None:
+        response.set_cookie('user_id', user_id, max_age=COOKIE_MAX_AGE)
+    return response
+
+def html_response(content, user_id=None):
+    response = HTMLResponse(content)
+    if user_id is not None:
+        response.set_cookie('user_id', user_id, max_age=COOKIE_MAX_AGE)
+    return response
+
+def json_response(payload, status=200):
+    return Response(json.dumps(payload, separators=(',', ':')), status_code=status,
+                    media_type='application/json')
+
+def client_host(request):
+    return request.client.host if request.client else None
+
+async def home(request):
+    await ensure_database()
+    user_id = request.cookies.get('user_id')
+    is_new_user = user_id is None
+    if is_new_user:
+        user_id = secrets.token_hex(16)
+
+    await track_visitor(
+        user_id=user_id,
+        ip_address=client_host(request),
+        user_agent=request.headers.get('user-agent', ''),
+        path='/'
+    )
+    total_users, predictions = await get_user_count()
+
+    try:
+        return page_response(request, total_users, predictions, conditional=True,
+                             user_id=user_id if is_new_user else None)
+    except Exception as e:
+        print(f"Error rendering template: {str(e)}")
+        return RedirectResponse('/emergency-create-template', status_code=307)
+
+async def feedback(request):
+    await ensure_database()
+    try:
+        form = await read_form(request)
+        user_id = request.cookies.get('user_id', secrets.token_hex(16))
+        rating = flask_app.parse_rating(form.get('rating', 5))
+        idempotency_key = request.headers.get('idempotency-key') or form.get('idempotency_key')
+
+        success = await save_feedback(user_id, form.get('name', ''), form.get('email', ''),
+                                      form.get('message', ''), rating, idempotency_key)
+        total_users, predictions = await get_user_count()
+        if success:
+            return page_response(request, total_users, predictions, feedback_success=True)
+        return page_response(request, total_users, predictions,
+                             feedback_error="Unable to save feedback. Please try again later.")
+    except Exception as e:
+        total_users, predictions = await get_user_count()
+        return html_response(render_template('index.html', feedback_error=f"Error: {str(e)}",
+                                             total_users=total_users, predictions=predictions))
+
+async def predict(request):
+    await ensure_database()
+    try:
+        form = await read_form(request)
+        cgpa = float(form.get('cgpa'))
+        if cgpa < 0 or cgpa > 10:
+            return html_response(render_template('index.html', error='CGPA must be between 0 and 10', cgpa=cgpa))
+
+        user_id = request.cookies.get('user_id')
+        is_new_user = user_id is None
+        if is_new_user:
+            user_id = secrets.token_hex(16)
+
+        model, shadow = flask_app.model_registry.pick(user_id)
+        extras = flask_app.extra_features(model, form)
+        table = model.table
+        key = None if extras else table.key(cgpa)
+        if key is not None:
+            prediction = table.packages[key]
+            prediction_message = table.messages[key]
+        else:
+            if extras:
+                prediction, _ = flask_app.predict_features(model, cgpa, extras)
+            else:
+                prediction = round(model.predict(cgpa), 2)
+            prediction_message = flask_app.format_prediction_message(cgpa, prediction)
+        flask_app.shadow_predictions(shadow, [dict(extras, cgpa=cgpa)] if extras else [cgpa], [prediction],
+                                     model.version)
+
+        await track_visitor(
+            user_id=user_id,
+            ip_address=client_host(request),
+            user_agent=request.headers.get('user-agent', ''),
+            path='/predict'
+        )
+        if flask_app.using_mongodb:
+            await log_prediction(cgpa, prediction, user_id, model.version, extras)
+        total_users, predictions = await increment_user_count(is_new_user=is_new_user)
+
+        if key is not None:
+            return page_response(request, total_users, predictions, user_id=user_id if is_new_user else None,
+                                 prediction_text=prediction_message, cgpa=table.cgpas[key])
+        content = render_template('index.html', prediction_text=prediction_message, cgpa=cgpa,
+                                  total_users=total_users, predictions=predictions)
+        return html_response(content, user_id if is_new_user else None)
+    except Exception as e:
+        return html_response(render_template('index.html', error=f'Error: {str(e)}'))
+
+async def api_predict(request):
+    """Single prediction as {cgpa, package} JSON - no template, no awaited DB work."""
+    await ensure_database()
+    try:
+        cgpa = float(request.query_params['cgpa'])
+    except (KeyError, ValueError):
+        return json_response({'error': 'Query parameter cgpa must be a number'}, 400)
+    if not 0 <= cgpa <= 10:
+        return json_response({'error': 'CGPA must be between 0 and 10'}, 400)
+
+    user_id = request.cookies.get('user_id')
+    model, shadow = flask_app.model_registry.pick(user_id)
+    extras = flask_app.extra_features(model, request.query_params)
+    try:
+        level = flask_app.parse_interval_level(request.query_params.get('interval'))
+        prediction, body, etag = flask_app.api_prediction(model, cgpa, extras, level)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+
+    flask_app.analytics.defer(flask_app.record_api_prediction, cgpa, prediction, user_id,
+                              client_host(request), request.headers.get('user-agent', ''), model.version, extras)
+    flask_app.shadow_predictions(shadow, [dict(extras, cgpa=cgpa)] if extras else [cgpa], [prediction],
+                                 model.version)
+
+    # Shared caches must not hand one user's A/B model answer to another
+    visibility = 'private' if flask_app.model_registry.varies_by_user() else 'public'
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': f'{visibility}, max-age={flask_app.API_CACHE_MAX_AGE}'
+    }
+    if flask_app.etag_matches(request.headers.get('if-none-match', ''), f'"{etag}"'):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+async def predict_batch(request):
+    """Score a whole cohort of CGPAs or feature records in one request, returning compact JSON."""
+    await ensure_database()
+    try:
+        level = flask_app.parse_interval_level(request.query_params.get('interval'))
+    except ValueError as e:
+        return json_response({'error': str(e)}, 400)
+    try:
+        body = (await request.body()).decode('utf-8')
+        mimetype = request.headers.get('content-type', '').split(';')[0].strip()
+        values = flask_app.parse_cgpa_body(body, mimetype)
+    except ValueError as e:
+        return json_response({'error': f'Invalid request body: {str(e)}'}, 400)
+
+    model, shadow = flask_app.model_registry.pick(request.cookies.get('user_id'))
+    payload, status, inputs, predictions = flask_app.batch_predictions(model, values, level)
+    if status == 200:
+        flask_app.shadow_predictions(shadow, inputs, predictions, model.version)
+    return json_response(payload, status)
+
+# Function to reject a client over its token buckets before any DB work, as app.enforce_rate_limit does
+def rate_limited(request, path, endpoint_name):
+    retry_after = flask_app.rate_limiter.check(
+        flask_app.client_ip(client_host(request), request.headers.get('x-forwarded-for')),
+        request.cookies.get('user_id'),
+        request.headers.get('user-agent')
+    )
+    if not retry_after:
+        return None
+    flask_app.metrics.rate_limited_request(path)
+    body, content_type, headers = flask_app.rate_limited_response(endpoint_name, retry_after)
+    return Response(body, status_code=429, headers=headers, media_type=content_type)
+
+# Route for an async handler, timed like app.observe_request times the Flask routes
+def timed_route(path, endpoint, **kwargs):
+    limited = endpoint.__name__ in flask_app.RATE_LIMITED_ENDPOINTS
+    async def handler(request):
+        start = time.perf_counter()
+        response = rate_limited(request, path, endpoint.__name__) if limited else None
+        if response is None:
+            response = await endpoint(request)
+        flask_app.metrics.observe_request(request.method, path, response.status_code, time.perf_counter() - start)
+        return response
+    return Route(path, handler, **kwargs)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await mongo.close()
+    flask_app.analytics.close()
+    flask_app.feedback_ingest.close()
+
+# Application factory - `uvicorn asgi:app` and `uvicorn --factory asgi:create_app` are the same app
+def create_app():
+    return Starlette(
+        routes=[
+            timed_route('/', home),
+            timed_route('/predict', predict, methods=['POST']),
+            timed_route('/feedback', feedback, methods=['POST']),
+            timed_route('/api/v1/predict', api_predict),
+            timed_route('/api/v1/predict/batch', predict_batch, methods=['POST']),
+            # Everything else (static files, /debug, /mongo-status, ...) is the sync Flask app
+            Mount('/', app=WSGIMiddleware(flask_app.create_app()))
+        ],
+        lifespan=lifespan
+    )
+
+app = create_app()
@@ -0,0 +1,398 @@
+"""Load-test and latency benchmark for the Flask routes.
+
+Drives /, /predict, /feedback and the JSON prediction endpoints through
+Flask's test client and/or a real gunicorn instance, with MongoDB replaced
+by an in-process mongomock client (or the local file storage with
+--mongo none). Reports throughput, p50/p95/p99 latency and memory
+allocated per request, plus the import-to-first-response time of app.py
+in a fresh interpreter, and writes everything to a JSON file so a change to
+app.py can be compared against a saved baseline:
+
+    python benchmark.py --output baseline.json
+    # ...change app.py...
+    python benchmark.py --output after.json --baseline baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlencode
+
+# Keep benchmark data (counters, feedback, probe cache) out of the real data directory
+BENCH_DATA_DIR = os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="tr-bench-"))
+os.environ.setdefault("MONGO_PROBE_CACHE_FILE", os.path.join(BENCH_DATA_DIR, ".mongo_probe_cache.json"))
+# Every benchmark request comes from one client, which the rate limiter would throttle
+os.environ.setdefault("RATE_LIMIT", "0")
+
+try:
+    import mongomock
+    has_mongomock = True
+except ImportError:
+    has_mongomock = False
+
+# Form posts and JSON bodies for each benchmarked route
+BATCH_SIZE = 100
+
+
+def build_scenarios(rng):
+    """(name, method, path, request kwargs factory) for every benchmarked route."""
+    def grid_cgpa():
+        return f"{rng.randint(500, 1000) / 100:.2f}"
+
+    return [
+        ("GET /", "GET", "/", lambda: {}),
+        ("POST /predict", "POST", "/predict", lambda: {"data": {"cgpa": grid_cgpa()}}),
+        ("POST /feedback", "POST", "/feedback", lambda: {"data": {
+            "name": "Bench", "email": "bench@example.com", "message": "Benchmark run", "rating": "5",
+            # A fresh key per post, so every request is spooled rather than answered as a repeat
+            "idempotency_key": f"bench-{rng.getrandbits(64):016x}"
+        }}),
+        ("GET /api/v1/predict", "GET", "/api/v1/predict", lambda: {"query_string": {"cgpa": grid_cgpa()}}),
+        ("POST /api/v1/predict/batch", "POST", "/api/v1/predict/batch", lambda: {
+            "json": [float(grid_cgpa()) for _ in range(BATCH_SIZE)]
+        }),
+    ]
+
+
+def patch_mongomock_bulk():
+    """Let mongomock's bulk builder take the sort= that pymongo >= 4.11 passes for every UpdateOne.
+
+    mongomock does not know the argument, so every rollup bulk_write would fail
+    under the fake backend; the app never sets a sort, so it is dropped when None.
+    """
+    builder = mongomock.collection.BulkOperationBuilder
+    if getattr(builder.add_update, "accepts_sort", False):
+        return
+    add_update = builder.add_update
+
+    def add_update_with_sort(self, *args, sort=None, **kwargs):
+        if sort is not None:
+            raise NotImplementedError("mongomock bulk updates do not support sort")
+        return add_update(self, *args, **kwargs)
+
+    add_update_with_sort.accepts_sort = True
+    builder.add_update = add_update_with_sort
+
+
+def install_fake_mongo(app_module):
+    """Point the app's shared MongoDB client at an in-process mongomock client."""
+    patch_mongomock_bulk()
+    client = mongomock.MongoClient()
+    app_module.mongo.adopt(client)
+    app_module.mongo.collection("stats").insert_one({
+        "_id": "counter", "total_users": 0, "predictions": 0,
+        "created_at": datetime.now(), "updated_at": datetime.now()
+    })
+    app_module.using_mongodb = True
+    app_module.database_initialized = True  # skip the real connection attempt on first request
+    return client
+
+
+def load_app(mongo_mode):
+    import app as app_module
+    if mongo_mode == "fake":
+        if not has_mongomock:
+            sys.exit("mongomock is not installed - pip install mongomock, or use --mongo none")
+        install_fake_mongo(app_module)
+    app_module.create_app()
+    return app_module
+
+
+def gunicorn_app():
+    """Entry point for the gunicorn run: `gunicorn 'benchmark:gunicorn_app()'`."""
+    app_module = load_app(os.environ.get("BENCH_MONGO", "fake"))
+    return app_module.app
+
+
+def summarize(latencies, elapsed):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else None
+    }
+
+
+def measure_allocations(client, method, path, make_kwargs, samples):
+    """Average bytes allocated (traced peak) and blocks retained per request."""
+    tracemalloc.start()
+    peaks = []
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        client.open(path, method=method, **make_kwargs())
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    retained = sys.getallocatedblocks() - blocks_before
+    tracemalloc.stop()
+    return {
+        "alloc_peak_kib_per_request": round(sum(peaks) / len(peaks) / 1024, 2),
+        "retained_blocks_per_request": round(retained / samples, 2)
+    }
+
+
+def run_test_client(app_module, requests, warmup, alloc_samples, seed):
+    client = app_module.app.test_client()
+    results = {}
+    for name, method, path, make_kwargs in build_scenarios(random.Random(seed)):
+        for _ in range(warmup):
+            client.open(path, method=method, **make_kwargs())
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests):
+            kwargs = make_kwargs()
+            t0 = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}")
+        elapsed = time.perf_counter() - started
+
+        results[name] = summarize(latencies, elapsed)
+        results[name].update(measure_allocations(client, method, path, make_kwargs, alloc_samples))
+        print(f"  {name:<28} {results[name]['throughput_rps']:>9} req/s  p95 {results[name]['p95_ms']} ms")
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def http_request(port, method, path, kwargs):
+    """One request over a fresh connection (gunicorn sync workers close keep-alives)."""
+    headers = {}
+    body = None
+    if "query_string" in kwargs:
+        path = f"{path}?{urlencode(kwargs['query_string'])}"
+    if "data" in kwargs:
+        body = urlencode(kwargs["data"])
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    if "json" in kwargs:
+        body = json.dumps(kwargs["json"])
+        headers["Content-Type"] = "application/json"
+
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def run_gunicorn(requests, warmup, concurrency, workers, mongo_mode, seed):
+    port = free_port()
+    env = dict(os.environ, BENCH_MONGO=mongo_mode)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-b", f"127.0.0.1:{port}", "-w", str(workers),
+         "--log-level", "warning", "benchmark:gunicorn_app()"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if http_request(port, "GET", "/api/v1/predict", {"query_string": {"cgpa": "8.00"}}) == 200:
+                    break
+            except OSError:
+                pass
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.2)
+
+        results = {}
+        for name, method, path, make_kwargs in build_scenarios(random.Random(seed)):
+            for _ in range(warmup):
+                http_request(port, method, path, make_kwargs())
+
+            latencies = []
+            errors = []
+            lock = threading.Lock()
+            per_thread = max(1, requests // concurrency)
+
+            def worker():
+                local = []
+                for _ in range(per_thread):
+                    kwargs = make_kwargs()
+                    t0 = time.perf_counter()
+                    status = http_request(port, method, path, kwargs)
+                    local.append(time.perf_counter() - t0)
+                    if status >= 400:
+                        errors.append(status)
+                with lock:
+                    latencies.extend(local)
+
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            if errors:
+                raise RuntimeError(f"{name} returned {errors[0]}")
+
+            results[name] = summarize(latencies, elapsed)
+            print(f"  {name:<28} {results[name]['throughput_rps']:>9} req/s  p95 {results[name]['p95_ms']} ms")
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# Run in a fresh interpreter: import app.py and serve one request without MongoDB
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app().test_client().get("/api/v1/predict", query_string={"cgpa": "8.00"})
+print(imported - started, time.perf_counter() - started)
+"""
+
+
+def measure_startup(runs):
+    """Import time and import-to-first-response time of app.py, with MONGO_URI unset.
+
+    The plain figures load app.py's cached bytecode, as a deployed worker does
+    after the build's compileall; the cold_ ones compile app.py from source
+    first (no .pyc, or PYTHONDONTWRITEBYTECODE=1).
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    # A private bytecode cache, so app.py's .pyc can be dropped before each cold run
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=tempfile.mkdtemp(prefix="tr-bench-pycache-"))
+    env.pop("MONGO_URI", None)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    app_bytecode = os.path.join(env["PYTHONPYCACHEPREFIX"], root.lstrip(os.sep),
+                                f"app.{sys.implementation.cache_tag}.pyc")
+
+    def run_once():
+        output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, text=True,
+                                check=True, env=env, cwd=root).stdout
+        return map(float, output.strip().splitlines()[-1].split())
+
+    run_once()  # fill the bytecode cache, for the app and its dependencies
+    timings = {"": ([], []), "cold_": ([], [])}
+    for prefix, (imports, first_responses) in timings.items():
+        for _ in range(runs):
+            if prefix and os.path.exists(app_bytecode):
+                os.remove(app_bytecode)
+            import_time, first_response = run_once()
+            imports.append(import_time)
+            first_responses.append(first_response)
+    results = {}
+    for prefix, (imports, first_responses) in timings.items():
+        results[f"{prefix}import"] = summarize(imports, None)
+        results[f"{prefix}first_response"] = summarize(first_responses, None)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print throughput and p95 changes against a previous results file."""
+    print("\nComparison with baseline:")
+    for mode, routes in results["results"].items():
+        for name, current in routes.items():
+            previous = baseline.get("results", {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            changes = []
+            for key in ("throughput_rps", "p95_ms"):
+                if previous.get(key) and current.get(key) is not None:
+                    changes.append(f"{key} {(current[key] - previous[key]) / previous[key] * 100:+.1f}%")
+            print(f"  [{mode}] {name:<28} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="client")
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per route")
+    parser.add_argument("--alloc-samples", type=int, default=50, help="requests traced for allocations")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads (gunicorn mode)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--mongo", choices=["fake", "none"], default="fake" if has_mongomock else "none",
+                        help="fake = in-process mongomock, none = local file storage")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh interpreters timed for startup")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo": args.mongo,
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers
+        },
+        "results": {}
+    }
+
+    if args.startup_runs:
+        results["results"]["startup"] = measure_startup(args.startup_runs)
+        startup = results["results"]["startup"]
+        print(f"Startup without MongoDB: import p50 {startup['import']['p50_ms']} ms, "
+              f"first response p50 {startup['first_response']['p50_ms']} ms "
+              f"(compiling app.py first: {startup['cold_first_response']['p50_ms']} ms)")
+
+    if args.mode in ("client", "both"):
+        print("Flask test client:")
+        app_module = load_app(args.mongo)
+        results["results"]["client"] = run_test_client(app_module, args.requests, args.warmup,
+                                                       args.alloc_samples, args.seed)
+        app_module.analytics.close()
+
+    if args.mode in ("gunicorn", "both"):
+        print(f"gunicorn ({args.workers} workers, {args.concurrency} client threads):")
+        results["results"]["gunicorn"] = run_gunicorn(args.requests, args.warmup, args.concurrency,
+                                                      args.workers, args.mongo, args.seed)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
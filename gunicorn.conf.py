@@ -0,0 +1,14 @@
+"""gunicorn settings, read automatically when gunicorn starts in the project root."""
+import glob
+import os
+
+# Per-worker metrics files behind /metrics - same default as METRICS_DIR in app.py
+metrics_dir = os.environ.get(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(os.environ.get("DATA_DIR", os.path.join(os.getcwd(), 'data')), 'metrics')
+)
+
+# Function to drop the previous run's metrics files so /metrics only sums this server's workers
+def on_starting(server):
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Keep counters, spools and metrics out of the checkout; set before app.py reads them at import
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="tr-tests-")
+os.environ.setdefault("DATA_DIR", TEST_DATA_DIR)
+os.environ.setdefault("MONGO_PROBE_CACHE_FILE", os.path.join(TEST_DATA_DIR, ".mongo_probe_cache.json"))
+os.environ.setdefault("METRICS", "0")
+os.environ.setdefault("MODEL_DIR", os.path.join(TEST_DATA_DIR, "models"))
+os.environ.pop("MONGO_URI", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_mongo(monkeypatch):
+    """Point the shared MongoDB client at a fresh in-process mongomock client."""
+    pytest.importorskip("mongomock")
+    import app
+    import benchmark
+    # Recorded by monkeypatch so the real state comes back after the test
+    for name in ("_client", "_pid", "_collections"):
+        monkeypatch.setattr(app.mongo, name, getattr(app.mongo, name))
+    monkeypatch.setattr(app, "using_mongodb", app.using_mongodb)
+    monkeypatch.setattr(app, "database_initialized", app.database_initialized)
+    return benchmark.install_fake_mongo(app)[app.MONGO_DB_NAME]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client for the configured app, with rate limiting off."""
+    import app
+    monkeypatch.setattr(app.rate_limiter, "enabled", False)
+    return app.create_app().test_client()
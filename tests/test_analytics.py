@@ -0,0 +1,107 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def buffer(fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "ROLLUPS_ENABLED", True)
+    buffer = app.AnalyticsBuffer(flush_interval=3600, batch_size=3, max_queue=5, policy="drop", block_timeout=0)
+    # Stand in a finished thread for the writer; the tests call flush() themselves
+    buffer._pid, buffer._thread = os.getpid(), threading.Thread(target=lambda: None)
+    buffer._thread.start()
+    yield buffer
+    buffer.close()
+
+
+def visit(user_id):
+    return {"user_id": user_id, "path": "/", "timestamp": datetime.now()}
+
+
+def day_visits(db):
+    return sum(bucket.get("visits", 0) for bucket in db.rollups.find({"granularity": "day"}))
+
+
+def test_flush_writes_events_in_batches_and_rolls_them_up(buffer, fake_mongo):
+    for i in range(4):
+        assert buffer.enqueue("visitors", visit(f"u{i}"))
+    buffer.flush()
+
+    assert fake_mongo.visitors.count_documents({}) == 4
+    assert day_visits(fake_mongo) == 4
+
+
+def test_full_queue_drops_events(buffer):
+    assert all(buffer.enqueue("visitors", visit("u")) for _ in range(5))
+    assert buffer.enqueue("visitors", visit("u")) is False
+    assert buffer.dropped == 1
+
+
+def test_failed_batch_is_retried_and_rolled_up_once(buffer, fake_mongo, monkeypatch):
+    collection = app.mongo.collection
+
+    class Down:
+        def insert_many(self, *args, **kwargs):
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(app.mongo, "collection", lambda name: Down() if name == "visitors" else collection(name))
+    for i in range(2):
+        buffer.enqueue("visitors", visit(f"u{i}"))
+    buffer.flush()
+    assert fake_mongo.visitors.count_documents({}) == 0
+    assert day_visits(fake_mongo) == 0
+
+    monkeypatch.setattr(app.mongo, "collection", collection)
+    buffer.flush()
+    buffer.flush()
+    assert fake_mongo.visitors.count_documents({}) == 2
+    assert day_visits(fake_mongo) == 2
+
+
+def test_partly_stored_batch_only_rolls_up_new_events(buffer, fake_mongo):
+    stored = visit("u0")
+    fake_mongo.visitors.insert_one(stored)  # gives it an _id, as an earlier attempt would
+    buffer.enqueue("visitors", stored)
+    buffer.enqueue("visitors", visit("u1"))
+    buffer.flush()
+
+    assert fake_mongo.visitors.count_documents({}) == 2
+    assert day_visits(fake_mongo) == 1
+
+
+def test_counter_increments_become_one_update(buffer, fake_mongo):
+    buffer.add_counts(total_users=1, predictions=2)
+    buffer.add_counts(predictions=3)
+    assert buffer.pending_counts() == (1, 5)
+    buffer.flush()
+
+    stats = fake_mongo.stats.find_one({"_id": "counter"})
+    assert (stats["total_users"], stats["predictions"]) == (1, 5)
+    assert buffer.pending_counts() == (0, 0)
+
+
+def test_failed_counter_increments_stay_pending(buffer, monkeypatch):
+    collection = app.mongo.collection
+
+    class Down:
+        def find_one_and_update(self, *args, **kwargs):
+            raise RuntimeError("down")
+
+    monkeypatch.setattr(app.mongo, "collection", lambda name: Down() if name == "stats" else collection(name))
+    buffer.add_counts(predictions=2)
+    buffer.flush()
+    assert buffer.pending_counts() == (0, 2)
+
+
+def test_sync_tracking_does_not_print_per_event(fake_mongo, monkeypatch, capsys):
+    monkeypatch.setattr(app, "ANALYTICS_WRITE_BEHIND", False)
+    app.track_visitor("u1", "10.0.0.1", "pytest", "/")
+    app.log_prediction(8.0, 3.6, "u1")
+
+    assert fake_mongo.visitors.count_documents({}) == 1
+    assert fake_mongo.predictions.count_documents({}) == 1
+    assert capsys.readouterr().out == ""
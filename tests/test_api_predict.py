@@ -0,0 +1,54 @@
+import app
+
+
+def test_prediction_is_cacheable_json(client):
+    response = client.get("/api/v1/predict", query_string={"cgpa": "8.00"})
+    assert response.status_code == 200
+    assert response.data == b'{"cgpa":8.0,"package":3.57}'
+    assert response.headers["ETag"]
+    assert response.headers["Cache-Control"] == f"public, max-age={app.API_CACHE_MAX_AGE}"
+
+
+def test_matching_etag_is_not_modified(client):
+    etag = client.get("/api/v1/predict", query_string={"cgpa": "8.0"}).headers["ETag"]
+    response = client.get("/api/v1/predict", query_string={"cgpa": "8.0"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    other = client.get("/api/v1/predict", query_string={"cgpa": "7.5"}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+
+def test_off_grid_cgpa_gets_its_own_etag(client):
+    on_grid = client.get("/api/v1/predict", query_string={"cgpa": "8.0"})
+    off_grid = client.get("/api/v1/predict", query_string={"cgpa": "8.005"})
+    model, _ = app.model_registry.pick(None)
+    assert off_grid.get_json() == {"cgpa": 8.005, "package": round(model.predict(8.005), 2)}
+    assert off_grid.headers["ETag"] != on_grid.headers["ETag"]
+
+
+def test_invalid_queries_are_rejected(client):
+    assert client.get("/api/v1/predict").status_code == 400
+    assert client.get("/api/v1/predict", query_string={"cgpa": "high"}).status_code == 400
+    assert client.get("/api/v1/predict", query_string={"cgpa": "10.5"}).status_code == 400
+
+
+def on_request_thread(*args, **kwargs):
+    raise AssertionError("analytics ran on the request thread")
+
+
+def test_analytics_are_deferred_off_the_request(client, monkeypatch):
+    deferred = []
+    monkeypatch.setattr(app.analytics, "defer", lambda func, *args: deferred.append((func, args)))
+    monkeypatch.setattr(app, "track_visitor", on_request_thread)
+    monkeypatch.setattr(app, "increment_user_count", on_request_thread)
+
+    assert client.get("/api/v1/predict", query_string={"cgpa": "8.0"}).status_code == 200
+    assert [func for func, _ in deferred] == [app.record_api_prediction]
+    assert deferred[0][1][:2] == (8.0, 3.57)
+
+
+def test_etag_matching():
+    assert app.etag_matches('"a", W/"b"', '"b"')
+    assert app.etag_matches("*", '"c"')
+    assert not app.etag_matches('"a"', '"b"')
@@ -0,0 +1,21 @@
+import app
+
+
+def test_unconfigured_app_refuses_requests(monkeypatch):
+    monkeypatch.setattr(app, "app_configured", False)
+    response = app.app.test_client().get("/healthz")
+    assert response.status_code == 500
+
+
+def test_create_app_configures_once():
+    flask_app = app.create_app()
+    hooks = list(flask_app.before_request_funcs[None])
+    assert app.create_app() is flask_app
+    assert flask_app.before_request_funcs[None] == hooks
+    assert flask_app.test_client().get("/healthz").data == b"ok\n"
+
+
+def test_unbuilt_stylesheet_is_served_from_the_project_root():
+    response = app.create_app().test_client().get("/static/style.css")
+    assert response.status_code == 200
+    assert b"{" in response.data
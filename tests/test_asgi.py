@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("starlette")
+pytest.importorskip("a2wsgi")
+pytest.importorskip("httpx")
+from starlette.testclient import TestClient
+
+import app
+import asgi
+
+
+@pytest.fixture
+def database_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "database_initialized", False)
+    monkeypatch.setattr(app, "ensure_database", lambda: calls.append(1))
+    monkeypatch.setattr(app.rate_limiter, "enabled", False)
+    return calls
+
+
+@pytest.mark.parametrize("method,path,kwargs", [
+    ("GET", "/api/v1/predict", {"params": {"cgpa": "8.0"}}),
+    ("POST", "/api/v1/predict/batch", {"json": [7.0, 8.0]}),
+])
+def test_first_request_initializes_the_database(database_calls, method, path, kwargs):
+    response = TestClient(asgi.create_app()).request(method, path, **kwargs)
+    assert response.status_code == 200
+    assert database_calls == [1]
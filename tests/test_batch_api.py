@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+import app
+
+
+def test_json_array_is_scored_in_one_pass(client):
+    response = client.post("/api/v1/predict/batch", json=[7.0, 8, "9.25"])
+    assert response.status_code == 200
+    assert response.get_json() == {"count": 3, "predictions": [3.01, 3.57, 4.26]}
+    assert b" " not in response.data  # compact JSON
+
+
+@pytest.mark.parametrize("body,content_type", [
+    (json.dumps({"cgpa": [7.0, 8.0]}), "application/json"),
+    (json.dumps({"records": [{"cgpa": 7.0}, {"cgpa": 8.0}]}), "application/json"),
+    ("7.0\n\n8.0\n", "application/x-ndjson"),
+])
+def test_accepted_body_shapes(client, body, content_type):
+    response = client.post("/api/v1/predict/batch", data=body, content_type=content_type)
+    assert response.status_code == 200
+    assert response.get_json()["predictions"] == [3.01, 3.57]
+
+
+def test_invalid_cgpas_are_reported_by_index(client):
+    response = client.post("/api/v1/predict/batch", json=[8.0, -1, "x", 11, None])
+    assert response.status_code == 400
+    assert response.get_json()["invalid"] == [1, 2, 3, 4]
+
+
+def test_unparseable_body_is_rejected(client):
+    response = client.post("/api/v1/predict/batch", data="{not json", content_type="application/json")
+    assert response.status_code == 400
+    assert client.post("/api/v1/predict/batch", json={"other": 1}).status_code == 400
+
+
+def test_batch_size_limit(client, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_MAX_SIZE", 2)
+    assert client.post("/api/v1/predict/batch", json=[7.0, 8.0, 9.0]).status_code == 413
+
+
+def test_element_wise_validation_matches_numpy(monkeypatch):
+    values = [8.0, "7.5", -1, "x", 10, float("nan")]
+    cgpas, invalid = app.validate_cgpa_batch(values)
+    monkeypatch.setattr(app, "numpy_available", lambda: False)
+    fallback, fallback_invalid = app.validate_cgpa_batch(values)
+
+    assert invalid == fallback_invalid == [2, 3, 5]
+    assert list(cgpas[:2]) == list(fallback[:2]) == [8.0, 7.5]
@@ -0,0 +1,45 @@
+import multiprocessing
+
+import pytest
+
+import app
+
+
+def test_counter_file_persists_increments(tmp_path):
+    path = str(tmp_path / "counters.bin")
+    counters = app.CounterFile(path, defaults={"total_users": 10, "predictions": 25})
+    assert counters.read() == (10, 25)
+    assert counters.increment(total_users=1, predictions=2) == (11, 27)
+    counters.close()
+
+    assert app.CounterFile(path).read() == (11, 27)
+
+
+def test_counter_file_rebuilds_damaged_file(tmp_path):
+    path = tmp_path / "counters.bin"
+    path.write_bytes(b"garbage")
+    counters = app.CounterFile(str(path), defaults={"total_users": 3, "predictions": 4})
+    assert counters.read() == (3, 4)
+
+
+def _increment_many(path, times):
+    counters = app.CounterFile(path)
+    for _ in range(times):
+        counters.increment(predictions=1)
+    counters.close()
+
+
+@pytest.mark.skipif(not app.has_fcntl or "fork" not in multiprocessing.get_all_start_methods(),
+                    reason="needs fcntl locks and fork")
+def test_counter_file_loses_no_increments_across_processes(tmp_path):
+    path = str(tmp_path / "counters.bin")
+    app.CounterFile(path).read()  # create it before the workers race
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_increment_many, args=(path, 200)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert app.CounterFile(path).read() == (0, 800)
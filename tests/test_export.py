@@ -0,0 +1,83 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import app
+
+TOKEN = "secret-token"
+
+
+@pytest.fixture
+def exports(client, monkeypatch):
+    monkeypatch.setattr(app, "EXPORT_TOKEN", TOKEN)
+    return client
+
+
+@pytest.fixture
+def predictions(fake_mongo):
+    fake_mongo.predictions.insert_many([
+        {"user_id": f"u{day}", "cgpa": 8.0, "prediction": 3.57, "timestamp": datetime(2024, 5, day)}
+        for day in (1, 2, 3)
+    ])
+    return fake_mongo
+
+
+def get(client, path, **query):
+    return client.get(path, query_string=query, headers={"Authorization": f"Bearer {TOKEN}"})
+
+
+def test_exports_need_the_token(exports):
+    assert exports.get("/export/predictions").status_code == 403
+    assert exports.get("/export/predictions", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+
+def test_exports_are_disabled_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(app, "EXPORT_TOKEN", None)
+    assert client.get("/export/predictions", query_string={"token": ""}).status_code == 403
+
+
+def test_bad_requests_are_rejected(exports):
+    assert get(exports, "/export/stats").status_code == 404
+    assert get(exports, "/export/predictions", format="xml").status_code == 400
+    assert get(exports, "/export/predictions", since="yesterday").status_code == 400
+
+
+def test_ndjson_export_with_time_range(exports, predictions):
+    response = get(exports, "/export/predictions", since="2024-05-02", until="2024-05-03")
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="predictions.ndjson"'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(row["user_id"], row["timestamp"]) for row in rows] == [("u2", "2024-05-02T00:00:00")]
+    assert isinstance(rows[0]["_id"], str)
+
+
+def test_gzipped_csv_export(exports, predictions):
+    response = get(exports, "/export/predictions", format="csv", gzip="1")
+    assert response.mimetype == "application/gzip"
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode("utf-8"))))
+    assert list(rows[0]) == app.EXPORT_FIELDS["predictions"]
+    assert [row["user_id"] for row in rows] == ["u1", "u2", "u3"]
+
+
+def test_export_is_streamed_in_chunks(predictions, monkeypatch):
+    monkeypatch.setattr(app, "EXPORT_CHUNK_BYTES", 64)
+    chunks = list(app.export_chunks("predictions"))
+    assert len(chunks) == 3
+    assert b"".join(chunks).count(b"\n") == 3
+
+
+def test_feedback_export_from_local_storage(exports, tmp_path, monkeypatch):
+    store = app.NDJSONSegmentStore(str(tmp_path / "feedback"), "feedback")
+    store.append_many([{"_id": "a", "name": "A", "timestamp": "2024-05-01T09:00:00"},
+                       {"_id": "b", "name": "B", "timestamp": "2024-05-02T09:00:00"}])
+    monkeypatch.setattr(app, "feedback_store", store)
+    monkeypatch.setattr(app, "using_mongodb", False)
+    monkeypatch.setattr(app, "database_initialized", True)
+
+    rows = get(exports, "/export/feedback", since="2024-05-02").get_data(as_text=True).splitlines()
+    assert [json.loads(row)["_id"] for row in rows] == ["b"]
+    assert get(exports, "/export/predictions").data == b""
@@ -0,0 +1,98 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "feedback_store", app.NDJSONSegmentStore(str(tmp_path / "feedback"), "feedback"))
+    monkeypatch.setattr(app, "using_mongodb", False)
+    # A long interval keeps the delivery thread idle; the tests call deliver() themselves
+    ingest = app.FeedbackIngest(str(tmp_path / "spool"), batch_size=100, interval=3600, retry_base=1, retry_max=1,
+                                dedup_ttl=60, content_dedup_ttl=60, dedup_max_keys=100)
+    yield ingest
+    ingest.close()
+
+
+def submit(ingest, user_id="u1", message="hello", key=None):
+    return ingest.submit(user_id, "Name", "name@example.com", message, 5, key)
+
+
+def stored(store):
+    return [record["_id"] for record in store.iter_records()]
+
+
+def test_repeated_idempotency_key_is_one_entry(ingest):
+    entry_id, duplicate = submit(ingest, key="k1")
+    assert duplicate is False
+    assert submit(ingest, message="edited", key="k1") == (entry_id, True)
+
+    ingest.deliver()
+    assert stored(app.feedback_store) == [entry_id]
+
+
+def test_keyless_feedback_is_only_folded_within_the_content_ttl(ingest):
+    first, _ = submit(ingest)
+    assert submit(ingest) == (first, True)  # a double click
+    other_user, duplicate = submit(ingest, user_id="u2")
+    assert duplicate is False and other_user != first
+
+    ingest._seen.clear()  # the short content TTL has passed
+    later, duplicate = submit(ingest)
+    assert duplicate is False and later != first
+
+    ingest.deliver()
+    assert stored(app.feedback_store) == [first, other_user, later]
+
+
+def test_delivery_removes_spool_segments(ingest):
+    for i in range(5):
+        submit(ingest, key=f"k{i}")
+    ingest.deliver()
+
+    assert len(stored(app.feedback_store)) == 5
+    assert all(not list(ingest.spool.read_segment(index)) for index in ingest.spool.segment_indexes())
+
+
+def test_replayed_segment_is_not_stored_twice(ingest, monkeypatch):
+    ids = [submit(ingest, key=f"k{i}")[0] for i in range(3)]
+    # Crash after the records were stored but before the segment was removed
+    monkeypatch.setattr(ingest.spool, "remove_segment", lambda index: None)
+    ingest.deliver()
+
+    restarted = app.FeedbackIngest(ingest.spool.directory, batch_size=100, interval=3600, retry_base=1, retry_max=1,
+                                   dedup_ttl=60, content_dedup_ttl=60, dedup_max_keys=100)
+    restarted.deliver()
+    assert stored(app.feedback_store) == ids
+    assert restarted.spool.seal() == []
+
+
+def test_mongo_delivery_ignores_already_delivered_ids(ingest, fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "using_mongodb", True)
+    entry_id, _ = submit(ingest, key="k1")
+    fake_mongo.feedback.insert_one({"_id": entry_id, "message": "delivered by another worker"})
+    other_id, _ = submit(ingest, key="k2")
+
+    ingest.deliver()
+    assert fake_mongo.feedback.count_documents({}) == 2
+    assert fake_mongo.feedback.find_one({"_id": other_id})["message"] == "hello"
+    assert ingest.spool.seal() == []
+
+
+def test_failed_delivery_keeps_the_spool(ingest, fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "using_mongodb", True)
+    submit(ingest, key="k1")
+
+    class Down:
+        def insert_many(self, *args, **kwargs):
+            raise RuntimeError("down")
+
+    collection = app.mongo.collection
+    monkeypatch.setattr(app.mongo, "collection", lambda name: Down() if name == "feedback" else collection(name))
+    with pytest.raises(RuntimeError):
+        ingest.deliver()
+    assert len(ingest.spool.seal()) == 1
+
+    monkeypatch.setattr(app.mongo, "collection", collection)
+    ingest.deliver()
+    assert fake_mongo.feedback.count_documents({}) == 1
@@ -0,0 +1,41 @@
+import math
+
+import pytest
+
+import app
+
+
+def sketch_of(values, precision=14):
+    sketch = app.HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+@pytest.mark.parametrize("n", [100, 5000, 50000])
+def test_estimate_within_error_bound(n):
+    sketch = sketch_of(f"user-{i}" for i in range(n))
+    standard_error = 1.04 / math.sqrt(sketch.size)
+    assert abs(sketch.count() - n) <= max(2, 4 * standard_error * n)
+
+
+def test_merge_equals_sketch_of_union():
+    a = sketch_of(f"user-{i}" for i in range(0, 30000))
+    b = sketch_of(f"user-{i}" for i in range(20000, 50000))
+    a.update(b)
+    assert a.registers == sketch_of(f"user-{i}" for i in range(50000)).registers
+
+
+def test_duplicates_do_not_change_the_estimate():
+    once = sketch_of(f"user-{i}" for i in range(1000))
+    twice = sketch_of([f"user-{i}" for i in range(1000)] * 2)
+    assert once.registers == twice.registers
+
+
+def test_bytes_round_trip_and_validation():
+    sketch = sketch_of(f"user-{i}" for i in range(1000))
+    assert app.HyperLogLog(14, sketch.to_bytes()).count() == sketch.count()
+    with pytest.raises(ValueError):
+        app.HyperLogLog(14, b"\0" * 10)
+    with pytest.raises(ValueError):
+        sketch.update(app.HyperLogLog(12))
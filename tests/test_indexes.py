@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import app
+
+
+def ttl_of(db, collection, name="timestamp_1"):
+    return db[collection].index_information()[name].get("expireAfterSeconds")
+
+
+def test_indexes_are_created_once(fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "VISITOR_RETENTION_DAYS", 30)
+    first = dict(app.ensure_indexes())
+    assert first["visitors.timestamp"] == f"created (ttl {30 * 24 * 60 * 60}s)"
+    assert first["predictions.user_id"] == "created"
+    assert ttl_of(fake_mongo, "visitors") == 30 * 24 * 60 * 60
+    assert ttl_of(fake_mongo, "predictions") is None
+
+    second = app.ensure_indexes()
+    assert all(status.startswith("ok") for status in second.values())
+
+
+def test_changed_ttl_is_updated_in_place(fake_mongo, monkeypatch):
+    app.ensure_index("visitors", [("timestamp", 1)], 86400)
+    commands = []
+
+    class Database:
+        def command(self, *args, **kwargs):
+            commands.append((args, kwargs))
+
+    monkeypatch.setattr(app.mongo, "database", Database)
+    assert app.ensure_index("visitors", [("timestamp", 1)], 3600) == "ttl updated"
+    assert commands == [(("collMod", "visitors"), {"index": {"name": "timestamp_1", "expireAfterSeconds": 3600}})]
+
+
+def test_adding_or_removing_a_ttl_rebuilds_the_index(fake_mongo):
+    app.ensure_index("predictions", [("timestamp", 1)], None)
+    assert app.ensure_index("predictions", [("timestamp", 1)], 3600) == "rebuilt"
+    assert ttl_of(fake_mongo, "predictions") == 3600
+    assert app.ensure_index("predictions", [("timestamp", 1)], None) == "rebuilt"
+    assert ttl_of(fake_mongo, "predictions") is None
+
+
+def test_retention_days_become_ttl_seconds(monkeypatch):
+    assert app.retention_seconds(0) is None
+    assert app.retention_seconds(1.5) == 129600
+    monkeypatch.setattr(app, "EVENT_BUCKETS", True)
+    monkeypatch.setattr(app, "EVENT_BUCKET_RETENTION_DAYS", 7)
+    specs = {(collection, keys[0][0]): ttl for collection, keys, ttl in app.index_specs()}
+    assert specs[("visitors_hourly", "start")] == 7 * 24 * 60 * 60
+
+
+def test_events_are_grouped_into_hourly_buckets(fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "EVENT_BUCKETS", True)
+    monkeypatch.setattr(app, "EVENT_BUCKET_MAX_EVENTS", 2)
+    events = [{"_id": i, "user_id": f"u{i}", "timestamp": datetime(2024, 5, 1, 10, i)} for i in range(3)]
+    events.append({"_id": 3, "user_id": "u3", "timestamp": datetime(2024, 5, 1, 11, 5)})
+    app.bucket_events("visitors", events)
+
+    buckets = list(fake_mongo.visitors_hourly.find({}, {"_id": 0}).sort("start", 1))
+    assert [(bucket["start"].hour, bucket["count"]) for bucket in buckets] == [(10, 3), (11, 1)]
+    assert all("_id" not in event for bucket in buckets for event in bucket["events"])
+
+    # A full bucket takes no more events; the next batch opens another one for that hour
+    app.bucket_events("visitors", [{"user_id": "u4", "timestamp": datetime(2024, 5, 1, 10, 30)}])
+    assert fake_mongo.visitors_hourly.count_documents({"start": datetime(2024, 5, 1, 10)}) == 2
@@ -0,0 +1,99 @@
+import pytest
+
+import app
+
+ARTIFACT = {
+    "version": "multi",
+    "features": ["cgpa", "backlogs", "branch=CSE"],
+    "weights": [0.5, -0.3, 0.8],
+    "intercept": -0.5,
+    "defaults": {"backlogs": 0, "branch": "ECE"},
+    "covariance": [[0.04, -0.004, 0.0, 0.0],
+                   [-0.004, 0.0006, 0.0, 0.0],
+                   [0.0, 0.0, 0.002, 0.0],
+                   [0.0, 0.0, 0.0, 0.01]],
+    "residual_variance": 0.09
+}
+
+
+@pytest.fixture
+def model():
+    return app.load_model(ARTIFACT)
+
+
+def test_categorical_levels_and_defaults(model):
+    assert model.inputs == ["cgpa", "backlogs", "branch"]
+    assert model.encode({"cgpa": 8.0}) == [8.0, 0.0, 0.0]
+    assert model.encode({"cgpa": 8.0, "backlogs": 2, "branch": "CSE"}) == [8.0, 2.0, 1.0]
+    # The CGPA-only view (and prediction table) uses the defaults
+    assert (model.m, model.b) == (0.5, -0.5)
+    assert model.predict_records([{"cgpa": 8.0}, {"cgpa": 8.0, "backlogs": 1, "branch": "CSE"}]) == [3.5, 4.0]
+
+
+def test_unusable_records_are_reported_by_index(model):
+    records = [{"cgpa": 8.0}, {"cgpa": 11}, {"cgpa": "x"}, {"backlogs": 1}, {"cgpa": 7, "backlogs": "inf"}]
+    rows, invalid = model.design_matrix(records)
+    assert invalid == [1, 2, 3, 4]
+    assert len(rows) == len(records)
+
+
+@pytest.mark.parametrize("level", [None, 0.9, 0.95])
+def test_numpy_and_pure_python_paths_agree(model, monkeypatch, level):
+    pytest.importorskip("numpy")
+    rows, _ = model.design_matrix([{"cgpa": 6.5}, {"cgpa": 9.1, "backlogs": 3, "branch": "CSE"}])
+    vectorized = model.predict_matrix(rows, level)
+    monkeypatch.setattr(app, "numpy_available", lambda: False)
+    assert model.predict_matrix(rows, level) == vectorized
+    if level is None:
+        assert vectorized[1] is None
+    else:
+        for prediction, (low, high) in zip(*vectorized):
+            assert low < prediction < high
+
+
+def test_interval_width_follows_the_covariance(model):
+    rows, _ = model.design_matrix([{"cgpa": 8.0}])
+    (prediction,), ((low, high),) = model.predict_matrix(rows, 0.95)
+    x = [1.0, 8.0, 0.0, 0.0]
+    variance = ARTIFACT["residual_variance"] + sum(
+        x[i] * ARTIFACT["covariance"][i][j] * x[j] for i in range(4) for j in range(4))
+    assert high - low == pytest.approx(2 * 1.959964 * variance ** 0.5, abs=0.02)
+
+
+def test_intervals_need_a_covariance():
+    model = app.load_model({"version": "plain", "coefficients": {"m": 0.5, "b": -0.5}})
+    assert not model.has_intervals()
+    assert model.predict_matrix([[8.0]], 0.95) == ([3.5], None)
+    assert app.load_model(ARTIFACT).has_intervals()
+
+
+@pytest.mark.parametrize("change,message", [
+    ({"features": ["backlogs"], "weights": [0.1]}, "cgpa"),
+    ({"features": ["cgpa", "cgpa"], "weights": [0.1, 0.2]}, "unique"),
+    ({"weights": [0.5]}, "one number per feature"),
+    ({"weights": [0.5, "x", 0.8]}, "weight of backlogs"),
+    ({"defaults": {"branch": "ECE"}}, "defaults"),
+    ({"covariance": [[1.0, 0.0], [0.0, 1.0]]}, "4x4"),
+    ({"residual_variance": -1}, "negative"),
+    ({"type": "forest"}, "unsupported"),
+])
+def test_invalid_artifacts_are_rejected(change, message):
+    with pytest.raises(ValueError, match=message):
+        app.load_model(dict(ARTIFACT, **change))
+
+
+def test_batch_api_intervals(client, model, monkeypatch):
+    monkeypatch.setattr(app.model_registry, "pick", lambda user_id=None: (model, None))
+    response = client.post("/api/v1/predict/batch?interval=0.9",
+                           json={"records": [{"cgpa": 8.0}, {"cgpa": 8.0, "branch": "CSE"}]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["predictions"] == [3.5, 4.3]
+    assert [len(interval) for interval in body["intervals"]] == [2, 2]
+    assert client.post("/api/v1/predict/batch?interval=2", json=[8.0]).status_code == 400
+
+    plain = app.load_model({"version": "plain", "coefficients": {"m": 0.5, "b": -0.5}})
+    monkeypatch.setattr(app.model_registry, "pick", lambda user_id=None: (plain, None))
+    response = client.post("/api/v1/predict/batch?interval=1", json=[8.0])
+    assert response.status_code == 400
+    assert "covariance" in response.get_json()["error"]
@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+import app
+
+V2 = {"version": "v2", "type": "linear", "coefficients": {"m": 0.6, "b": -1.0}}
+V3 = {"version": "v3", "type": "linear", "coefficients": {"m": 0.5, "b": -0.5}}
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "MODEL_SOURCE", "file")
+    monkeypatch.setattr(app, "MODEL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_registry(directory, mode="shadow", fraction=0.5, source="file"):
+    registry = app.ModelRegistry(source, str(directory), interval=3600, candidate_mode=mode,
+                                 candidate_fraction=fraction)
+    registry._pid, registry._thread = os.getpid(), object()  # the tests reload by hand
+    return registry
+
+
+def test_builtin_model_until_one_is_published(model_dir):
+    registry = make_registry(model_dir)
+    registry.reload()
+    assert registry.active.version == "builtin"
+    assert registry.pick("u1") == (registry.active, None)
+
+
+def test_published_model_is_hot_reloaded(model_dir):
+    registry = make_registry(model_dir)
+    app.publish_model(V2)
+    registry.reload()
+    assert registry.active.version == "v2"
+    assert registry.active.table.packages[registry.active.table.key(8.0)] == round(0.6 * 8.0 - 1.0, 2)
+
+    os.remove(model_dir / "active.json")
+    registry.reload()
+    assert registry.active.version == "builtin"
+
+
+def test_invalid_artifact_keeps_the_current_model(model_dir, capsys):
+    registry = make_registry(model_dir)
+    app.publish_model(V2)
+    registry.reload()
+    (model_dir / "active.json").write_text(json.dumps({"version": "broken", "coefficients": {"m": "x"}}))
+    registry.reload()
+    registry.reload()
+
+    assert registry.active.version == "v2"
+    assert "active:" in registry.last_error
+    assert capsys.readouterr().out.count("keeping the current one") == 1
+    with pytest.raises(ValueError):
+        app.publish_model({"coefficients": {"m": 1}})
+
+
+def test_shadow_candidate_is_scored_but_not_served(model_dir):
+    registry = make_registry(model_dir)
+    app.publish_model(V2)
+    app.publish_model(V3, role="candidate")
+    registry.reload()
+
+    served, shadow = registry.pick("u1")
+    assert (served.version, shadow.version) == ("v2", "v3")
+    assert not registry.varies_by_user()
+    registry.compare(shadow, [8.0, 9.0], served.predict_batch([8.0, 9.0]), served.version)
+    comparison, = registry.status()["comparisons"]
+    assert comparison["served"] == "v2" and comparison["scored"] == "v3" and comparison["count"] == 2
+    assert comparison["max_abs_diff"] == pytest.approx(0.4)
+
+    app.remove_candidate_model()
+    registry.reload()
+    assert registry.candidate is None
+
+
+def test_ab_candidate_serves_a_stable_share_of_users(model_dir):
+    registry = make_registry(model_dir, mode="ab", fraction=0.3)
+    app.publish_model(V2)
+    app.publish_model(V3, role="candidate")
+    registry.reload()
+
+    users = [f"user-{i}" for i in range(2000)]
+    served = [registry.pick(user)[0].version for user in users]
+    assert 0.25 < served.count("v3") / len(users) < 0.35
+    assert served == [registry.pick(user)[0].version for user in users]
+    assert registry.pick(None)[0].version == "v2"  # no cookie, no experiment
+    assert registry.varies_by_user()
+
+
+def test_ab_api_answers_are_private(client, model_dir, monkeypatch):
+    registry = make_registry(model_dir, mode="ab", fraction=1.0)
+    app.publish_model(V2)
+    app.publish_model(V3, role="candidate")
+    registry.reload()
+    monkeypatch.setattr(app, "model_registry", registry)
+    monkeypatch.setattr(app.analytics, "defer", lambda *args: True)
+
+    client.set_cookie("localhost", "user_id", "u1")
+    response = client.get("/api/v1/predict", query_string={"cgpa": "8.0"})
+    assert response.get_json()["package"] == 3.5
+    assert response.headers["Cache-Control"].startswith("private")
+
+
+def test_mongo_registry_retires_the_previous_version(fake_mongo, monkeypatch):
+    monkeypatch.setattr(app, "MODEL_SOURCE", "mongo")
+    registry = make_registry(None, source="mongo")
+    app.publish_model(V2)
+    app.publish_model(V3)
+    registry.reload()
+
+    assert registry.active.version == "v3"
+    roles = {document["_id"]: document["role"] for document in fake_mongo.models.find()}
+    assert roles == {"v2": "retired", "v3": "active"}
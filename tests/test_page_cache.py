@@ -0,0 +1,31 @@
+import gzip
+import random
+import zlib
+
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("total_users,predictions", [(0, 0), (7, 12345), (10 ** 12, 3)])
+def test_spliced_gzip_decompresses_to_plain_body(total_users, predictions):
+    rng = random.Random(1)
+    filler = "".join(rng.choice("abcdef <>/\n") for _ in range(20000))
+    shell = app.PageShell((f"<html>{filler}<b>", "</b> users, <b>", f"</b> predictions{filler}</html>"), 9)
+
+    body = shell.gzip_body(total_users, predictions)
+    assert gzip.decompress(body) == shell.body(total_users, predictions)
+    # The trailer's CRC and length are checked by a strict single-member decoder too
+    assert zlib.decompress(body, 31) == shell.body(total_users, predictions)
+
+
+def test_page_cache_gzip_matches_identity_response():
+    app.create_app()
+    with app.app.test_request_context('/'):
+        status, plain, headers = app.page_cache.build(12, 34)
+        gzip_status, compressed, gzip_headers = app.page_cache.build(12, 34, accept_encoding='gzip')
+
+    assert status == gzip_status == 200
+    assert gzip_headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed) == plain
+    assert b'12' in plain and b'34' in plain
@@ -0,0 +1,51 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def model():
+    return app.load_model(app.BUILTIN_MODEL)
+
+
+def test_table_matches_the_model_on_the_grid(model):
+    table = model.table
+    assert len(table.packages) == app.CGPA_STEPS_PER_POINT * app.CGPA_MAX + 1
+    for cgpa in (0.0, 5.55, 8.0, 9.99, 10.0):
+        key = table.key(cgpa)
+        assert table.cgpas[key] == cgpa
+        assert table.packages[key] == round(model.predict(cgpa), 2)
+        assert table.messages[key] == app.format_prediction_message(cgpa, table.packages[key])
+
+
+@pytest.mark.parametrize("cgpa", [8.005, -0.01, 10.01])
+def test_off_grid_cgpas_have_no_key(model, cgpa):
+    assert model.table.key(cgpa) is None
+
+
+def test_table_version_follows_the_coefficients(model):
+    other = app.load_model({"version": "v2", "coefficients": {"m": 0.6, "b": -1.0}})
+    renamed = app.load_model(dict(app.BUILTIN_MODEL, version="renamed"))
+    assert other.table.version != model.table.version
+    assert renamed.table.version == model.table.version
+
+
+def test_predict_page_reuses_the_cached_shell(client, monkeypatch):
+    monkeypatch.setattr(app, "using_mongodb", False)
+    app.page_cache.clear()
+    first = client.post("/predict", data={"cgpa": "8.00"})
+    misses = app.page_cache.shell.cache_info().misses
+    second = client.post("/predict", data={"cgpa": "8.0"})
+
+    assert first.status_code == second.status_code == 200
+    assert "₹3.57 LPA".encode("utf-8") in second.data
+    assert app.page_cache.shell.cache_info().misses == misses
+
+
+def test_off_grid_and_invalid_cgpas_still_render(client):
+    model, _ = app.model_registry.pick(None)
+    off_grid = client.post("/predict", data={"cgpa": "8.005"})
+    assert off_grid.status_code == 200
+    expected = app.format_prediction_message(8.005, round(model.predict(8.005), 2))
+    assert expected in off_grid.get_data(as_text=True)
+    assert "CGPA must be between 0 and 10" in client.post("/predict", data={"cgpa": "11"}).get_data(as_text=True)
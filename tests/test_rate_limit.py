@@ -0,0 +1,98 @@
+import pytest
+
+import app
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(app.time, "monotonic", clock)
+    monkeypatch.setattr(app.time, "time", clock)
+    return clock
+
+
+def test_token_bucket_burst_then_refill(clock):
+    buckets = app.TokenBuckets()
+    assert [buckets.acquire("k", 2.0, 3) for _ in range(3)] == [0, 0, 0]
+    assert buckets.acquire("k", 2.0, 3) == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert buckets.acquire("k", 2.0, 3) == 0
+    assert buckets.acquire("k", 2.0, 3) > 0
+
+
+def test_token_buckets_evict_refilled_and_excess_keys(clock):
+    buckets = app.TokenBuckets(max_keys=3)
+    for key in "abc":
+        buckets.acquire(key, 1.0, 2)
+    buckets.acquire("d", 1.0, 2)
+    assert list(buckets._buckets) == ["b", "c", "d"]
+
+    clock.now += 10  # every bucket has refilled
+    buckets.acquire("e", 1.0, 2)
+    assert list(buckets._buckets) == ["e"]
+
+
+def test_file_buckets_are_shared_between_workers(tmp_path, clock):
+    path = str(tmp_path / "ratelimit.bin")
+    worker_a = app.FileTokenBuckets(path, slots=64)
+    worker_b = app.FileTokenBuckets(path, slots=64)
+    assert worker_a.acquire("ip:1", 1.0, 2) == 0
+    assert worker_b.acquire("ip:1", 1.0, 2) == 0
+    assert worker_a.acquire("ip:1", 1.0, 2) == pytest.approx(1.0)
+
+    clock.now += 1
+    assert worker_b.acquire("ip:1", 1.0, 2) == 0
+
+
+def test_visitor_bucket_is_tighter_than_shared_ip(clock):
+    limiter = app.RateLimiter("memory", {"user": (1.0, 2), "ip": (1.0, 100)})
+    # Many visitors behind one NAT address are not limited by each other
+    assert all(limiter.check("10.0.0.1", f"user-{i}") == 0 for i in range(50))
+    assert limiter.check("10.0.0.1", "user-0") == 0
+    assert limiter.check("10.0.0.1", "user-0") > 0
+
+
+def test_client_ip_uses_trusted_proxy_hop(monkeypatch):
+    monkeypatch.setattr(app, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    assert app.client_ip("10.1.1.1", "6.6.6.6, 203.0.113.9") == "203.0.113.9"
+    monkeypatch.setattr(app, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    assert app.client_ip("10.1.1.1", "203.0.113.9") == "10.1.1.1"
+
+
+def test_rejection_is_429_before_database_work(monkeypatch, clock):
+    flask_app = app.create_app()
+    monkeypatch.setattr(app, "rate_limiter", app.RateLimiter("memory", {"user": (0.01, 2), "ip": (0.01, 100)}))
+    database_calls = []
+    monkeypatch.setattr(app, "database_initialized", False)
+    monkeypatch.setattr(app, "ensure_database", lambda: database_calls.append(1))
+
+    client = flask_app.test_client()
+    client.set_cookie("localhost", "user_id", "visitor")
+    statuses = [client.post("/submit-feedback", data={"name": "a"}).status_code for _ in range(2)]
+    calls_before = len(database_calls)
+    response = client.post("/submit-feedback", data={"name": "a"})
+
+    assert statuses == [200, 200]
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["success"] is False
+    assert len(database_calls) == calls_before
+
+
+def test_cookieless_client_gets_the_tight_bucket(clock):
+    limiter = app.RateLimiter("memory", {"user": (1.0, 2), "ip": (1.0, 100)})
+    assert limiter.check("10.0.0.1", None, "curl/8.0") == 0
+    assert limiter.check("10.0.0.1", "", "curl/8.0") == 0
+    assert limiter.check("10.0.0.1", None, "curl/8.0") > 0
+    # Another client behind the same address keeps its own budget
+    assert limiter.check("10.0.0.1", None, "Mozilla/5.0") == 0
+    assert limiter.check("10.0.0.1", "user-1", "curl/8.0") == 0
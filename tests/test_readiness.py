@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(app, "database_initialized", True)
+    monitor = app.ReadinessMonitor(interval=10, max_age=30)
+    # Mark the background thread as running; the tests call check() themselves
+    monitor._pid, monitor._thread = os.getpid(), object()
+    return monitor
+
+
+class FailingClient:
+    class admin:
+        @staticmethod
+        def command(name):
+            raise RuntimeError("no primary")
+
+
+def test_starting_is_not_ready(monitor):
+    assert monitor.status() == (False, {"status": "starting"})
+
+
+def test_local_storage_without_mongo_uri_is_ready(monitor, monkeypatch):
+    monkeypatch.setattr(app, "MONGO_URI", None)
+    monitor.check()
+    ready, details = monitor.status()
+    assert ready and details["status"] == "ready"
+
+
+def test_fallback_after_failed_connection_is_ready_but_degraded(monitor, monkeypatch):
+    monkeypatch.setattr(app, "MONGO_URI", "mongodb://unreachable")
+    monkeypatch.setattr(app, "using_mongodb", False)
+    monitor.check()
+    ready, details = monitor.status()
+    assert ready
+    assert details["status"] == "degraded"
+    assert "fallback" in details["mongodb"]
+
+
+def test_failed_ping_on_a_live_connection_is_not_ready(monitor, monkeypatch):
+    monkeypatch.setattr(app, "MONGO_URI", "mongodb://db")
+    monkeypatch.setattr(app, "using_mongodb", True)
+    monkeypatch.setattr(app.mongo, "client", lambda: FailingClient)
+    monitor.check()
+    ready, details = monitor.status()
+    assert not ready
+    assert "no primary" in details["mongodb"]
+
+
+def test_stale_result_is_not_ready(monitor, monkeypatch):
+    monkeypatch.setattr(app, "MONGO_URI", None)
+    monitor.check()
+    ok, degraded, detail, checked_at, ping_ms = monitor.result
+    monitor.result = (ok, degraded, detail, checked_at - 31, ping_ms)
+    assert monitor.status()[0] is False
+
+
+def test_readyz_status_codes(monitor, monkeypatch):
+    monkeypatch.setattr(app, "readiness", monitor)
+    client = app.create_app().test_client()
+    assert client.get("/readyz").status_code == 503
+
+    monkeypatch.setattr(app, "MONGO_URI", "mongodb://unreachable")
+    monkeypatch.setattr(app, "using_mongodb", False)
+    monitor.check()
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "degraded"
+    assert response.headers["Cache-Control"] == "no-store"
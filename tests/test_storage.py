@@ -0,0 +1,89 @@
+import json
+
+import app
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault("fsync_every", 1)
+    return app.NDJSONSegmentStore(str(tmp_path / "store"), "records", **kwargs)
+
+
+def test_ndjson_round_trip_across_segments(tmp_path):
+    store = make_store(tmp_path, segment_bytes=256)
+    records = [{"n": i, "message": "x" * 20} for i in range(50)]
+    for record in records[:10]:
+        store.append(record)
+    store.append_many(records[10:])
+    store.close()
+
+    assert len(store.segment_indexes()) > 1
+    assert list(store.iter_records()) == records
+
+
+def test_torn_and_corrupt_lines_are_skipped(tmp_path):
+    store = make_store(tmp_path)
+    store.append({"n": 1})
+    path = store._segment_path(store.segment_indexes()[-1])
+    with open(path, "a") as f:
+        f.write("not json\n")
+    store.append({"n": 2})
+    with open(path, "a") as f:
+        f.write('{"n": 3')  # a crash mid-write leaves no newline
+
+    assert list(store.iter_records()) == [{"n": 1}, {"n": 2}]
+
+
+def test_compaction_merges_sealed_segments_once(tmp_path):
+    legacy = tmp_path / "legacy.json"
+    legacy.write_text(json.dumps([{"n": "legacy"}]))
+    store = make_store(tmp_path, segment_bytes=64, legacy_file=str(legacy))
+    for i in range(20):
+        store.append({"n": i})
+    expected = [{"n": "legacy"}] + [{"n": i} for i in range(20)]
+    assert list(store.iter_records()) == expected
+
+    assert store.compact() == len(expected)
+    assert legacy.exists()  # tracked file is marked migrated, never renamed
+    assert list(store.iter_records()) == expected
+
+    store.append({"n": 20})
+    assert store.compact() == len(expected) + 1
+    assert list(store.iter_records()) == expected + [{"n": 20}]
+
+
+def test_changed_legacy_file_is_read_again(tmp_path):
+    legacy = tmp_path / "legacy.json"
+    legacy.write_text(json.dumps([{"n": "old"}]))
+    store = make_store(tmp_path, legacy_file=str(legacy))
+    store.append({"n": 1})
+    store.compact()
+
+    legacy.write_text(json.dumps([{"n": "new"}]))
+    assert list(store.iter_records()) == [{"n": "new"}, {"n": "old"}, {"n": 1}]
+
+
+def test_seal_and_remove_segment(tmp_path):
+    store = make_store(tmp_path)
+    store.append({"n": 1})
+    sealed = store.seal()
+    assert len(sealed) == 1
+    assert list(store.read_segment(sealed[0])) == [{"n": 1}]
+    assert store.seal() == sealed  # an empty active segment is not sealed again
+
+    store.remove_segment(sealed[0])
+    assert list(store.iter_records()) == []
+
+
+def test_compaction_without_new_records_adds_no_segments(tmp_path):
+    store = make_store(tmp_path)
+    assert store.compact() == 0
+    assert store.compact() == 0
+    assert len(store.segment_indexes()) == 1
+
+    store.append({"n": 1})
+    assert store.compact() == 1
+    segments = store.segment_indexes()
+    assert store.compact() == 1
+    assert store.compact() == 1
+    assert store.segment_indexes() == segments
+    assert list(store.iter_records()) == [{"n": 1}]
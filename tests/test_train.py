@@ -0,0 +1,110 @@
+import json
+import math
+import random
+
+import pytest
+
+import app
+import train
+
+XS = [6.0, 6.5, 7.1, 7.4, 8.0, 8.3, 8.8, 9.2, 9.5, 9.9, 5.5, 7.7]
+YS = [2.1, 2.6, 2.9, 3.3, 3.6, 3.7, 4.2, 4.3, 4.7, 5.1, 1.8, 3.4]
+
+
+def close_fit(xs, ys):
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    m = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum((x - mean_x) ** 2 for x in xs)
+    return m, mean_y - m * mean_x
+
+
+def assert_same_stats(left, right):
+    assert left.n == right.n
+    for name in ("mean_x", "mean_y", "m2_x", "m2_y", "c_xy"):
+        assert getattr(left, name) == pytest.approx(getattr(right, name), rel=1e-12, abs=1e-12)
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_merged_moments_equal_a_single_pass(monkeypatch, numpy):
+    monkeypatch.setattr(train, "has_numpy", numpy and train.has_numpy)
+    whole = train.RegressionStats.from_values(XS, YS)
+    parts = [train.RegressionStats.from_values(XS[i:i + 5], YS[i:i + 5]) for i in range(0, len(XS), 5)]
+    assert_same_stats(train.merge_all(parts), whole)
+    assert_same_stats(train.merge_all(parts[::-1]), whole)
+    assert_same_stats(whole.merge(train.RegressionStats()), whole)
+
+
+def test_fit_matches_the_closed_form():
+    stats = train.RegressionStats.from_values(XS, YS)
+    m, b = stats.fit()
+    assert (m, b) == pytest.approx(close_fit(XS, YS))
+    assert stats.sse(m, b) == pytest.approx(sum((y - (m * x + b)) ** 2 for x, y in zip(XS, YS)))
+    with pytest.raises(ValueError):
+        train.RegressionStats.from_values([8.0, 8.0], [3.0, 4.0]).fit()
+
+
+def test_k_fold_holds_each_fold_out():
+    folds = train.fold_stats(XS, YS, 3)
+    assert [fold.n for fold in folds] == [4, 4, 4]
+    result = train.evaluate(folds)
+    assert (result["m"], result["b"]) == pytest.approx(close_fit(XS, YS))
+    assert result["rows"] == len(XS)
+
+    held_out_sse = 0.0
+    for fold in range(3):
+        test = set(range(fold, len(XS), 3))
+        m, b = close_fit([x for i, x in enumerate(XS) if i not in test], [y for i, y in enumerate(YS) if i not in test])
+        fold_sse = sum((YS[i] - (m * XS[i] + b)) ** 2 for i in test)
+        assert result["fold_rmse"][fold] == pytest.approx(math.sqrt(fold_sse / len(test)), abs=1e-6)
+        held_out_sse += fold_sse
+    assert result["cv_rmse"] == pytest.approx(math.sqrt(held_out_sse / len(XS)), abs=1e-6)
+    assert result["cv_rmse"] >= result["rmse"]
+
+
+def test_one_fold_means_no_cross_validation():
+    result = train.evaluate(train.fold_stats(XS, YS, 1))
+    assert (result["m"], result["b"]) == pytest.approx(close_fit(XS, YS))
+    assert result["cv_rmse"] is None and result["fold_rmse"] == []
+
+
+def test_bad_records_are_skipped():
+    csv_rows = b"7.5,3.1\n\nx,2.0\n11,4.0\n8.0\n9.0,4.4\n"
+    assert list(train.parse_records(csv_rows, "csv", 0, 1)) == [(7.5, 3.1), (None, 2.0), (11.0, 4.0), (None, None), (9.0, 4.4)]
+    xs, ys, skipped = train.collect(train.parse_records(csv_rows, "csv", 0, 1))
+    assert (list(xs), list(ys), skipped) == ([7.5, 9.0], [3.1, 4.4], 3)
+
+    ndjson = b'{"cgpa": 8.0, "package": 3.5}\n[1]\n{broken\n{"cgpa": "nan", "package": 1}\n'
+    xs, ys, skipped = train.collect(train.parse_records(ndjson, "ndjson", "cgpa", "package"))
+    assert (list(xs), list(ys), skipped) == ([8.0], [3.5], 3)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_chunked_file_summary_agrees_with_a_direct_fit(tmp_path, fmt):
+    rng = random.Random(7)
+    xs = [round(rng.uniform(5, 10), 2) for _ in range(200)]
+    ys = [round(0.55 * x - 0.9 + rng.gauss(0, 0.2), 3) for x in xs]
+    path = tmp_path / f"records.{fmt}"
+    if fmt == "csv":
+        path.write_text("package,cgpa\n" + "".join(f"{y},{x}\n" for x, y in zip(xs, ys)) + "12,11.0\n")
+    else:
+        path.write_text("".join(json.dumps({"cgpa": x, "package": y}) + "\n" for x, y in zip(xs, ys)) + "{}\n")
+
+    totals, skipped = train.summarize_file(str(path), fmt, "cgpa", "package", folds=5, workers=1, chunk_bytes=97)
+    assert skipped == 1
+    assert sum(fold.n for fold in totals) == len(xs)
+    assert train.merge_all(totals).fit() == pytest.approx(close_fit(xs, ys))
+
+
+def test_artifact_loads_with_intervals():
+    result = train.evaluate(train.fold_stats(XS, YS, 3))
+    artifact = train.build_artifact(result, "v-test", {"source": "test"})
+    model = app.load_model(json.loads(json.dumps(artifact)))
+    assert model.version == "v-test"
+    assert (model.m, model.b) == pytest.approx((result["m"], result["b"]))
+    assert model.has_intervals()
+    assert model.metadata["source"] == "test" and model.metadata["rows"] == len(XS)
+    assert "covariance" not in model.metadata
+
+    artifact = train.build_artifact(train.evaluate(train.fold_stats(XS[:2], YS[:2], 1)), None, {})
+    assert "covariance" not in artifact and artifact["version"]
+    assert not app.load_model(artifact).has_intervals()
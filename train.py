@@ -0,0 +1,374 @@
+"""Offline training for the CGPA -> package regression model.
+
+Streams labeled records (a CGPA and the package actually offered) from a
+CSV or NDJSON file or a MongoDB collection, fits least squares from running
+sums, so memory does not grow with the data, reports k-fold cross-validated
+error and writes a model artifact that app.load_model() accepts:
+
+    python train.py placements.csv --output model.json
+    python train.py outcomes.ndjson --folds 10 --publish --candidate
+    python train.py --mongo placements --publish
+
+Files are cut into byte ranges that a process pool parses in parallel. Each
+task returns per-fold summary statistics (count, means, centered second
+moments), which merge exactly in any order, so the final fit and every
+fold's held-out error come out of a single pass over the data.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import reduce
+
+# NumPy is optional - it only speeds up summarizing each chunk
+try:
+    import numpy as np
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+CHUNK_BYTES = 8 * 1024 * 1024  # input bytes per pool task (also fixes the fold assignment)
+MONGO_CHUNK_ROWS = 100000  # documents summarized at a time from a MongoDB cursor
+CGPA_RANGE = (0.0, 10.0)  # records outside it are skipped, as /predict rejects them
+
+
+class RegressionStats:
+    """Count, means and centered second moments of (x, y) - all a least squares line needs.
+
+    Two summaries merge exactly (the pairwise update of Chan et al.), so chunks
+    can be summarized in parallel and combined in any order without the
+    cancellation that raw sums of squares suffer from.
+    """
+    __slots__ = ("n", "mean_x", "mean_y", "m2_x", "m2_y", "c_xy")
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, m2_x=0.0, m2_y=0.0, c_xy=0.0):
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.m2_x = m2_x
+        self.m2_y = m2_y
+        self.c_xy = c_xy
+
+    @classmethod
+    def from_values(cls, xs, ys):
+        n = len(xs)
+        if n == 0:
+            return cls()
+        if has_numpy:
+            x = np.frombuffer(xs, dtype=np.float64) if isinstance(xs, array) else np.asarray(xs, dtype=np.float64)
+            y = np.frombuffer(ys, dtype=np.float64) if isinstance(ys, array) else np.asarray(ys, dtype=np.float64)
+            mean_x, mean_y = float(x.mean()), float(y.mean())
+            dx, dy = x - mean_x, y - mean_y
+            return cls(n, mean_x, mean_y, float(dx @ dx), float(dy @ dy), float(dx @ dy))
+        mean_x, mean_y = math.fsum(xs) / n, math.fsum(ys) / n
+        return cls(
+            n, mean_x, mean_y,
+            math.fsum((x - mean_x) ** 2 for x in xs),
+            math.fsum((y - mean_y) ** 2 for y in ys),
+            math.fsum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+        )
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            return other
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        return RegressionStats(
+            n,
+            self.mean_x + dx * other.n / n,
+            self.mean_y + dy * other.n / n,
+            self.m2_x + other.m2_x + dx * dx * weight,
+            self.m2_y + other.m2_y + dy * dy * weight,
+            self.c_xy + other.c_xy + dx * dy * weight
+        )
+
+    def fit(self):
+        """(m, b) of the least squares line y = m*x + b."""
+        if self.n < 2 or self.m2_x <= 0:
+            raise ValueError("need records with at least two distinct CGPAs to fit a line")
+        m = self.c_xy / self.m2_x
+        return m, self.mean_y - m * self.mean_x
+
+    def covariance(self, m, b):
+        """(residual variance, covariance of [b, m]) - what app.load_model needs for prediction intervals."""
+        if self.n < 3:
+            return None, None
+        variance = self.sse(m, b) / (self.n - 2)
+        var_m = variance / self.m2_x
+        cov_bm = -self.mean_x * var_m
+        var_b = variance / self.n + self.mean_x * self.mean_x * var_m
+        return variance, [[var_b, cov_bm], [cov_bm, var_m]]
+
+    def sse(self, m, b):
+        """Sum of squared errors of y = m*x + b over the summarized records."""
+        offset = self.mean_y - m * self.mean_x - b
+        return max(self.n * offset * offset + self.m2_y - 2 * m * self.c_xy + m * m * self.m2_x, 0.0)
+
+
+# Function to merge a list of summaries into one
+def merge_all(stats):
+    return reduce(RegressionStats.merge, stats, RegressionStats())
+
+
+# Function to split values into per-fold summaries (record i of a chunk goes to fold i % folds)
+def fold_stats(xs, ys, folds):
+    return [RegressionStats.from_values(xs[fold::folds], ys[fold::folds]) for fold in range(folds)]
+
+
+# Function to read the lines starting inside [start, end) - each line belongs to exactly one range
+def read_range(path, start, end):
+    with open(path, 'rb') as f:
+        if start:
+            # Finish the line that began before this range; its owner reads it
+            f.seek(start - 1)
+            f.readline()
+        position = f.tell()
+        if position >= end:
+            return b''
+        data = f.read(end - position)
+        if data and not data.endswith(b'\n'):
+            data += f.readline()
+        return data
+
+
+# Function to turn one field into a float, or None if it is missing or not a number
+def parse_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+# Function to extract (x, y) from a chunk of CSV rows or NDJSON objects; bad records give None
+def parse_records(data, fmt, x_field, y_field):
+    if fmt == "csv":
+        for row in csv.reader(io.StringIO(data.decode('utf-8', 'replace'))):
+            if not row:
+                continue
+            try:
+                yield parse_number(row[x_field]), parse_number(row[y_field])
+            except IndexError:
+                yield None, None
+    else:
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield parse_number(record.get(x_field)), parse_number(record.get(y_field))
+            except (ValueError, AttributeError):
+                yield None, None
+
+
+# Function to collect valid (x, y) pairs into two float arrays, counting the rest
+def collect(records):
+    xs, ys = array('d'), array('d')
+    skipped = 0
+    low, high = CGPA_RANGE
+    for x, y in records:
+        if x is None or y is None or not low <= x <= high:
+            skipped += 1
+            continue
+        xs.append(x)
+        ys.append(y)
+    return xs, ys, skipped
+
+
+# Pool task: per-fold summaries of one byte range of a file, plus its skipped record count
+def summarize_range(path, fmt, start, end, x_field, y_field, folds):
+    xs, ys, skipped = collect(parse_records(read_range(path, start, end), fmt, x_field, y_field))
+    return fold_stats(xs, ys, folds), skipped
+
+
+# Function to summarize a CSV/NDJSON file with a process pool, one task per chunk
+def summarize_file(path, fmt, x_field, y_field, folds, workers, chunk_bytes):
+    data_start = 0
+    if fmt == "csv":
+        with open(path, 'rb') as f:
+            header_line = f.readline()
+        header = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+        try:
+            x_field, y_field = header.index(x_field), header.index(y_field)
+        except ValueError:
+            raise ValueError(f"CSV header needs {x_field!r} and {y_field!r} columns, found {header}")
+        data_start = len(header_line)
+
+    size = os.path.getsize(path)
+    ranges = [(start, min(start + chunk_bytes, size)) for start in range(data_start, size, chunk_bytes)]
+    totals = [RegressionStats()] * folds
+    skipped = 0
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(summarize_range, *zip(*[
+                (path, fmt, start, end, x_field, y_field, folds) for start, end in ranges
+            ]))
+            for chunk_folds, chunk_skipped in results:
+                totals = [total.merge(stats) for total, stats in zip(totals, chunk_folds)]
+                skipped += chunk_skipped
+    else:
+        for start, end in ranges:
+            chunk_folds, chunk_skipped = summarize_range(path, fmt, start, end, x_field, y_field, folds)
+            totals = [total.merge(stats) for total, stats in zip(totals, chunk_folds)]
+            skipped += chunk_skipped
+    return totals, skipped
+
+
+# Function to summarize a MongoDB collection through a batched cursor
+def summarize_mongo(collection_name, x_field, y_field, folds, chunk_rows):
+    import app
+    app.ensure_database()
+    if not app.using_mongodb:
+        raise ValueError("MongoDB is not available - set MONGO_URI to train from a collection")
+    cursor = app.mongo.collection(collection_name).find(
+        {x_field: {"$ne": None}, y_field: {"$ne": None}},
+        projection={x_field: 1, y_field: 1, "_id": 0},
+        batch_size=min(chunk_rows, 10000)
+    )
+    totals = [RegressionStats()] * folds
+    skipped = 0
+    chunk = []
+    for document in cursor:
+        chunk.append((parse_number(document.get(x_field)), parse_number(document.get(y_field))))
+        if len(chunk) >= chunk_rows:
+            xs, ys, chunk_skipped = collect(chunk)
+            totals = [total.merge(stats) for total, stats in zip(totals, fold_stats(xs, ys, folds))]
+            skipped += chunk_skipped
+            chunk = []
+    xs, ys, chunk_skipped = collect(chunk)
+    totals = [total.merge(stats) for total, stats in zip(totals, fold_stats(xs, ys, folds))]
+    return totals, skipped + chunk_skipped
+
+
+# Function to fit on all records and cross-validate with each fold held out in turn
+def evaluate(fold_totals):
+    total = merge_all(fold_totals)
+    m, b = total.fit()
+    sse = total.sse(m, b)
+    fold_rmse = []
+    held_out_sse = 0.0
+    for index, held_out in enumerate(fold_totals if len(fold_totals) > 1 else []):
+        if held_out.n == 0:
+            continue
+        fold_m, fold_b = merge_all(fold_totals[:index] + fold_totals[index + 1:]).fit()
+        fold_sse = held_out.sse(fold_m, fold_b)
+        held_out_sse += fold_sse
+        fold_rmse.append(round(math.sqrt(fold_sse / held_out.n), 6))
+    residual_variance, covariance = total.covariance(m, b)
+    return {
+        "m": m,
+        "b": b,
+        "residual_variance": residual_variance,
+        "covariance": covariance,
+        "rows": total.n,
+        "rmse": round(math.sqrt(sse / total.n), 6),
+        "r2": round(1 - sse / total.m2_y, 6) if total.m2_y > 0 else None,
+        "cv_rmse": round(math.sqrt(held_out_sse / total.n), 6) if len(fold_rmse) > 1 else None,
+        "cv_r2": round(1 - held_out_sse / total.m2_y, 6) if len(fold_rmse) > 1 and total.m2_y > 0 else None,
+        "fold_rmse": fold_rmse
+    }
+
+
+# Result fields that go into the artifact itself rather than its metadata
+MODEL_KEYS = ("m", "b", "covariance", "residual_variance")
+
+
+# Function to build the artifact app.load_model() reads
+def build_artifact(result, version, metadata):
+    m, b = result["m"], result["b"]
+    if version is None:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
+        version = f"{stamp}-{hashlib.sha1(repr((m, b)).encode('utf-8')).hexdigest()[:8]}"
+    artifact = {
+        "version": version,
+        "type": "linear",
+        "coefficients": {"m": m, "b": b},
+        "metadata": dict(metadata, **{key: value for key, value in result.items() if key not in MODEL_KEYS})
+    }
+    if result["covariance"] is not None:
+        # Enables prediction intervals (?interval=1 on the prediction API)
+        artifact["covariance"] = result["covariance"]
+        artifact["residual_variance"] = result["residual_variance"]
+    return artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("source", nargs="?", help="CSV (with a header row) or NDJSON file of labeled records")
+    parser.add_argument("--mongo", metavar="COLLECTION", help="read the records from this MongoDB collection instead")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="file format (default: from the extension)")
+    parser.add_argument("--x-field", default="cgpa", help="CGPA column/field")
+    parser.add_argument("--y-field", default="package", help="package (LPA) column/field")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds (1 = none)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parser processes")
+    parser.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES, help="file bytes per pool task")
+    parser.add_argument("--chunk-rows", type=int, default=MONGO_CHUNK_ROWS, help="documents per MongoDB chunk")
+    parser.add_argument("--version", help="artifact version (default: UTC timestamp + coefficient hash)")
+    parser.add_argument("--output", default="model.json", help="artifact path ('-' for stdout)")
+    parser.add_argument("--publish", action="store_true", help="install the model in the running app (see MODEL_SOURCE)")
+    parser.add_argument("--candidate", action="store_true", help="with --publish, install it as the candidate")
+    args = parser.parse_args()
+    if bool(args.source) == bool(args.mongo):
+        parser.error("give either a file or --mongo COLLECTION")
+    if args.folds < 1:
+        parser.error("--folds must be at least 1")
+
+    started = time.perf_counter()
+    try:
+        if args.mongo:
+            source = f"mongodb:{args.mongo}"
+            fold_totals, skipped = summarize_mongo(args.mongo, args.x_field, args.y_field, args.folds, args.chunk_rows)
+        else:
+            source = os.path.basename(args.source)
+            fmt = args.format or ("csv" if args.source.lower().endswith(".csv") else "ndjson")
+            fold_totals, skipped = summarize_file(args.source, fmt, args.x_field, args.y_field,
+                                                  args.folds, args.workers, args.chunk_bytes)
+        result = evaluate(fold_totals)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ Training failed: {str(e)}")
+    elapsed = time.perf_counter() - started
+
+    artifact = build_artifact(result, args.version, {
+        "source": source,
+        "skipped": skipped,
+        "folds": args.folds,
+        "trained_at": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "training_seconds": round(elapsed, 3)
+    })
+    print(f"✅ Fitted package = {result['m']:.6f} * cgpa + {result['b']:.6f} on {result['rows']} records "
+          f"({skipped} skipped) in {elapsed:.2f}s", file=sys.stderr)
+    print(f"   RMSE {result['rmse']}, R² {result['r2']}, {args.folds}-fold CV RMSE {result['cv_rmse']}",
+          file=sys.stderr)
+
+    if args.output == "-":
+        json.dump(artifact, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(artifact, f, indent=2)
+        print(f"✅ Wrote {args.output} (version {artifact['version']})", file=sys.stderr)
+
+    if args.publish:
+        import app
+        role = "candidate" if args.candidate else "active"
+        try:
+            app.publish_model(artifact, role=role)
+        except (ValueError, RuntimeError) as e:
+            sys.exit(f"❌ Publishing failed: {str(e)}")
+        print(f"✅ Published {artifact['version']} as the {role} model ({app.MODEL_SOURCE})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
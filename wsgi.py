@@ -0,0 +1,9 @@
+"""WSGI entry point: the configured Flask app.
+
+    gunicorn --preload wsgi:app
+
+Also the FLASK_APP for the CLI commands (FLASK_APP=wsgi.py flask build-assets).
+"""
+from app import create_app
+
+app = create_app()